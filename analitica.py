@@ -0,0 +1,231 @@
+"""Analítica de clases para los docentes.
+
+Los contadores de cada grupo viven en columnas de NumPy con una fila por estudiante y
+una columna por operación. Un grupo se carga una vez desde la base de datos (niveles y
+un GROUP BY sobre los intentos) y después se mantiene al día sumando cada respuesta
+verificada, así que un informe no vuelve a recorrer los intentos: solo reduce unas
+pocas matrices de n_estudiantes x n_operaciones.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import numpy as np
+
+from operaciones import OPERACIONES
+
+NOMBRES_OPERACIONES = list(OPERACIONES)
+COLUMNA_OPERACION = {nombre: j for j, nombre in enumerate(NOMBRES_OPERACIONES)}
+
+class ResumenGrupo:
+    """Contadores de las respuestas de los estudiantes de un grupo"""
+
+    def __init__(self, grupo_id: int, nombre: str, docente_id: Optional[int],
+                 usuarios: List[int], identidades: List[str]):
+        n, m = len(usuarios), len(NOMBRES_OPERACIONES)
+        self.grupo_id = grupo_id
+        self.nombre = nombre
+        self.docente_id = docente_id
+        self.usuarios = np.asarray(usuarios, dtype=np.int64)
+        self.identidades = identidades
+        self.fila = {usuario_id: i for i, usuario_id in enumerate(usuarios)}
+        self.nivel = np.ones((n, m), dtype=np.int64)
+        self.respuestas = np.zeros((n, m), dtype=np.int64)
+        self.aciertos = np.zeros((n, m), dtype=np.int64)
+        self.tiempo = np.zeros((n, m), dtype=np.float64)
+        self.racha_fallos = np.zeros((n, m), dtype=np.int64)  # Fallos desde el último acierto
+        self.ultima = np.zeros((n, m), dtype=np.float64)  # Marca de tiempo de la última respuesta
+        self.cargado = time.monotonic()
+        self.lock = threading.Lock()
+
+    def registrar(self, usuario_id: int, operacion: str, nivel: int, correcto: bool, tiempo: float,
+                  instante: float):
+        i, j = self.fila[usuario_id], COLUMNA_OPERACION[operacion]
+        with self.lock:
+            self.nivel[i, j] = nivel
+            self.respuestas[i, j] += 1
+            self.tiempo[i, j] += tiempo
+            self.ultima[i, j] = instante
+            if correcto:
+                self.aciertos[i, j] += 1
+                self.racha_fallos[i, j] = 0
+            else:
+                self.racha_fallos[i, j] += 1
+
+    def fijar_nivel(self, usuario_id: int, operacion: str, nivel: int):
+        with self.lock:
+            self.nivel[self.fila[usuario_id], COLUMNA_OPERACION[operacion]] = nivel
+
+class AnaliticaGrupos:
+    """Resúmenes de los grupos consultados recientemente, actualizados con cada respuesta.
+
+    `cargar(grupo_id)` lee el grupo de la base de datos y devuelve None si no existe.
+    Con `ttl` los resúmenes se recargan pasado ese tiempo, para incluir las respuestas
+    que atendieron otros procesos.
+    """
+
+    def __init__(self, cargar: Callable[[int], Optional[Dict[str, Any]]],
+                 ttl: Optional[float] = None, capacidad: int = 200):
+        self.cargar = cargar
+        self.ttl = ttl
+        self.capacidad = max(1, capacidad)
+        self._grupos: 'OrderedDict[int, ResumenGrupo]' = OrderedDict()
+        self._de_usuario: Dict[int, Set[int]] = {}
+        self._lock = threading.Lock()
+        self._lock_carga = threading.Lock()
+        # Métricas
+        self.cargas = 0
+
+    def obtener(self, grupo_id: int) -> Optional[ResumenGrupo]:
+        """Resumen del grupo, cargándolo si no está en memoria o ha caducado"""
+        with self._lock:
+            resumen = self._grupos.get(grupo_id)
+            if resumen is not None and not self._caducado(resumen):
+                self._grupos.move_to_end(grupo_id)
+                return resumen
+        with self._lock_carga:
+            # Otro hilo pudo cargarlo mientras se esperaba
+            resumen = self._grupos.get(grupo_id)
+            if resumen is not None and not self._caducado(resumen):
+                return resumen
+            datos = self.cargar(grupo_id)
+            if datos is None:
+                return None
+            resumen = self._construir(grupo_id, datos)
+            with self._lock:
+                self._quitar(grupo_id)
+                self._grupos[grupo_id] = resumen
+                for usuario_id in resumen.fila:
+                    self._de_usuario.setdefault(usuario_id, set()).add(grupo_id)
+                while len(self._grupos) > self.capacidad:
+                    self._quitar(next(iter(self._grupos)))
+            self.cargas += 1
+            return resumen
+
+    def _caducado(self, resumen: ResumenGrupo) -> bool:
+        return self.ttl is not None and time.monotonic() - resumen.cargado > self.ttl
+
+    def _quitar(self, grupo_id: int):
+        """Llamar con self._lock tomado"""
+        resumen = self._grupos.pop(grupo_id, None)
+        if resumen is None:
+            return
+        for usuario_id in resumen.fila:
+            grupos = self._de_usuario.get(usuario_id)
+            if grupos is not None:
+                grupos.discard(grupo_id)
+                if not grupos:
+                    del self._de_usuario[usuario_id]
+
+    @staticmethod
+    def _construir(grupo_id: int, datos: Dict[str, Any]) -> ResumenGrupo:
+        resumen = ResumenGrupo(grupo_id, datos['nombre'], datos['docente_id'],
+                               [e[0] for e in datos['estudiantes']], [e[1] for e in datos['estudiantes']])
+        for usuario_id, operacion, nivel in datos['progresos']:
+            if usuario_id in resumen.fila and operacion in COLUMNA_OPERACION:
+                resumen.nivel[resumen.fila[usuario_id], COLUMNA_OPERACION[operacion]] = nivel
+        for usuario_id, operacion, respuestas, aciertos, tiempo, ultima, racha in datos['intentos']:
+            if usuario_id not in resumen.fila or operacion not in COLUMNA_OPERACION:
+                continue
+            i, j = resumen.fila[usuario_id], COLUMNA_OPERACION[operacion]
+            resumen.respuestas[i, j] = respuestas
+            resumen.aciertos[i, j] = aciertos or 0
+            resumen.tiempo[i, j] = tiempo or 0.0
+            resumen.ultima[i, j] = ultima.timestamp() if isinstance(ultima, datetime) else 0.0
+            resumen.racha_fallos[i, j] = racha
+        return resumen
+
+    def registrar(self, usuario_id: int, operacion: str, nivel: int, correcto: bool, tiempo: float):
+        """Suma una respuesta verificada a los grupos en memoria del estudiante"""
+        grupos = self._de_usuario.get(usuario_id)
+        if not grupos:
+            return
+        instante = time.time()
+        for grupo_id in list(grupos):
+            resumen = self._grupos.get(grupo_id)
+            if resumen is not None:
+                resumen.registrar(usuario_id, operacion, nivel, correcto, tiempo, instante)
+
+    def fijar_nivel(self, usuario_id: int, operacion: str, nivel: int):
+        """Refleja un cambio de nivel que no viene de una respuesta (p. ej. un reinicio)"""
+        for grupo_id in list(self._de_usuario.get(usuario_id, ())):
+            resumen = self._grupos.get(grupo_id)
+            if resumen is not None:
+                resumen.fijar_nivel(usuario_id, operacion, nivel)
+
+    def descartar(self, grupo_id: int):
+        """Olvida el resumen de un grupo cuyos miembros han cambiado"""
+        with self._lock:
+            self._quitar(grupo_id)
+
+    def __len__(self) -> int:
+        return len(self._grupos)
+
+def informe(resumen: ResumenGrupo, min_respuestas: int = 5, precision_minima: float = 0.5,
+            racha_maxima: int = 3) -> Dict[str, Any]:
+    """Distribución de niveles, precisión, tiempo medio y estudiantes con dificultades del grupo.
+
+    Un estudiante tiene dificultades en una operación si su precisión es menor que
+    `precision_minima` tras al menos `min_respuestas` respuestas, o si acumula
+    `racha_maxima` fallos seguidos.
+    """
+    with resumen.lock:
+        nivel = resumen.nivel.copy()
+        respuestas = resumen.respuestas.copy()
+        aciertos = resumen.aciertos.copy()
+        tiempo = resumen.tiempo.copy()
+        racha = resumen.racha_fallos.copy()
+        ultima = resumen.ultima.copy()
+
+    def cociente(a, b):
+        return np.divide(a, b, out=np.full(np.shape(a), np.nan), where=np.asarray(b) > 0)
+
+    def numero(valor) -> Optional[float]:
+        return None if np.isnan(valor) else round(float(valor), 4)
+
+    precision = cociente(aciertos, respuestas)
+    activos = respuestas > 0
+    dificultad = ((respuestas >= min_respuestas) & (precision < precision_minima)) | (racha >= racha_maxima)
+
+    operaciones = {}
+    for j, nombre in enumerate(NOMBRES_OPERACIONES):
+        total = respuestas[:, j].sum()
+        precisiones = precision[activos[:, j], j]
+        operaciones[nombre] = {
+            'niveles': {str(n): int(c) for n, c in enumerate(np.bincount(nivel[:, j], minlength=4)[1:4], 1)},
+            'estudiantes_activos': int(activos[:, j].sum()),
+            'respuestas': int(total),
+            'precision': numero(cociente(aciertos[:, j].sum(), total)),
+            'precision_mediana': numero(np.median(precisiones)) if precisiones.size else None,
+            'tiempo_medio': numero(cociente(tiempo[:, j].sum(), total)),
+            'estudiantes_con_dificultades': int(dificultad[:, j].sum())
+        }
+
+    # Estudiantes con dificultades, del de menor precisión global al de mayor
+    totales = respuestas.sum(axis=1)
+    precision_global = cociente(aciertos.sum(axis=1), totales)
+    filas = np.flatnonzero(dificultad.any(axis=1))
+    filas = filas[np.argsort(np.nan_to_num(precision_global[filas], nan=1.0), kind='stable')]
+    estudiantes = [{
+        'usuario_id': int(resumen.usuarios[i]),
+        'identidad': resumen.identidades[i],
+        'operaciones': [NOMBRES_OPERACIONES[j] for j in np.flatnonzero(dificultad[i])],
+        'precision': numero(precision_global[i]),
+        'tiempo_medio': numero(cociente(tiempo[i].sum(), totales[i])),
+        'racha_fallos': int(racha[i].max()),
+        'ultima_respuesta': datetime.fromtimestamp(ultima[i].max()).isoformat() if ultima[i].max() else None
+    } for i in filas]
+
+    total = respuestas.sum()
+    return {
+        'grupo': {'id': resumen.grupo_id, 'nombre': resumen.nombre},
+        'estudiantes': int(len(resumen.usuarios)),
+        'estudiantes_activos': int((totales > 0).sum()),
+        'respuestas': int(total),
+        'precision': numero(cociente(aciertos.sum(), total)),
+        'tiempo_medio': numero(cociente(tiempo.sum(), total)),
+        'operaciones': operaciones,
+        'estudiantes_con_dificultades': estudiantes
+    }
@@ -1,31 +1,192 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, g, abort, Response, session, \
+    stream_with_context
 from flask.wrappers import Request
 import json
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from typing import cast, Dict, Any
-from ejercicios_ia import generar_ejercicios_suma
-from sqlalchemy import Column, Integer, String, Float, ForeignKey
-from sqlalchemy.orm import relationship
+from typing import cast, Dict, Any, Iterator, List, Optional, TYPE_CHECKING
+import atexit
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from functools import partial, wraps
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Index, Table, case, event, \
+    func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as insert_postgresql
+from sqlalchemy.dialects.sqlite import insert as insert_sqlite
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import relationship, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from persistencia import EscritorDiferido, BufferLotes, CacheTTL, AlmacenEstadoSQLite
+from metricas import metricas
+from operaciones import OPERACIONES
+from recursos import RecursosEstaticos
+
+if TYPE_CHECKING:
+    # El módulo de IA (numpy, scikit-learn) se importa de forma diferida con cargar_ia()
+    from ejercicios_ia import GeneradorEjercicios
+    from analitica import AnaliticaGrupos
+
+def usa_pool_de_conexiones(uri: str) -> bool:
+    """Si el motor de la URI usa QueuePool: todas salvo SQLite en memoria (StaticPool/SingletonThreadPool)"""
+    url = make_url(uri)
+    if url.get_backend_name() != 'sqlite':
+        return True
+    return url.database not in (None, '', ':memory:') and url.query.get('mode') != 'memory'
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'tu_clave_secreta_aqui'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///usuarios.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('SABIDURIA_DATABASE_URI', 'sqlite:///usuarios.db')
+# Conexiones reutilizadas entre peticiones (solo con un pool de conexiones real)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': 10,
+    'max_overflow': 20,
+} if usa_pool_de_conexiones(app.config['SQLALCHEMY_DATABASE_URI']) else {}
+# PRAGMA aplicados a cada conexión SQLite: WAL permite leer mientras otro escribe
+app.config['SQLITE_PRAGMAS'] = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+}
+# Dónde vive el estado adaptativo de los estudiantes: 'memoria' (un solo proceso) o
+# 'sqlite' (archivo IA_ESTADO_RUTA compartido por todos los workers, p. ej. con gunicorn)
+app.config['IA_ESTADO'] = os.environ.get('SABIDURIA_IA_ESTADO', 'memoria')
+app.config['IA_ESTADO_RUTA'] = os.environ.get(
+    'SABIDURIA_IA_ESTADO_RUTA', os.path.join(app.instance_path, 'estado_ia.db'))
+# Escritura diferida del progreso: los cambios se agrupan en memoria y se
+# escriben en lotes cada PROGRESO_INTERVALO_ESCRITURA segundos y al apagar
+app.config['PROGRESO_ESCRITURA_DIFERIDA'] = False
+app.config['PROGRESO_INTERVALO_ESCRITURA'] = 1.0
+app.config['PROGRESO_MAX_PENDIENTES'] = 500
+# Caché entre peticiones del usuario y su progreso (TTL en segundos; 0 la desactiva).
+# Con varios workers se desactiva: un worker no se entera de lo que guardan los demás
+app.config['USUARIOS_CACHE_TTL'] = 0 if app.config['IA_ESTADO'] == 'sqlite' else 30.0
+app.config['USUARIOS_CACHE_CAPACIDAD'] = 10000
+# Número máximo de estudiantes con estado de IA en memoria
+app.config['GENERADORES_CAPACIDAD'] = 1000
+# Filas de entrenamiento por estudiante (None = sin límite). Con el estado compartido
+# cada cambio reescribe el estado entero del estudiante, así que se limita por defecto
+app.config['IA_CAPACIDAD_DATOS'] = 500 if app.config['IA_ESTADO'] == 'sqlite' else None
+# Qué filas se conservan al llegar a IA_CAPACIDAD_DATOS: 'ventana' (las más recientes),
+# 'reservorio' (muestra al azar sesgada hacia lo reciente; opción 'recencia' entre 0 y 1)
+# o 'estratificada' (límite por nivel; opción 'capacidad_por_nivel', p. ej. {1: 200, 2: 400, 3: 400})
+app.config['IA_RETENCION'] = 'ventana'
+app.config['IA_RETENCION_OPCIONES'] = {}
+# Memoria máxima en bytes del estado de IA de todos los estudiantes (None = sin límite);
+# al superarla se recortan los datos de los que más ocupan y, si no basta, se expulsan
+app.config['IA_MEMORIA_PRESUPUESTO'] = None
+# Reentrenamiento en segundo plano: cada N muestras nuevas o como máximo cada T segundos
+app.config['IA_REENTRENAR_MUESTRAS'] = 5
+app.config['IA_REENTRENAR_INTERVALO'] = 10.0
+# Máximo de ejercicios que el cliente puede pedir en un solo lote
+app.config['EJERCICIOS_LOTE_MAXIMO'] = 20
+# Máximo de respuestas aceptadas en un envío por lotes
+app.config['RESPUESTAS_LOTE_MAXIMO'] = 50
+# Predicción de dificultad agrupada: las peticiones concurrentes esperan hasta
+# IA_PREDICCION_VENTANA segundos para predecirse juntas en lotes de hasta IA_PREDICCION_LOTE_MAXIMO
+app.config['IA_PREDICCION_LOTES'] = False
+app.config['IA_PREDICCION_VENTANA'] = 0.002
+app.config['IA_PREDICCION_LOTE_MAXIMO'] = 64
+# Modelo de dificultad: 'arbol' (árbol de decisión reentrenado en segundo plano con todo
+# el historial) o 'cubetas' (estadísticas por cubetas actualizadas en O(1) con cada respuesta)
+app.config['IA_MOTOR'] = os.environ.get('SABIDURIA_IA_MOTOR', 'arbol')
+# Importar numpy y scikit-learn al importar app en lugar de en la primera petición de
+# ejercicios (con gunicorn también puede llamarse a precalentar_ia() desde post_fork)
+app.config['IA_PRECALENTAR'] = os.environ.get('SABIDURIA_IA_PRECALENTAR', '0') in ('1', 'true')
+# Registro de intentos: inserciones masivas cada INTENTOS_INTERVALO_ESCRITURA segundos
+# o al acumular INTENTOS_MAX_PENDIENTES filas
+app.config['INTENTOS_INTERVALO_ESCRITURA'] = 1.0
+app.config['INTENTOS_MAX_PENDIENTES'] = 500
+# Intentos recientes con los que se recupera el modelo de un estudiante al rehidratarlo
+app.config['IA_INTENTOS_ARRANQUE'] = 200
+# Puntos de control en disco del modelo de cada estudiante (None los desactiva):
+# los estados que cambiaron se escriben cada IA_PUNTOS_CONTROL_INTERVALO segundos
+app.config['IA_PUNTOS_CONTROL_DIRECTORIO'] = os.environ.get(
+    'SABIDURIA_MODELOS_DIR', os.path.join(app.instance_path, 'modelos'))
+app.config['IA_PUNTOS_CONTROL_INTERVALO'] = 30.0
+# Analítica de grupos: grupos con contadores en memoria y segundos tras los que se
+# recargan de la base de datos (None = nunca). La recarga recoge los cambios de miembros
+# hechos con init_db.py y, con varios workers, las respuestas que atendieron los demás
+app.config['ANALITICA_GRUPOS_CAPACIDAD'] = 200
+app.config['ANALITICA_TTL'] = 30.0 if app.config['IA_ESTADO'] == 'sqlite' else 300.0
+# Criterios de "estudiante con dificultades" en el informe del grupo
+app.config['ANALITICA_MIN_RESPUESTAS'] = 5
+app.config['ANALITICA_PRECISION_MINIMA'] = 0.5
+app.config['ANALITICA_RACHA_FALLOS'] = 3
+# Exportaciones: filas que se leen de la base de datos en cada bloque (yield_per) e
+# identidades que pueden exportar todo el colegio (el docente de un grupo puede exportar el suyo)
+app.config['EXPORTACION_LOTE'] = 1000
+app.config['EXPORTACION_IDENTIDADES'] = set(filter(None, os.environ.get('SABIDURIA_EXPORTACION_IDENTIDADES', '').split(',')))
+# HTML de las páginas estáticas guardado en memoria y servido con ETag/Last-Modified
+# (se desactiva solo cuando las plantillas se recargan, p. ej. con debug=True)
+app.config['PAGINAS_CACHE'] = True
+# Caché de los archivos de static/ pedidos con su huella en la URL (?v=...)
+app.config['ESTATICOS_MAX_AGE'] = 365 * 24 * 3600
+# Escribir al arrancar las variantes .gz de los archivos de static/
+app.config['ESTATICOS_PRECOMPRIMIR'] = True
+# Métricas de tiempos y contadores en /metrics (formato Prometheus, solo desde localhost);
+# se aplica en cada petición, así que también puede cambiarse después de importar app
+app.config['METRICAS_HABILITADAS'] = os.environ.get('SABIDURIA_METRICAS', '0') in ('1', 'true')
 db = SQLAlchemy(app)
+metricas.habilitadas = app.config['METRICAS_HABILITADAS']
+
+# Bootstrap y Font Awesome locales (python recursos.py), con la CDN como alternativa
+recursos = RecursosEstaticos(app.static_folder, app.config['ESTATICOS_MAX_AGE'])
+recursos.escanear()
+if app.config['ESTATICOS_PRECOMPRIMIR']:
+    recursos.precomprimir()
+app.view_functions['static'] = recursos.servir
+app.jinja_env.globals['recurso'] = recursos.url
+
+@event.listens_for(Engine, 'connect')
+def configurar_sqlite(conexion, registro_conexion):
+    """Aplica los PRAGMA configurados a cada conexión SQLite nueva"""
+    if not isinstance(conexion, sqlite3.Connection):
+        return
+    cursor = conexion.cursor()
+    for pragma, valor in app.config['SQLITE_PRAGMAS'].items():
+        cursor.execute(f'PRAGMA {pragma}={valor}')
+    cursor.close()
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def iniciar_tiempo_consulta(conexion, cursor, sentencia, parametros, contexto, multiples):
+    if metricas.habilitadas:
+        conexion.info.setdefault('inicios_consulta', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def registrar_tiempo_consulta(conexion, cursor, sentencia, parametros, contexto, multiples):
+    inicios = conexion.info.get('inicios_consulta')
+    if inicios:
+        metricas.observar('db_consulta_segundos', time.perf_counter() - inicios.pop())
+
 login_manager = cast(LoginManager, LoginManager(app))
 login_manager.login_view = 'login'  # type: ignore[assignment]
 
-class ProgresoSuma(db.Model):  # type: ignore
+class ProgresoOperacion(db.Model):  # type: ignore
+    """Progreso de un estudiante en una operación (suma, resta, ...)"""
+    __tablename__ = 'progreso_operacion'
+
     id = Column(Integer, primary_key=True)
     usuario_id = Column(Integer, ForeignKey('usuario.id'), nullable=False)
+    operacion = Column(String(20), nullable=False)
     nivel = Column(Integer, default=1)
     ejercicios_completados = Column(Integer, default=0)
     aciertos = Column(Integer, default=0)
     ultima_puntuacion = Column(Float, default=0.0)
 
-    def __init__(self, usuario_id=None, nivel=1, ejercicios_completados=0, aciertos=0, ultima_puntuacion=0.0):
+    __table_args__ = (
+        Index('ix_progreso_usuario_operacion', 'usuario_id', 'operacion', unique=True),
+    )
+
+    def __init__(self, usuario_id=None, operacion='suma', nivel=1, ejercicios_completados=0, aciertos=0,
+                 ultima_puntuacion=0.0):
         self.usuario_id = usuario_id
+        self.operacion = operacion
         self.nivel = nivel
         self.ejercicios_completados = ejercicios_completados
         self.aciertos = aciertos
@@ -37,7 +198,8 @@ class Usuario(UserMixin, db.Model):  # type: ignore
     id = Column(Integer, primary_key=True)
     identidad = Column(String(20), unique=True, nullable=False)
     password = Column(String(100), nullable=False)
-    progreso_suma = relationship('ProgresoSuma', backref='usuario', lazy='dynamic')
+    # Los progresos se leen en load_user y get_progreso; la relación solo sirve para navegar
+    progresos = relationship('ProgresoOperacion', backref='usuario')
 
     __table_args__ = {'extend_existing': True}
 
@@ -45,19 +207,502 @@ class Usuario(UserMixin, db.Model):  # type: ignore
         self.identidad = identidad
         self.password = password
 
-    def get_progreso_suma(self):
-        if not self.progreso_suma.first():
-            nuevo_progreso = ProgresoSuma(usuario_id=self.id)
-            db.session.add(nuevo_progreso)
+    def get_progreso(self, operacion: str) -> 'ProgresoOperacion':
+        """Progreso del estudiante en la operación, creándolo la primera vez"""
+        # load_user deja precargados todos los progresos del estudiante para toda la petición
+        progresos = getattr(self, '_progresos', None)
+        if progresos is None:
+            progresos = self._progresos = {
+                p.operacion: p for p in ProgresoOperacion.query.filter_by(usuario_id=self.id)
+            }
+        progreso = progresos.get(operacion)
+        if progreso is None:
+            progreso = progresos[operacion] = crear_progreso(self.id, operacion)
+            cache_usuarios.invalidar(self.id)
+        # Aplicar los cambios aún no escritos para leer lo que el propio estudiante escribió
+        pendiente = escritor_progreso.leer((self.id, operacion))
+        if pendiente:
+            for campo, valor in pendiente.items():
+                set_committed_value(progreso, campo, valor)
+        return progreso
+
+# INSERT ... ON CONFLICT de los motores que lo admiten junto con RETURNING
+INSERT_CON_CONFLICTO = {'sqlite': insert_sqlite, 'postgresql': insert_postgresql}
+
+def crear_progreso(usuario_id: int, operacion: str) -> ProgresoOperacion:
+    """Obtiene o crea la fila de progreso con una sola sentencia, aunque otra petición la cree a la vez"""
+    insertar = INSERT_CON_CONFLICTO.get(db.engine.dialect.name)
+    if insertar is None or not db.engine.dialect.insert_returning:
+        progreso = ProgresoOperacion(usuario_id=usuario_id, operacion=operacion)
+        db.session.add(progreso)
+        try:
             db.session.commit()
-            return nuevo_progreso
-        return self.progreso_suma.first()
+        except IntegrityError:
+            # Otra petición lo creó a la vez: usar el suyo
+            db.session.rollback()
+            progreso = ProgresoOperacion.query.filter_by(usuario_id=usuario_id, operacion=operacion).one()
+        return progreso
+    tabla = ProgresoOperacion.__table__
+    sentencia = insertar(tabla).values(usuario_id=usuario_id, operacion=operacion)
+    # DO UPDATE sin cambios en lugar de DO NOTHING para que RETURNING devuelva también la fila existente
+    sentencia = sentencia.on_conflict_do_update(
+        index_elements=[tabla.c.usuario_id, tabla.c.operacion],
+        set_={'operacion': sentencia.excluded.operacion}
+    ).returning(*tabla.columns)
+    # En su propia transacción: un commit de la sesión caducaría el usuario y obligaría a releerlo
+    with db.engine.begin() as conexion:
+        fila = conexion.execute(sentencia).one()
+    # Asociar la fila devuelta a la sesión sin volver a leerla
+    return desde_cache(ProgresoOperacion, dict(fila._mapping))
+
+def escribir_progresos(filas: List[Dict[str, Any]]):
+    """Escribe un lote de progresos en una sola transacción"""
+    with app.app_context():
+        db.session.execute(update(ProgresoOperacion), filas)
+        db.session.commit()
+
+escritor_progreso = EscritorDiferido(
+    escribir_progresos,
+    intervalo=app.config['PROGRESO_INTERVALO_ESCRITURA'],
+    max_pendientes=app.config['PROGRESO_MAX_PENDIENTES']
+)
+atexit.register(escritor_progreso.detener)
+
+cache_usuarios = CacheTTL(
+    ttl=app.config['USUARIOS_CACHE_TTL'],
+    capacidad=app.config['USUARIOS_CACHE_CAPACIDAD']
+)
+
+def columnas(objeto) -> Dict[str, Any]:
+    """Valores de las columnas de una fila, para guardarlos en caché"""
+    return {columna.key: getattr(objeto, columna.key) for columna in objeto.__table__.columns}
+
+def desde_cache(modelo, valores: Dict[str, Any]):
+    """Reconstruye una fila guardada en caché y la asocia a la sesión sin consultar la base de datos"""
+    objeto = modelo()
+    for campo, valor in valores.items():
+        setattr(objeto, campo, valor)
+    make_transient_to_detached(objeto)
+    return db.session.merge(objeto, load=False)
+
+def guardar_progreso(progreso: ProgresoOperacion):
+    """Confirma el progreso de inmediato o lo deja en el escritor diferido"""
+    # Leer usuario_id antes del commit: después recargaría la fila expirada
+    usuario_id = progreso.usuario_id
+    if not app.config['PROGRESO_ESCRITURA_DIFERIDA']:
+        db.session.commit()
+        cache_usuarios.invalidar(usuario_id)
+        return
+    escritor_progreso.registrar((usuario_id, progreso.operacion), {
+        'id': progreso.id,
+        'nivel': progreso.nivel,
+        'ejercicios_completados': progreso.ejercicios_completados,
+        'aciertos': progreso.aciertos,
+        'ultima_puntuacion': progreso.ultima_puntuacion
+    })
+    # Sacar el objeto de la sesión para que sus cambios no se escriban en esta petición
+    db.session.expunge(progreso)
+    cache_usuarios.invalidar(usuario_id)
+
+class Intento(db.Model):  # type: ignore
+    """Registro de solo inserción de cada respuesta verificada"""
+    __tablename__ = 'intento'
+    
+    id = Column(Integer, primary_key=True)
+    usuario_id = Column(Integer, ForeignKey('usuario.id'), nullable=False)
+    operacion = Column(String(20), nullable=False, default='suma')
+    nivel = Column(Integer, nullable=False)
+    num1 = Column(Integer)
+    num2 = Column(Integer)
+    respuesta = Column(Integer)
+    correcto = Column(Boolean, nullable=False)
+    tiempo = Column(Float, nullable=False)
+    dificultad_predicha = Column(Float)
+    creado = Column(DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        Index('ix_intento_usuario_creado', 'usuario_id', 'creado'),
+        Index('ix_intento_creado', 'creado'),
+    )
+
+def escribir_intentos(filas: List[Dict[str, Any]]):
+    """Inserta un lote de intentos en una sola transacción"""
+    with app.app_context():
+        db.session.execute(insert(Intento), filas)
+        db.session.commit()
+
+buffer_intentos = BufferLotes(
+    escribir_intentos,
+    intervalo=app.config['INTENTOS_INTERVALO_ESCRITURA'],
+    max_pendientes=app.config['INTENTOS_MAX_PENDIENTES']
+)
+atexit.register(buffer_intentos.detener)
+
+def intentos_recientes(usuario_id: int, operacion: str, limite: int,
+                       desde: Optional[datetime] = None) -> List[tuple]:
+    """Últimos intentos (nivel, correcto, tiempo) del estudiante en orden cronológico, incluidos los aún no escritos.
+
+    Con `desde` solo se devuelven los intentos posteriores a ese instante.
+    """
+    pendientes = buffer_intentos.filtrar(
+        lambda fila: fila['usuario_id'] == usuario_id and fila['operacion'] == operacion
+        and (desde is None or fila['creado'] > desde)
+    )
+    restantes = max(0, limite - len(pendientes))
+    guardados = []
+    if restantes:
+        consulta = db.session.query(Intento.nivel, Intento.correcto, Intento.tiempo) \
+            .filter(Intento.usuario_id == usuario_id, Intento.operacion == operacion)
+        if desde is not None:
+            consulta = consulta.filter(Intento.creado > desde)
+        guardados = consulta.order_by(Intento.creado.desc(), Intento.id.desc()) \
+            .limit(restantes) \
+            .all()
+        guardados.reverse()
+    return [tuple(fila) for fila in guardados] + \
+        [(fila['nivel'], fila['correcto'], fila['tiempo']) for fila in pendientes[-limite:]]
+
+# Estudiantes de cada grupo (un estudiante puede estar en varios)
+grupo_estudiante = Table(
+    'grupo_estudiante', db.metadata,
+    Column('grupo_id', Integer, ForeignKey('grupo.id'), primary_key=True),
+    Column('usuario_id', Integer, ForeignKey('usuario.id'), primary_key=True),
+    Index('ix_grupo_estudiante_usuario', 'usuario_id')
+)
+
+class Grupo(db.Model):  # type: ignore
+    """Clase de estudiantes a cargo de un docente"""
+    __tablename__ = 'grupo'
+
+    id = Column(Integer, primary_key=True)
+    nombre = Column(String(50), unique=True, nullable=False)
+    docente_id = Column(Integer, ForeignKey('usuario.id'))
+
+    def __init__(self, nombre=None, docente_id=None):
+        self.nombre = nombre
+        self.docente_id = docente_id
 
 @login_manager.user_loader
 def load_user(user_id):
-    return Usuario.query.get(int(user_id))
+    usuario_id = int(user_id)
+    usar_cache = app.config['USUARIOS_CACHE_TTL'] > 0
+    if usar_cache:
+        guardado = cache_usuarios.obtener(usuario_id)
+        if guardado is not None:
+            usuario = desde_cache(Usuario, guardado['usuario'])
+            usuario._progresos = {
+                operacion: desde_cache(ProgresoOperacion, valores)
+                for operacion, valores in guardado['progresos'].items()
+            }
+            return usuario
+        version = cache_usuarios.version(usuario_id)
+    
+    # Usuario y todos sus progresos en una sola consulta
+    filas = db.session.query(Usuario, ProgresoOperacion) \
+        .outerjoin(ProgresoOperacion, ProgresoOperacion.usuario_id == Usuario.id) \
+        .filter(Usuario.id == usuario_id) \
+        .all()
+    if not filas:
+        return None
+    usuario = filas[0][0]
+    usuario._progresos = {progreso.operacion: progreso for _, progreso in filas if progreso is not None}
+    if usar_cache:
+        cache_usuarios.guardar(usuario_id, {
+            'usuario': columnas(usuario),
+            'progresos': {operacion: columnas(progreso) for operacion, progreso in usuario._progresos.items()}
+        }, version)
+    return usuario
+
+def rehidratar_generador(usuario_id: int, operacion: str, generador: 'GeneradorEjercicios'):
+    """Reconstruye el estado de un generador a partir del progreso guardado"""
+    pendiente = escritor_progreso.leer((usuario_id, operacion))
+    if pendiente:
+        nivel = pendiente['nivel']
+    else:
+        progreso = ProgresoOperacion.query.filter_by(usuario_id=usuario_id, operacion=operacion).first()
+        if progreso is None:
+            return
+        nivel = progreso.nivel
+    # Recuperar el modelo entrenado del punto de control y completar los datos con los
+    # intentos posteriores a él (o con los últimos intentos si no hay punto de control)
+    guardado_en = _ia.puntos_control.cargar((usuario_id, operacion), generador) if _ia is not None else None
+    if app.config['IA_INTENTOS_ARRANQUE'] > 0:
+        generador.ia.precargar(
+            intentos_recientes(usuario_id, operacion, app.config['IA_INTENTOS_ARRANQUE'], desde=guardado_en)
+        )
+    generador.nivel_actual = nivel
+    generador.ia.nivel_actual = nivel
+
+_ia = None
+_ia_lock = threading.Lock()
+
+def cargar_ia():
+    """Importa y configura el módulo de IA la primera vez que se necesita"""
+    global _ia
+    if _ia is None:
+        with _ia_lock:
+            if _ia is None:
+                import ejercicios_ia
+                ejercicios_ia.registro.capacidad = app.config['GENERADORES_CAPACIDAD']
+                ejercicios_ia.registro.capacidad_datos = app.config['IA_CAPACIDAD_DATOS']
+                ejercicios_ia.registro.retencion = partial(ejercicios_ia.RETENCIONES[app.config['IA_RETENCION']],
+                                                           **app.config['IA_RETENCION_OPCIONES'])
+                ejercicios_ia.registro.presupuesto_memoria = app.config['IA_MEMORIA_PRESUPUESTO']
+                ejercicios_ia.registro.rehidratar = rehidratar_generador
+                ejercicios_ia.planificador.muestras = app.config['IA_REENTRENAR_MUESTRAS']
+                ejercicios_ia.planificador.intervalo = app.config['IA_REENTRENAR_INTERVALO']
+                ejercicios_ia.motor_por_defecto = app.config['IA_MOTOR']
+                if app.config['IA_PREDICCION_LOTES']:
+                    ejercicios_ia.predictor = ejercicios_ia.PredictorPorLotes(
+                        app.config['IA_PREDICCION_VENTANA'], app.config['IA_PREDICCION_LOTE_MAXIMO'])
+                if app.config['IA_ESTADO'] == 'sqlite':
+                    # El archivo compartido ya conserva el estado: no hacen falta puntos de control
+                    os.makedirs(os.path.dirname(app.config['IA_ESTADO_RUTA']), exist_ok=True)
+                    ejercicios_ia.registro.estado = AlmacenEstadoSQLite(app.config['IA_ESTADO_RUTA'])
+                else:
+                    ejercicios_ia.puntos_control.directorio = app.config['IA_PUNTOS_CONTROL_DIRECTORIO']
+                    ejercicios_ia.puntos_control.intervalo = app.config['IA_PUNTOS_CONTROL_INTERVALO']
+                    ejercicios_ia.puntos_control.iniciar()
+                    atexit.register(ejercicios_ia.puntos_control.detener)
+                _ia = ejercicios_ia
+    return _ia
+
+_analitica: Optional['AnaliticaGrupos'] = None
+_analitica_lock = threading.Lock()
+
+def datos_grupo(grupo_id: int) -> Optional[Dict[str, Any]]:
+    """Estudiantes, niveles y totales de intentos de un grupo, para construir su resumen"""
+    grupo = db.session.get(Grupo, grupo_id)
+    if grupo is None:
+        return None
+    # Que los totales incluyan lo que aún está en los búferes
+    escritor_progreso.vaciar()
+    buffer_intentos.vaciar()
+    miembros = select(grupo_estudiante.c.usuario_id).where(grupo_estudiante.c.grupo_id == grupo_id)
+    estudiantes = db.session.execute(
+        select(Usuario.id, Usuario.identidad).where(Usuario.id.in_(miembros)).order_by(Usuario.identidad)
+    ).all()
+    progresos = db.session.execute(
+        select(ProgresoOperacion.usuario_id, ProgresoOperacion.operacion, ProgresoOperacion.nivel)
+        .where(ProgresoOperacion.usuario_id.in_(miembros))
+    ).all()
+    # Un GROUP BY por estudiante y operación; la racha de fallos cuenta los intentos
+    # posteriores al último acierto
+    totales = select(
+        Intento.usuario_id, Intento.operacion,
+        func.count().label('respuestas'),
+        func.sum(case((Intento.correcto, 1), else_=0)).label('aciertos'),
+        func.sum(Intento.tiempo).label('tiempo'),
+        func.max(Intento.creado).label('ultima'),
+        func.coalesce(func.max(case((Intento.correcto, Intento.id))), 0).label('ultimo_acierto')
+    ).where(Intento.usuario_id.in_(miembros)).group_by(Intento.usuario_id, Intento.operacion).subquery()
+    racha = select(func.count()).where(
+        Intento.usuario_id == totales.c.usuario_id,
+        Intento.operacion == totales.c.operacion,
+        Intento.id > totales.c.ultimo_acierto
+    ).scalar_subquery()
+    intentos = db.session.execute(select(
+        totales.c.usuario_id, totales.c.operacion, totales.c.respuestas, totales.c.aciertos,
+        totales.c.tiempo, totales.c.ultima, racha
+    )).all()
+    return {
+        'nombre': grupo.nombre,
+        'docente_id': grupo.docente_id,
+        'estudiantes': estudiantes,
+        'progresos': progresos,
+        'intentos': intentos
+    }
+
+# Columnas de cada exportación, en el orden en que se escriben
+TIPOS_EXPORTACION: Dict[str, tuple] = {
+    'progreso': ('identidad', 'operacion', 'nivel', 'ejercicios_completados', 'aciertos', 'ultima_puntuacion'),
+    'intentos': ('identidad', 'operacion', 'nivel', 'num1', 'num2', 'respuesta', 'correcto', 'tiempo',
+                 'dificultad_predicha', 'creado'),
+}
+
+def filas_exportacion(tipo: str, grupo_id: Optional[int] = None, desde: Optional[datetime] = None) -> Iterator[tuple]:
+    """Filas de una exportación, leídas de la base de datos en bloques de EXPORTACION_LOTE.
+
+    Es un generador: la consulta se lanza al pedir la primera fila y solo hay un
+    bloque en memoria a la vez.
+    """
+    # Que la exportación incluya lo que aún está en los búferes
+    escritor_progreso.vaciar()
+    buffer_intentos.vaciar()
+    if tipo == 'progreso':
+        consulta = select(
+            Usuario.identidad, ProgresoOperacion.operacion, ProgresoOperacion.nivel,
+            ProgresoOperacion.ejercicios_completados, ProgresoOperacion.aciertos, ProgresoOperacion.ultima_puntuacion
+        ).join(ProgresoOperacion, ProgresoOperacion.usuario_id == Usuario.id) \
+            .order_by(Usuario.id, ProgresoOperacion.operacion)
+    else:
+        consulta = select(
+            Usuario.identidad, Intento.operacion, Intento.nivel, Intento.num1, Intento.num2, Intento.respuesta,
+            Intento.correcto, Intento.tiempo, Intento.dificultad_predicha, Intento.creado
+        ).join(Usuario, Usuario.id == Intento.usuario_id).order_by(Intento.id)
+        if desde is not None:
+            consulta = consulta.where(Intento.creado >= desde)
+    if grupo_id is not None:
+        consulta = consulta.where(Usuario.id.in_(
+            select(grupo_estudiante.c.usuario_id).where(grupo_estudiante.c.grupo_id == grupo_id)))
+    yield from db.session.execute(consulta.execution_options(yield_per=app.config['EXPORTACION_LOTE']))
+
+def cargar_analitica() -> 'AnaliticaGrupos':
+    """Crea la analítica de grupos (importa NumPy) la primera vez que un docente la consulta"""
+    global _analitica
+    if _analitica is None:
+        with _analitica_lock:
+            if _analitica is None:
+                from analitica import AnaliticaGrupos
+                _analitica = AnaliticaGrupos(datos_grupo, ttl=app.config['ANALITICA_TTL'],
+                                             capacidad=app.config['ANALITICA_GRUPOS_CAPACIDAD'])
+    return _analitica
+
+def precalentar_ia():
+    """Carga por adelantado el módulo de IA y scikit-learn (p. ej. desde post_fork de gunicorn)"""
+    cargar_ia().precalentar()
+
+if app.config['IA_PRECALENTAR']:
+    precalentar_ia()
+
+@app.before_request
+def iniciar_tiempo_peticion():
+    metricas.habilitadas = app.config['METRICAS_HABILITADAS']
+    if metricas.habilitadas:
+        g.inicio_peticion = time.perf_counter()
+
+@app.after_request
+def registrar_tiempo_peticion(respuesta):
+    inicio = g.pop('inicio_peticion', None)
+    if inicio is not None:
+        endpoint = request.endpoint or 'desconocido'
+        metricas.observar('peticion_segundos', time.perf_counter() - inicio, endpoint=endpoint)
+        metricas.incrementar('peticiones_total', endpoint=endpoint, estado=str(respuesta.status_code))
+    return respuesta
+
+def metricas_calculadas():
+    """Registra las métricas que se leen de los componentes en cada exportación"""
+    def ia(clave):
+        return lambda: {(): _ia.planificador.metricas()[clave]} if _ia is not None else {}
+    metricas.calcular('ia_reentrenamientos_total', 'counter', 'Modelos reentrenados y publicados',
+                      ia('reentrenamientos'))
+    metricas.calcular('ia_reentrenamientos_coalescidos_total', 'counter',
+                      'Solicitudes de reentrenamiento fusionadas con otra pendiente', ia('reentrenamientos_coalescidos'))
+    metricas.calcular('ia_reentrenamientos_pendientes', 'gauge', 'Estudiantes con reentrenamiento pendiente',
+                      ia('pendientes'))
+    metricas.calcular('ia_antiguedad_pendiente_segundos', 'gauge',
+                      'Antigüedad de la muestra sin entrenar más antigua', ia('antiguedad_pendiente_s'))
+    metricas.calcular('ia_generadores', 'gauge', 'Estudiantes con estado de IA en memoria',
+                      lambda: {(): len(_ia.registro)} if _ia is not None else {})
+    metricas.calcular('ia_memoria_bytes', 'gauge', 'Memoria estimada del estado de IA de los estudiantes en memoria',
+                      lambda: {(): _ia.registro.memoria_total} if _ia is not None else {})
+    metricas.calcular('ia_memoria_ajustes_total', 'counter',
+                      'Recortes de datos y expulsiones por el presupuesto de memoria',
+                      lambda: {(('tipo', 'recorte'),): _ia.registro.recortes_memoria,
+                               (('tipo', 'expulsion'),): _ia.registro.expulsiones_memoria} if _ia is not None else {})
+    metricas.calcular('ia_puntos_control_total', 'counter', 'Puntos de control de modelos por operación',
+                      lambda: {(('operacion', 'guardado'),): _ia.puntos_control.guardados,
+                               (('operacion', 'cargado'),): _ia.puntos_control.cargados,
+                               (('operacion', 'error'),): _ia.puntos_control.errores} if _ia is not None else {})
+    metricas.calcular('ia_estado_compartido_total', 'counter',
+                      'Lecturas, escrituras y conflictos de versión sobre el estado adaptativo compartido',
+                      lambda: {(('tipo', 'lectura'),): _ia.registro.estado.lecturas,
+                               (('tipo', 'escritura'),): _ia.registro.estado.escrituras,
+                               (('tipo', 'conflicto'),): _ia.registro.estado.conflictos}
+                      if _ia is not None and _ia.registro.estado.compartido else {})
+    metricas.calcular('analitica_grupos', 'gauge', 'Grupos con contadores de analítica en memoria',
+                      lambda: {(): len(_analitica)} if _analitica is not None else {})
+    metricas.calcular('analitica_cargas_total', 'counter', 'Grupos cargados desde la base de datos',
+                      lambda: {(): _analitica.cargas} if _analitica is not None else {})
+    metricas.calcular('cache_usuarios_total', 'counter', 'Consultas a la caché de usuarios por resultado',
+                      lambda: {(('resultado', k),): v for k, v in cache_usuarios.metricas().items() if k != 'entradas'})
+    metricas.calcular('escritura_pendiente', 'gauge', 'Elementos pendientes de escribir en lote',
+                      lambda: {(('buffer', 'progreso'),): len(escritor_progreso),
+                               (('buffer', 'intentos'),): len(buffer_intentos)})
+
+metricas.describir('peticion_segundos', 'histogram', 'Duración de las peticiones HTTP por endpoint')
+metricas.describir('peticiones_total', 'counter', 'Peticiones HTTP por endpoint y estado')
+metricas.describir('db_consulta_segundos', 'histogram', 'Duración de cada sentencia SQL')
+metricas.describir('ia_caracteristicas_segundos', 'histogram', 'Cálculo de características del modelo')
+metricas.describir('ia_prediccion_segundos', 'histogram', 'Predicción del árbol de dificultad')
+metricas.describir('ia_entrenamiento_segundos', 'histogram', 'Entrenamiento del árbol de dificultad')
+metricas.describir('cambios_nivel_total', 'counter', 'Cambios de nivel por dirección')
+metricas.describir('mensajes_ayuda_total', 'counter', 'Mensajes de ayuda mostrados')
+metricas.describir('exportaciones_total', 'counter', 'Exportaciones de progreso e intentos por tipo y formato')
+metricas_calculadas()
+
+@app.route('/metrics')
+def exportar_metricas():
+    if not metricas.habilitadas:
+        abort(404)
+    if request.remote_addr not in ('127.0.0.1', '::1'):
+        abort(403)
+    return Response(metricas.exportar(), mimetype='text/plain; version=0.0.4')
+
+# Catálogo de temas, construido una sola vez al arrancar
+TEMAS_PRIMARIA: Dict[str, Dict[str, Any]] = {
+    'operaciones-basicas': {
+        'titulo': 'Operaciones Básicas',
+        'operaciones': {nombre: operacion.titulo for nombre, operacion in OPERACIONES.items()}
+    },
+    'fracciones-decimales': {'titulo': 'Fracciones y Decimales', 'operaciones': None},
+    'numeros-naturales': {'titulo': 'Números Naturales', 'operaciones': None},
+    'tablas-multiplicar': {'titulo': 'Tablas de Multiplicar', 'operaciones': None}
+}
+
+TEMAS_SECUNDARIA: Dict[str, str] = {
+    'algebra': 'Álgebra',
+    'geometria': 'Geometría',
+    'trigonometria': 'Trigonometría',
+    'estadistica': 'Estadística Básica',
+    'funciones': 'Funciones y Gráficas'
+}
+
+TIPOS_EJERCICIO: Dict[str, str] = {
+    'ejemplos': 'Ejemplos Detallados',
+    'interactivos': 'Ejercicios Interactivos',
+    'evaluacion': 'Evaluación Continua'
+}
+
+def _ultima_modificacion(directorio: str) -> int:
+    """Fecha (en segundos) del archivo modificado más recientemente del directorio"""
+    return int(max((os.path.getmtime(os.path.join(carpeta, nombre))
+                    for carpeta, _, nombres in os.walk(directorio) for nombre in nombres), default=0))
+
+# El HTML cacheado solo cambia al desplegar plantillas nuevas
+PLANTILLAS_MODIFICADAS = _ultima_modificacion(os.path.join(app.root_path, app.template_folder or 'templates'))
+
+# (endpoint, argumentos, sesión iniciada) -> (HTML, ETag)
+paginas_cacheadas: Dict[tuple, tuple[bytes, str]] = {}
+
+def pagina_cacheada(vista):
+    """Guarda el HTML de una vista que solo depende de la URL y responde 304 si el cliente ya lo tiene"""
+    @wraps(vista)
+    def envoltorio(**kwargs):
+        # Los mensajes flash pendientes forman parte del HTML: esa respuesta no se reutiliza
+        if not app.config['PAGINAS_CACHE'] or app.jinja_env.auto_reload or '_flashes' in session:
+            return vista(**kwargs)
+        clave = (request.endpoint, tuple(sorted(kwargs.items())), current_user.is_authenticated)
+        pagina = paginas_cacheadas.get(clave)
+        if pagina is None:
+            respuesta = app.make_response(vista(**kwargs))
+            if respuesta.status_code != 200:
+                return respuesta
+            cuerpo = respuesta.get_data()
+            pagina = paginas_cacheadas[clave] = (cuerpo, hashlib.sha1(cuerpo).hexdigest())
+        cuerpo, etag = pagina
+        respuesta = Response(cuerpo, mimetype='text/html')
+        respuesta.set_etag(etag)
+        respuesta.last_modified = PLANTILLAS_MODIFICADAS
+        # Depende de la sesión: solo la guarda el navegador, que la revalida en cada visita
+        respuesta.cache_control.private = True
+        respuesta.cache_control.no_cache = True
+        respuesta.vary.add('Cookie')
+        return respuesta.make_conditional(request)
+    return envoltorio
 
 @app.route('/')
+@pagina_cacheada
 def index():
     return render_template('index.html')
 
@@ -79,66 +724,41 @@ def login():
 
 @app.route('/dashboard')
 @login_required
+@pagina_cacheada
 def dashboard():
     return render_template('dashboard.html')
 
 @app.route('/primaria/<tema>')
 @login_required
+@pagina_cacheada
 def primaria(tema):
-    temas = {
-        'operaciones-basicas': {
-            'titulo': 'Operaciones Básicas',
-            'operaciones': {
-                'suma': 'Suma',
-                'resta': 'Resta',
-                'multiplicacion': 'Multiplicación',
-                'division': 'División'
-            }
-        },
-        'fracciones-decimales': 'Fracciones y Decimales',
-        'numeros-naturales': 'Números Naturales',
-        'tablas-multiplicar': 'Tablas de Multiplicar'
-    }
-    
-    if tema not in temas:
+    if tema not in TEMAS_PRIMARIA:
         flash('Tema no encontrado', 'error')
         return redirect(url_for('dashboard'))
-        
-    titulo = temas[tema] if isinstance(temas[tema], str) else temas[tema]['titulo']
-    operaciones = temas[tema].get('operaciones') if isinstance(temas[tema], dict) else None
     
     return render_template('temas/primaria.html', 
                          tema=tema, 
-                         titulo=titulo,
-                         operaciones=operaciones)
+                         titulo=TEMAS_PRIMARIA[tema]['titulo'],
+                         operaciones=TEMAS_PRIMARIA[tema]['operaciones'],
+                         estrategias=OPERACIONES)
 
 @app.route('/secundaria/<tema>')
 @login_required
+@pagina_cacheada
 def secundaria(tema):
-    temas = {
-        'algebra': 'Álgebra',
-        'geometria': 'Geometría',
-        'trigonometria': 'Trigonometría',
-        'estadistica': 'Estadística Básica',
-        'funciones': 'Funciones y Gráficas'
-    }
-    if tema not in temas:
+    if tema not in TEMAS_SECUNDARIA:
         flash('Tema no encontrado', 'error')
         return redirect(url_for('dashboard'))
-    return render_template('temas/secundaria.html', tema=tema, titulo=temas[tema])
+    return render_template('temas/secundaria.html', tema=tema, titulo=TEMAS_SECUNDARIA[tema])
 
 @app.route('/ejercicios/<tipo>')
 @login_required
+@pagina_cacheada
 def ejercicios(tipo):
-    tipos = {
-        'ejemplos': 'Ejemplos Detallados',
-        'interactivos': 'Ejercicios Interactivos',
-        'evaluacion': 'Evaluación Continua'
-    }
-    if tipo not in tipos:
+    if tipo not in TIPOS_EJERCICIO:
         flash('Tipo de ejercicio no encontrado', 'error')
         return redirect(url_for('dashboard'))
-    return render_template('ejercicios/ejercicios.html', tipo=tipo, titulo=tipos[tipo])
+    return render_template('ejercicios/ejercicios.html', tipo=tipo, titulo=TIPOS_EJERCICIO[tipo])
 
 @app.route('/logout')
 @login_required
@@ -146,45 +766,50 @@ def logout():
     logout_user()
     return redirect(url_for('index'))
 
-@app.route('/primaria/operaciones-basicas/suma/ejercicios')
+# Segmento de URL que solo acepta las operaciones disponibles (404 para cualquier otra)
+OPERACION = 'any({}):operacion'.format(', '.join(OPERACIONES))
+
+@app.route(f'/primaria/operaciones-basicas/<{OPERACION}>/ejercicios')
 @login_required
-def ejercicios_suma():
-    progreso = current_user.get_progreso_suma()
+def ejercicios_operacion(operacion):
+    progreso = current_user.get_progreso(operacion)
     # Calcula los porcentajes aquí
     nivel_porcentaje = (progreso.nivel / 3) * 100
     precision_porcentaje = (progreso.aciertos / progreso.ejercicios_completados * 100) if progreso.ejercicios_completados > 0 else 0
-    return render_template('ejercicios/suma.html', 
+    return render_template('ejercicios/operacion.html',
+                         operacion=OPERACIONES[operacion],
                          nivel=progreso.nivel,
                          ejercicios_completados=progreso.ejercicios_completados,
                          aciertos=progreso.aciertos,
                          nivel_porcentaje=nivel_porcentaje,
                          precision_porcentaje=precision_porcentaje)
 
-@app.route('/api/ejercicios/suma')
+@app.route(f'/api/ejercicios/<{OPERACION}>')
 @login_required
-def obtener_ejercicios_suma():
-    progreso = current_user.get_progreso_suma()
-    ejercicios = generar_ejercicios_suma(nivel=progreso.nivel)
+def obtener_ejercicios(operacion):
+    cantidad = request.args.get('count', 1, type=int)
+    cantidad = max(1, min(cantidad, app.config['EJERCICIOS_LOTE_MAXIMO']))
+    sin_repetir = request.args.get('unicos', '0') in ('1', 'true')
+    
+    progreso = current_user.get_progreso(operacion)
+    ia = cargar_ia()
+    with ia.registro.usar(current_user.id, operacion) as generador:
+        ejercicios = ia.generar_ejercicios(generador, nivel=progreso.nivel,
+                                           cantidad=cantidad, sin_repetir=sin_repetir)
     return jsonify(ejercicios)
 
-@app.route('/api/ejercicios/suma/verificar', methods=['POST'])
-@login_required
-def verificar_ejercicio_suma():
-    data = cast(Dict[str, Any], request.json)  # type: ignore
-    respuesta_usuario = int(data.get('respuesta', 0))
-    respuesta_correcta = int(data.get('respuesta_correcta', 0))
-    tiempo = float(data.get('tiempo', 0))  # Tiempo en segundos
-    
-    progreso = current_user.get_progreso_suma()
+def aplicar_respuesta(progreso: ProgresoOperacion, generador: 'GeneradorEjercicios',
+                      respuesta_usuario: int, respuesta_correcta: int, tiempo: float,
+                      num1: Optional[int] = None, num2: Optional[int] = None) -> Dict[str, Any]:
+    """Aplica una respuesta al progreso y a la IA del estudiante, sin confirmar la transacción"""
     progreso.ejercicios_completados += 1
     
     correcto = respuesta_usuario == respuesta_correcta
     if correcto:
         progreso.aciertos += 1
     
-    # Registrar resultado en la IA
-    from ejercicios_ia import generador
-    generador.registrar_resultado(correcto, tiempo)
+    # Registrar resultado en la IA con el nivel del progreso, que es el mismo en todos los workers
+    generador.registrar_resultado(correcto, tiempo, nivel=progreso.nivel)
     
     # Calcular puntuación
     puntuacion = (progreso.aciertos / progreso.ejercicios_completados) * 100
@@ -196,22 +821,42 @@ def verificar_ejercicio_suma():
     dificultad = generador.ia.predecir_dificultad(progreso.nivel)
     
     # Determinar el nuevo nivel basado en la dificultad
-    if dificultad >= 1.8 and progreso.nivel < 3:
-        progreso.nivel += 1
-        print(f"Subiendo a nivel {progreso.nivel}")
-    elif dificultad <= 0.6 and progreso.nivel > 1:
-        progreso.nivel -= 1
-        print(f"Bajando a nivel {progreso.nivel}")
+    progreso.nivel = cargar_ia().nivel_siguiente(nivel_anterior, dificultad)
+    if progreso.nivel > nivel_anterior:
+        app.logger.debug('Subiendo a nivel %s', progreso.nivel)
+        metricas.incrementar('cambios_nivel_total', direccion='subida')
+    elif progreso.nivel < nivel_anterior:
+        app.logger.debug('Bajando a nivel %s', progreso.nivel)
+        metricas.incrementar('cambios_nivel_total', direccion='bajada')
     
     # Si el nivel cambió, reiniciar contadores
     if progreso.nivel != nivel_anterior:
         progreso.ejercicios_completados = 0
         progreso.aciertos = 0
     
-    db.session.commit()
+    if generador.mensaje_ayuda:
+        metricas.incrementar('mensajes_ayuda_total')
+    
+    # Mantener al día los contadores de los grupos del estudiante que estén en memoria
+    if _analitica is not None:
+        _analitica.registrar(progreso.usuario_id, progreso.operacion, progreso.nivel, correcto, tiempo)
+    
+    # Registrar el intento (se inserta en lote más tarde)
+    buffer_intentos.agregar({
+        'usuario_id': progreso.usuario_id,
+        'operacion': progreso.operacion,
+        'nivel': nivel_anterior,
+        'num1': num1,
+        'num2': num2,
+        'respuesta': respuesta_usuario,
+        'correcto': correcto,
+        'tiempo': tiempo,
+        'dificultad_predicha': float(dificultad),
+        'creado': datetime.now()
+    })
     
     # Devolver toda la información necesaria para actualizar la UI
-    return jsonify({
+    return {
         'correcto': correcto,
         'nivel': progreso.nivel,
         'nivel_cambio': progreso.nivel != nivel_anterior,
@@ -220,32 +865,201 @@ def verificar_ejercicio_suma():
         'aciertos': progreso.aciertos,
         'tiempo': tiempo,
         'mensaje_ayuda': generador.mensaje_ayuda
+    }
+
+def operandos(data: Dict[str, Any]) -> tuple[Optional[int], Optional[int]]:
+    """Operandos opcionales del ejercicio respondido, para el registro de intentos"""
+    num1, num2 = data.get('num1'), data.get('num2')
+    return (int(num1) if num1 is not None else None,
+            int(num2) if num2 is not None else None)
+
+@app.route(f'/api/ejercicios/<{OPERACION}>/verificar', methods=['POST'])
+@login_required
+def verificar_ejercicio(operacion):
+    data = cast(Dict[str, Any], request.json)  # type: ignore
+    respuesta_usuario = int(data.get('respuesta', 0))
+    respuesta_correcta = int(data.get('respuesta_correcta', 0))
+    tiempo = float(data.get('tiempo', 0))  # Tiempo en segundos
+    num1, num2 = operandos(data)
+    
+    progreso = current_user.get_progreso(operacion)
+    with cargar_ia().registro.usar(current_user.id, operacion) as generador:
+        resultado = aplicar_respuesta(progreso, generador, respuesta_usuario, respuesta_correcta, tiempo,
+                                      num1, num2)
+    
+    guardar_progreso(progreso)
+    
+    return jsonify(resultado)
+
+@app.route(f'/api/ejercicios/<{OPERACION}>/verificar-lote', methods=['POST'])
+@login_required
+def verificar_ejercicios_lote(operacion):
+    data = request.get_json(silent=True)
+    respuestas = data.get('respuestas') if isinstance(data, dict) else None
+    if not isinstance(respuestas, list) or not respuestas:
+        return jsonify({
+            'success': False,
+            'error': 'Falta la lista de respuestas'
+        }), 400
+    if len(respuestas) > app.config['RESPUESTAS_LOTE_MAXIMO']:
+        return jsonify({
+            'success': False,
+            'error': f"Se admiten como máximo {app.config['RESPUESTAS_LOTE_MAXIMO']} respuestas por lote"
+        }), 400
+    
+    try:
+        # Validar todo el lote antes de modificar el estado
+        entradas = [
+            (int(r.get('respuesta', 0)), int(r.get('respuesta_correcta', 0)), float(r.get('tiempo', 0)),
+             *operandos(r))
+            for r in respuestas
+        ]
+    except (AttributeError, TypeError, ValueError):
+        return jsonify({
+            'success': False,
+            'error': 'El lote contiene respuestas no válidas'
+        }), 400
+    
+    # Reproducir las respuestas en orden, igual que si llegaran una a una
+    progreso = current_user.get_progreso(operacion)
+    with cargar_ia().registro.usar(current_user.id, operacion) as generador:
+        resultados = [
+            aplicar_respuesta(progreso, generador, *entrada)
+            for entrada in entradas
+        ]
+    
+    # Leer el estado antes del commit: después recargaría el progreso caducado
+    estado = {
+        'nivel': progreso.nivel,
+        'puntuacion': progreso.ultima_puntuacion,
+        'ejercicios_completados': progreso.ejercicios_completados,
+        'aciertos': progreso.aciertos,
+        'mensaje_ayuda': resultados[-1]['mensaje_ayuda']
+    }
+    # Una sola escritura para todo el lote
+    guardar_progreso(progreso)
+    
+    return jsonify({
+        'success': True,
+        'resultados': resultados,
+        'estado': estado
     })
 
-@app.route('/api/ejercicios/suma/reiniciar', methods=['POST'])
+@app.route(f'/api/ejercicios/<{OPERACION}>/reiniciar', methods=['POST'])
 @login_required
-def reiniciar_progreso_suma():
+def reiniciar_progreso(operacion):
+    # Leer el id antes del commit: después recargaría el usuario caducado
+    usuario_id = current_user.id
     # Reiniciar el progreso en la base de datos
-    progreso = current_user.get_progreso_suma()
+    progreso = current_user.get_progreso(operacion)
     progreso.nivel = 1
     progreso.ejercicios_completados = 0
     progreso.aciertos = 0
     progreso.ultima_puntuacion = 0.0
-    db.session.commit()
+    guardar_progreso(progreso)
+    if _analitica is not None:
+        _analitica.fijar_nivel(usuario_id, operacion, 1)
     
-    # Reiniciar completamente el generador de ejercicios
-    from ejercicios_ia import generador
-    generador.reiniciar()
+    # Reiniciar completamente el generador de ejercicios del estudiante
+    ia = cargar_ia()
+    with ia.registro.usar(usuario_id, operacion) as generador:
+        generador.reiniciar()
+        # Guardar ya el estado vacío para que un reinicio del proceso no recupere el modelo anterior
+        ia.puntos_control.guardar((usuario_id, operacion), generador)
+        ejercicios = ia.generar_ejercicios(generador, nivel=1)  # Generar nuevos ejercicios de nivel 1
     
     flash('¡Progreso reiniciado exitosamente!', 'success')
     return jsonify({
         'success': True,
-        'ejercicios': generar_ejercicios_suma(nivel=1)  # Generar nuevos ejercicios de nivel 1
+        'ejercicios': ejercicios
     })
 
-@app.route('/api/ejercicios/suma/configurar', methods=['POST'])
+@app.route('/api/grupos/<int:grupo_id>/analitica')
+@login_required
+def analitica_grupo(grupo_id):
+    """Informe del grupo para su docente, calculado sobre los contadores en memoria"""
+    # El docente se comprueba siempre en la base de datos: el resumen puede ser anterior
+    # a una reasignación del grupo
+    grupo = db.session.execute(select(Grupo.docente_id).where(Grupo.id == grupo_id)).first()
+    if grupo is None:
+        return jsonify({
+            'success': False,
+            'error': 'Grupo no encontrado'
+        }), 404
+    if grupo.docente_id != current_user.id:
+        return jsonify({
+            'success': False,
+            'error': 'Solo el docente del grupo puede ver su analítica'
+        }), 403
+    analitica = cargar_analitica()
+    resumen = analitica.obtener(grupo_id)
+    if resumen is not None and resumen.docente_id != grupo.docente_id:
+        analitica.descartar(grupo_id)  # Cambió el grupo desde que se cargó
+        resumen = analitica.obtener(grupo_id)
+    if resumen is None:
+        return jsonify({
+            'success': False,
+            'error': 'Grupo no encontrado'
+        }), 404
+    from analitica import informe
+    return jsonify(informe(resumen,
+                           min_respuestas=app.config['ANALITICA_MIN_RESPUESTAS'],
+                           precision_minima=app.config['ANALITICA_PRECISION_MINIMA'],
+                           racha_maxima=app.config['ANALITICA_RACHA_FALLOS']))
+
+@app.route('/api/exportar/<any({}):tipo>'.format(', '.join(TIPOS_EXPORTACION)))
+@login_required
+def exportar_datos(tipo):
+    """Progreso o intentos en CSV o NDJSON, enviados por trozos a medida que se leen"""
+    from exportacion import FORMATOS, exportar, nombre_archivo
+    formato = request.args.get('formato', 'csv')
+    if formato not in FORMATOS:
+        return jsonify({
+            'success': False,
+            'error': f"Formato no válido; se admiten: {', '.join(FORMATOS)}"
+        }), 400
+    try:
+        desde = datetime.fromisoformat(request.args['desde']) if request.args.get('desde') else None
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'La fecha desde no es válida (AAAA-MM-DD)'
+        }), 400
+    comprimido = request.args.get('gzip', '0') in ('1', 'true')
+
+    grupo_id = request.args.get('grupo', type=int)
+    if grupo_id is None:
+        if current_user.identidad not in app.config['EXPORTACION_IDENTIDADES']:
+            return jsonify({
+                'success': False,
+                'error': 'No tienes permiso para exportar todo el colegio'
+            }), 403
+    else:
+        grupo = db.session.get(Grupo, grupo_id)
+        if grupo is None:
+            return jsonify({
+                'success': False,
+                'error': 'Grupo no encontrado'
+            }), 404
+        if grupo.docente_id != current_user.id and current_user.identidad not in app.config['EXPORTACION_IDENTIDADES']:
+            return jsonify({
+                'success': False,
+                'error': 'Solo el docente del grupo puede exportar sus datos'
+            }), 403
+
+    metricas.incrementar('exportaciones_total', tipo=tipo, formato=formato)
+    trozos = exportar(TIPOS_EXPORTACION[tipo], filas_exportacion(tipo, grupo_id, desde), formato, comprimido)
+    # stream_with_context mantiene la sesión de la base de datos abierta mientras se envía
+    respuesta = Response(stream_with_context(trozos),
+                         mimetype='application/gzip' if comprimido else FORMATOS[formato])
+    respuesta.headers['Content-Disposition'] = \
+        f'attachment; filename="{nombre_archivo(tipo, formato, comprimido)}"'
+    respuesta.cache_control.no_store = True
+    return respuesta
+
+@app.route(f'/api/ejercicios/<{OPERACION}>/configurar', methods=['POST'])
 @login_required
-def configurar_ejercicios_suma():
+def configurar_ejercicios(operacion):
     try:
         data = json.loads(cast(str, request.get_data(as_text=True)))
         if not data:
@@ -271,13 +1085,13 @@ def configurar_ejercicios_suma():
             }), 400
         
         # Obtener el progreso actual del usuario
-        progreso = current_user.get_progreso_suma()
+        progreso = current_user.get_progreso(operacion)
         nivel_actual = progreso.nivel
         
-        # Configurar el generador usando el nivel actual
-        from ejercicios_ia import generador
-        generador.ia.configurar(ejercicios_requeridos)
-        generador.ia.nivel_actual = nivel_actual  # Establecer el nivel actual
+        # Configurar el generador del estudiante usando el nivel actual
+        with cargar_ia().registro.usar(current_user.id, operacion) as generador:
+            generador.configurar(ejercicios_requeridos, nivel_actual)
+        cache_usuarios.invalidar(current_user.id)
         
         return jsonify({
             'success': True,
@@ -297,17 +1111,6 @@ def configurar_ejercicios_suma():
             'error': 'Error interno del servidor'
         }), 500
 
-@app.route('/primaria/operaciones-basicas/resta/ejercicios')
-@login_required
-def ejercicios_resta():
-    # Debes crear la plantilla 'ejercicios/resta.html' o usar una existente
-    # y pasarle los datos necesarios, similar a ejercicios_suma
-    progreso = current_user.get_progreso_resta()  # Debes tener este método
-    return render_template('ejercicios/resta.html',
-                          nivel=progreso.nivel,
-                          ejercicios_completados=progreso.ejercicios_completados,
-                          aciertos=progreso.aciertos)
-
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
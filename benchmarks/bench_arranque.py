@@ -0,0 +1,81 @@
+"""Benchmark de arranque de la aplicación.
+
+Mide, en procesos nuevos, el tiempo de `import app` y la memoria residente
+(RSS) resultante, sin precalentar y con `precalentar_ia()`, que carga numpy y
+scikit-learn como haría la primera petición de ejercicios.
+
+Uso:
+    python benchmarks/bench_arranque.py [--repeticiones 5] [--salida resultados.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Código que ejecuta cada proceso hijo; imprime una línea JSON con sus mediciones
+SONDA = r'''
+import json, sys, time
+def rss_kib():
+    with open('/proc/self/status') as f:
+        for linea in f:
+            if linea.startswith('VmRSS:'):
+                return int(linea.split()[1])
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+inicio = time.perf_counter()
+import app
+importacion = time.perf_counter() - inicio
+precalentamiento = 0.0
+if sys.argv[1] == '1':
+    inicio = time.perf_counter()
+    app.precalentar_ia()
+    precalentamiento = time.perf_counter() - inicio
+print(json.dumps({
+    'importacion_s': importacion,
+    'precalentamiento_s': precalentamiento,
+    'rss_kib': rss_kib(),
+    'sklearn_cargado': 'sklearn' in sys.modules,
+}))
+'''
+
+def medir(precalentar: bool) -> dict:
+    # Sin SABIDURIA_IA_PRECALENTAR: el precalentamiento se mide aparte, tras el import
+    entorno = {k: v for k, v in os.environ.items() if k != 'SABIDURIA_IA_PRECALENTAR'}
+    salida = subprocess.run([sys.executable, '-c', SONDA, '1' if precalentar else '0'],
+                            cwd=RAIZ, env=entorno, capture_output=True, text=True, check=True)
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+def resumir(muestras: list) -> dict:
+    return {
+        'importacion_s': statistics.median(m['importacion_s'] for m in muestras),
+        'precalentamiento_s': statistics.median(m['precalentamiento_s'] for m in muestras),
+        'rss_mib': statistics.median(m['rss_kib'] for m in muestras) / 1024,
+        'sklearn_cargado': muestras[-1]['sklearn_cargado'],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--salida', help='archivo JSON donde guardar los resultados')
+    args = parser.parse_args()
+
+    resultados = {}
+    for nombre, precalentar in (('sin_precalentar', False), ('precalentado', True)):
+        # Una ejecución previa descartada para calentar la caché de archivos del sistema
+        medir(precalentar)
+        resultados[nombre] = resumir([medir(precalentar) for _ in range(args.repeticiones)])
+        r = resultados[nombre]
+        print(f"{nombre:16s} import app: {r['importacion_s'] * 1000:7.1f} ms   "
+              f"precalentar: {r['precalentamiento_s'] * 1000:7.1f} ms   RSS: {r['rss_mib']:6.1f} MiB   "
+              f"sklearn cargado: {r['sklearn_cargado']}")
+
+    if args.salida:
+        with open(args.salida, 'w') as f:
+            json.dump(resultados, f, indent=2)
+
+if __name__ == '__main__':
+    main()
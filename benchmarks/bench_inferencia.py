@@ -0,0 +1,69 @@
+"""Micro-benchmark de inferencia del árbol de dificultad.
+
+Compara DecisionTreeRegressor.predict con ArbolCompilado.predecir (una fila)
+y predict_many (muchos estudiantes a la vez). Que las predicciones son
+idénticas bit a bit lo comprueba tests/test_arbol_compilado.py.
+
+Uso:
+    python benchmarks/bench_inferencia.py [--estudiantes 300]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sklearn.tree import DecisionTreeRegressor  # noqa: E402
+from ejercicios_ia import ArbolCompilado, predict_many  # noqa: E402
+
+def datos_sinteticos(rng: np.random.Generator, n: int):
+    """Filas con la forma de _calcular_caracteristicas y objetivos de _calcular_dificultad_optima"""
+    X = np.column_stack([
+        rng.integers(1, 4, n),
+        rng.integers(0, 6, n) / 5,
+        rng.uniform(1, 20, n),
+        rng.integers(0, 6, n),
+        rng.integers(0, 8, n),
+        rng.integers(1, 11, n).astype(float)
+    ])
+    y = rng.choice([0.5, 0.9, 1.0, 1.1, 2.0], n)
+    return X, y
+
+def entrenar(rng: np.random.Generator, n: int = 60) -> DecisionTreeRegressor:
+    X, y = datos_sinteticos(rng, n)
+    return DecisionTreeRegressor(max_depth=4, min_samples_split=5, min_samples_leaf=2).fit(X, y)
+
+def medir(func, repeticiones: int) -> float:
+    """Mejor tiempo por llamada en microsegundos"""
+    return min(timeit.repeat(func, number=repeticiones, repeat=5)) / repeticiones * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--estudiantes', type=int, default=300, help='estudiantes en la predicción por lotes')
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.semilla)
+
+    modelos = [entrenar(rng) for _ in range(args.estudiantes)]
+    arboles = [ArbolCompilado.desde_modelo(m) for m in modelos]
+    filas, _ = datos_sinteticos(rng, args.estudiantes)
+
+    # Una fila, como en cada petición
+    fila = filas[0].tolist()
+    t_sklearn = medir(lambda: modelos[0].predict([fila])[0], 500)
+    t_compilado = medir(lambda: arboles[0].predecir(fila), 20000)
+    print(f'Una fila    sklearn: {t_sklearn:8.2f} us   compilado: {t_compilado:8.2f} us   '
+          f'({t_sklearn / t_compilado:.0f}x)')
+
+    # Un lote con un árbol distinto por estudiante
+    t_sklearn_lote = medir(lambda: [m.predict(f.reshape(1, -1)) for m, f in zip(modelos, filas)], 3)
+    t_lote = medir(lambda: predict_many(arboles, filas), 50)
+    print(f'{args.estudiantes} estudiantes  sklearn: {t_sklearn_lote:8.0f} us   predict_many: {t_lote:8.0f} us   '
+          f'({t_sklearn_lote / t_lote:.0f}x)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark de los motores de dificultad frente a la longitud del historial.
+
+Para cada longitud de historial compara el coste de incorporar una muestra nueva:
+reentrenar el árbol desde cero (MotorArbol, amortizado entre las muestras que
+agrupa el planificador) o actualizar las cubetas (MotorCubetas). También mide
+la predicción de una fila y el error absoluto medio sobre respuestas posteriores.
+Los datos salen de TrueAISystem con estudiantes simulados, así que las
+características y los objetivos son los reales.
+
+Uso:
+    python benchmarks/bench_motores.py [--historiales 100 1000 10000 50000] [--muestras-reentreno 5]
+"""
+import argparse
+import os
+import sys
+import time
+import timeit
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(RAIZ))
+sys.path.insert(0, RAIZ)
+
+from ejercicios_ia import MotorArbol, MotorCubetas, TrueAISystem  # noqa: E402
+from simulador_estudiantes import PERFILES, TIEMPO_BASE, probabilidad_acierto  # noqa: E402
+
+def historial(n: int, semilla: int):
+    """(X, y) de n respuestas de estudiantes simulados, en el orden en que llegan"""
+    rng = np.random.default_rng(semilla)
+    ia = TrueAISystem(motor=MotorArbol.nombre)
+    perfiles = list(PERFILES.values())
+    perfil, nivel = perfiles[0], 1
+    for k in range(n):
+        if k % 200 == 0:
+            # Otro estudiante cada 200 respuestas, empezando en un nivel al azar
+            perfil, nivel = perfiles[rng.integers(len(perfiles))], int(rng.integers(1, 4))
+        correcto = bool(rng.random() < probabilidad_acierto(perfil, nivel, k % 200))
+        tiempo = TIEMPO_BASE[nivel] * perfil['velocidad'] * rng.lognormal(0, 0.3)
+        ia.registrar_resultado(nivel, correcto, tiempo, entrenar=False)
+        if rng.random() < 0.05:
+            nivel = int(np.clip(nivel + rng.choice([-1, 1]), 1, 3))
+    X, y = ia.datos.vistas()
+    return X.copy(), y.copy()
+
+def medir(func, repeticiones: int) -> float:
+    """Mejor tiempo por llamada en microsegundos"""
+    return min(timeit.repeat(func, number=repeticiones, repeat=3)) / repeticiones * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--historiales', type=int, nargs='+', default=[100, 1000, 10000, 50000])
+    parser.add_argument('--muestras-reentreno', type=int, default=5,
+                        help='muestras que agrupa cada reentrenamiento del árbol (IA_REENTRENAR_MUESTRAS)')
+    parser.add_argument('--prueba', type=int, default=2000, help='respuestas posteriores para medir el error')
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args()
+
+    maximo = max(args.historiales) + args.prueba
+    inicio = time.perf_counter()
+    X, y = historial(maximo, args.semilla)
+    print(f'{maximo} respuestas simuladas en {time.perf_counter() - inicio:.1f} s')
+    print(f"{'historial':>9} | {'árbol: reentreno':>16} {'por muestra':>12} {'predicción':>11} {'MAE':>6} | "
+          f"{'cubetas: muestra':>16} {'predicción':>11} {'MAE':>6}")
+
+    for n in args.historiales:
+        X_n, y_n = X[:n], y[:n]
+        X_prueba, y_prueba = X[n:n + args.prueba], y[n:n + args.prueba]
+        filas = X_prueba.tolist()
+
+        arbol_motor = MotorArbol()
+        repeticiones = max(1, min(50, 20000 // n))
+        t_reentreno = medir(lambda: arbol_motor.entrenar(X_n, y_n), repeticiones)
+        _, arbol = arbol_motor.entrenar(X_n, y_n)
+        t_pred_arbol = medir(lambda: arbol.predecir(filas[0]), 20000)
+        mae_arbol = float(np.abs(arbol.predecir_lote(X_prueba) - y_prueba).mean())
+
+        cubetas = MotorCubetas()
+        cubetas.entrenar(X_n, y_n)
+        mae_cubetas = float(np.abs(np.array([cubetas.predecir(f) for f in filas]) - y_prueba).mean())
+        t_pred_cubetas = medir(lambda: cubetas.predecir(filas[0]), 20000)
+        # Coste de aprender las respuestas posteriores una a una sobre el historial de n filas
+        objetivos = y_prueba.tolist()
+        inicio = time.perf_counter()
+        for fila, objetivo in zip(filas, objetivos):
+            cubetas.agregar(fila, objetivo)
+        t_muestra = (time.perf_counter() - inicio) / len(filas) * 1e6
+
+        print(f'{n:>9} | {t_reentreno / 1e3:>13.2f} ms {t_reentreno / args.muestras_reentreno:>9.0f} us '
+              f'{t_pred_arbol:>8.2f} us {mae_arbol:>6.3f} | {t_muestra:>13.2f} us {t_pred_cubetas:>8.2f} us '
+              f'{mae_cubetas:>6.3f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark de la predicción agrupada entre peticiones concurrentes.
+
+Lanza N hilos que imitan peticiones: cada uno tiene el árbol de su estudiante,
+hace un poco de trabajo propio de la petición y predice la dificultad de una fila.
+Compara la predicción individual (ArbolCompilado.predecir) con PredictorPorLotes
+para varias ventanas de espera e informa del rendimiento, los percentiles
+p50/p95/p99 de latencia por predicción y el tamaño medio de los lotes.
+
+Uso:
+    python benchmarks/bench_prediccion_lotes.py [--hilos 32] [--peticiones 500] [--ventanas 0.0005 0.002]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(RAIZ))
+sys.path.insert(0, RAIZ)
+
+from bench_inferencia import datos_sinteticos, entrenar  # noqa: E402
+from carga_api import percentil  # noqa: E402
+from ejercicios_ia import ArbolCompilado, PredictorPorLotes  # noqa: E402
+
+def ejecutar(predecir, arboles, filas, peticiones: int, trabajo: float):
+    """Lanza un hilo por árbol y devuelve (segundos totales, latencias ordenadas)"""
+    latencias = []
+    lock = threading.Lock()
+    barrera = threading.Barrier(len(arboles) + 1)
+
+    def estudiante(arbol, fila):
+        propias = []
+        barrera.wait()
+        for _ in range(peticiones):
+            if trabajo:
+                time.sleep(trabajo)  # Resto de la petición: SQL, plantillas, E/S
+            inicio = time.perf_counter()
+            predecir(arbol, fila)
+            propias.append(time.perf_counter() - inicio)
+        with lock:
+            latencias.extend(propias)
+
+    hilos = [threading.Thread(target=estudiante, args=(a, f)) for a, f in zip(arboles, filas)]
+    for hilo in hilos:
+        hilo.start()
+    barrera.wait()
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.join()
+    return time.perf_counter() - inicio, sorted(latencias)
+
+def informar(nombre: str, total: float, latencias: list, extra: str = ''):
+    us = [v * 1e6 for v in latencias]
+    print(f'{nombre:<22} {len(latencias) / total:10.0f} pred/s   '
+          f'p50 {percentil(us, 50):8.1f} us   p95 {percentil(us, 95):8.1f} us   '
+          f'p99 {percentil(us, 99):8.1f} us{extra}')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hilos', type=int, default=32, help='peticiones concurrentes')
+    parser.add_argument('--peticiones', type=int, default=500, help='predicciones por hilo')
+    parser.add_argument('--ventanas', type=float, nargs='+', default=[0.0005, 0.002],
+                        help='ventanas de espera del predictor agrupado, en segundos')
+    parser.add_argument('--lote-maximo', type=int, default=64)
+    parser.add_argument('--trabajo', type=float, default=0.0,
+                        help='segundos de trabajo simulado por petición antes de predecir')
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.semilla)
+    arboles = [ArbolCompilado.desde_modelo(entrenar(rng)) for _ in range(args.hilos)]
+    filas = datos_sinteticos(rng, args.hilos)[0].tolist()
+
+    # Las dos rutas deben predecir lo mismo
+    predictor = PredictorPorLotes(args.ventanas[0], args.lote_maximo)
+    for arbol, fila in zip(arboles, filas):
+        assert predictor.predecir(arbol, fila) == arbol.predecir(fila), 'el predictor agrupado difiere'
+    predictor.detener()
+
+    print(f'{args.hilos} hilos x {args.peticiones} predicciones, trabajo por petición {args.trabajo * 1e3:.1f} ms')
+    total, latencias = ejecutar(lambda a, f: a.predecir(f), arboles, filas, args.peticiones, args.trabajo)
+    informar('individual', total, latencias)
+    for ventana in args.ventanas:
+        predictor = PredictorPorLotes(ventana, args.lote_maximo)
+        total, latencias = ejecutar(predictor.predecir, arboles, filas, args.peticiones, args.trabajo)
+        predictor.detener()
+        media = predictor.predicciones / predictor.lotes if predictor.lotes else 0
+        informar(f'lotes ventana {ventana * 1e3:.1f} ms', total, latencias, f'   lote medio {media:.1f}')
+
+if __name__ == '__main__':
+    main()
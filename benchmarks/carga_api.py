@@ -0,0 +1,190 @@
+"""Prueba de carga y latencia de la API de ejercicios.
+
+Simula estudiantes concurrentes con el cliente de pruebas de Flask sobre una base
+de datos SQLite temporal: cada uno inicia sesión, pide /api/ejercicios/suma y
+envía /verificar con tiempos de respuesta realistas. Informa el rendimiento, los
+percentiles p50/p95/p99 por endpoint, las consultas SQL por petición y los
+entrenamientos del modelo por respuesta. Los resultados se guardan en JSON para
+comparar ejecuciones.
+
+Uso:
+    python benchmarks/carga_api.py [--estudiantes 50] [--respuestas 40] [--salida r.json] [--comparar base.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+def percentil(valores: list, p: float) -> float:
+    """Percentil por rango más cercano sobre valores ordenados"""
+    if not valores:
+        return 0.0
+    indice = min(len(valores) - 1, max(0, int(round(p / 100 * len(valores) + 0.5)) - 1))
+    return valores[indice]
+
+class Medidor:
+    """Acumula latencias y consultas SQL por endpoint de forma segura entre hilos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.latencias = defaultdict(list)
+        self.consultas = defaultdict(list)
+        self.errores = defaultdict(int)
+
+    def contar_consulta(self, *args):
+        # El cliente de pruebas ejecuta la petición en el hilo que la hace
+        self._local.consultas = getattr(self._local, 'consultas', 0) + 1
+
+    def medir(self, endpoint: str, peticion):
+        self._local.consultas = 0
+        inicio = time.perf_counter()
+        respuesta = peticion()
+        duracion = time.perf_counter() - inicio
+        with self._lock:
+            self.latencias[endpoint].append(duracion)
+            self.consultas[endpoint].append(self._local.consultas)
+            if respuesta.status_code >= 400:
+                self.errores[endpoint] += 1
+        return respuesta
+
+def estudiante(app, medidor: Medidor, identidad: str, respuestas: int, habilidad: float,
+               pausa: float, semilla: int):
+    """Un estudiante sintético: acierta con probabilidad `habilidad` y tarda según una lognormal"""
+    rng = random.Random(semilla)
+    cliente = app.test_client()
+    medidor.medir('POST /login', lambda: cliente.post('/login', data={'identidad': identidad, 'password': identidad}))
+    for _ in range(respuestas):
+        ejercicio = medidor.medir('GET /api/ejercicios/suma',
+                                  lambda: cliente.get('/api/ejercicios/suma')).get_json()[0]
+        correcto = rng.random() < habilidad
+        tiempo = min(60.0, rng.lognormvariate(1.8, 0.5))
+        if pausa:
+            time.sleep(pausa)
+        medidor.medir('POST /api/ejercicios/suma/verificar', lambda: cliente.post('/api/ejercicios/suma/verificar', json={
+            'respuesta': ejercicio['respuesta'] if correcto else ejercicio['respuesta'] + 1,
+            'respuesta_correcta': ejercicio['respuesta'],
+            'tiempo': tiempo,
+            'num1': ejercicio['num1'],
+            'num2': ejercicio['num2']
+        }))
+
+def resumen(medidor: Medidor, duracion: float, entrenamientos: int) -> dict:
+    endpoints = {}
+    for endpoint, latencias in sorted(medidor.latencias.items()):
+        ordenadas = sorted(latencias)
+        consultas = medidor.consultas[endpoint]
+        endpoints[endpoint] = {
+            'peticiones': len(ordenadas),
+            'errores': medidor.errores[endpoint],
+            'rps': len(ordenadas) / duracion,
+            'p50_ms': percentil(ordenadas, 50) * 1000,
+            'p95_ms': percentil(ordenadas, 95) * 1000,
+            'p99_ms': percentil(ordenadas, 99) * 1000,
+            'max_ms': ordenadas[-1] * 1000,
+            'consultas_sql_media': sum(consultas) / len(consultas),
+            'consultas_sql_max': max(consultas)
+        }
+    verificaciones = endpoints.get('POST /api/ejercicios/suma/verificar', {}).get('peticiones', 0)
+    total = sum(len(v) for v in medidor.latencias.values())
+    return {
+        'duracion_s': duracion,
+        'peticiones': total,
+        'rps': total / duracion,
+        'entrenamientos': entrenamientos,
+        'entrenamientos_por_respuesta': entrenamientos / verificaciones if verificaciones else 0.0,
+        'endpoints': endpoints
+    }
+
+def imprimir(resultado: dict, base: dict = None):
+    print(f"{resultado['peticiones']} peticiones en {resultado['duracion_s']:.2f} s "
+          f"({resultado['rps']:.0f} peticiones/s), "
+          f"{resultado['entrenamientos_por_respuesta']:.3f} entrenamientos por respuesta")
+    print(f"{'endpoint':40s} {'rps':>8s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'SQL':>5s} {'err':>4s}")
+    for endpoint, r in resultado['endpoints'].items():
+        linea = (f"{endpoint:40s} {r['rps']:8.0f} {r['p50_ms']:8.2f} {r['p95_ms']:8.2f} {r['p99_ms']:8.2f} "
+                 f"{r['consultas_sql_media']:5.1f} {r['errores']:4d}")
+        anterior = (base or {}).get('endpoints', {}).get(endpoint)
+        if anterior:
+            linea += f"   p95 {r['p95_ms'] - anterior['p95_ms']:+.2f} ms, SQL {r['consultas_sql_media'] - anterior['consultas_sql_media']:+.1f}"
+        print(linea)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--estudiantes', type=int, default=50, help='estudiantes concurrentes')
+    parser.add_argument('--respuestas', type=int, default=40, help='respuestas por estudiante')
+    parser.add_argument('--pausa', type=float, default=0.0, help='segundos de espera real entre pedir y responder')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--diferida', action='store_true', help='activar PROGRESO_ESCRITURA_DIFERIDA')
+    parser.add_argument('--salida', help='archivo JSON donde guardar los resultados')
+    parser.add_argument('--comparar', help='archivo JSON de una ejecución anterior para comparar')
+    args = parser.parse_args()
+
+    directorio = tempfile.mkdtemp(prefix='carga_api_')
+    os.environ['SABIDURIA_DATABASE_URI'] = 'sqlite:///' + os.path.join(directorio, 'carga.db')
+    os.environ['SABIDURIA_MODELOS_DIR'] = os.path.join(directorio, 'modelos')
+
+    import warnings
+    warnings.filterwarnings('ignore')
+    from sqlalchemy import event
+    from werkzeug.security import generate_password_hash
+    import app as aplicacion
+
+    app, db = aplicacion.app, aplicacion.db
+    app.config['PROGRESO_ESCRITURA_DIFERIDA'] = args.diferida
+    medidor = Medidor()
+    with app.app_context():
+        db.create_all()
+        # Hash rápido: el coste del hash de contraseñas no es lo que se mide aquí
+        db.session.add_all([
+            aplicacion.Usuario(identidad=f'e{i}', password=generate_password_hash(f'e{i}', method='pbkdf2:sha256:1'))
+            for i in range(args.estudiantes)
+        ])
+        db.session.commit()
+        event.listen(db.engine, 'before_cursor_execute', medidor.contar_consulta)
+
+    ia = aplicacion.cargar_ia()
+    ia.precalentar()
+    entrenamientos_antes = ia.planificador.metricas()['reentrenamientos']
+
+    rng = random.Random(args.semilla)
+    hilos = [
+        threading.Thread(target=estudiante, args=(app, medidor, f'e{i}', args.respuestas,
+                                                  rng.uniform(0.4, 0.95), args.pausa, rng.random()))
+        for i in range(args.estudiantes)
+    ]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+
+    aplicacion.escritor_progreso.vaciar()
+    aplicacion.buffer_intentos.vaciar()
+    resultado = resumen(medidor, duracion, ia.planificador.metricas()['reentrenamientos'] - entrenamientos_antes)
+    resultado['configuracion'] = vars(args)
+    resultado['fecha'] = datetime.now().isoformat(timespec='seconds')
+    resultado['python'] = platform.python_version()
+
+    base = None
+    if args.comparar:
+        with open(args.comparar) as f:
+            base = json.load(f)
+    imprimir(resultado, base)
+    if args.salida:
+        with open(args.salida, 'w') as f:
+            json.dump(resultado, f, indent=2)
+
+if __name__ == '__main__':
+    main()
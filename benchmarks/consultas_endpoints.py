@@ -0,0 +1,116 @@
+"""Comprobación del número de sentencias SQL de cada endpoint de ejercicios.
+
+Recorre con el cliente de pruebas de Flask, sobre una base de datos SQLite temporal,
+el camino de un estudiante nuevo: primera visita a una operación (se crea su fila de
+progreso), peticiones de ejercicios, respuestas sueltas y en lote, configuración y
+reinicio. Cuenta las sentencias que ejecuta cada petición y las compara con
+LIMITES; si alguna petición se pasa, lo informa y termina con código 1, así que
+sirve como prueba de regresión de consultas.
+
+Uso:
+    python benchmarks/consultas_endpoints.py [--diferida] [--sin-cache]
+"""
+import argparse
+import os
+import sys
+import tempfile
+from typing import Dict, List
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(RAIZ))
+sys.path.insert(0, RAIZ)
+
+from carga_api import Medidor  # noqa: E402
+
+# Máximo de sentencias SQL por petición. Incluye la consulta de load_user (usuario y
+# progresos juntos), que se hace siempre sin la caché de usuarios y con ella después de
+# cada progreso guardado. La primera petición de API de una operación crea su progreso
+# y reconstruye el generador (progreso e intentos).
+LIMITES: Dict[str, int] = {
+    'GET página de ejercicios (primera visita)': 2,
+    'GET página de ejercicios': 1,
+    'GET /api/ejercicios (primera visita)': 4,
+    'GET /api/ejercicios': 1,
+    'POST /api/ejercicios/verificar': 2,
+    'POST /api/ejercicios/verificar-lote': 2,
+    'POST /api/ejercicios/configurar': 1,
+    'POST /api/ejercicios/reiniciar': 2,
+}
+
+def recorrer(cliente, medidor: Medidor):
+    """Peticiones de un estudiante recién creado, en el orden en que las haría"""
+    def medir(nombre: str, peticion):
+        respuesta = medidor.medir(nombre, peticion)
+        assert respuesta.status_code < 400, f'{nombre}: {respuesta.status_code}'
+        return respuesta
+
+    # La página crea el progreso de suma; la API crea el de resta y su generador
+    medir('GET página de ejercicios (primera visita)',
+          lambda: cliente.get('/primaria/operaciones-basicas/suma/ejercicios'))
+    medir('GET página de ejercicios', lambda: cliente.get('/primaria/operaciones-basicas/suma/ejercicios'))
+    medir('GET /api/ejercicios (primera visita)', lambda: cliente.get('/api/ejercicios/resta'))
+    for _ in range(3):
+        ejercicio = medir('GET /api/ejercicios', lambda: cliente.get('/api/ejercicios/resta')).get_json()[0]
+        medir('POST /api/ejercicios/verificar', lambda: cliente.post('/api/ejercicios/resta/verificar', json={
+            'respuesta': ejercicio['respuesta'],
+            'respuesta_correcta': ejercicio['respuesta'],
+            'tiempo': 4.0,
+            'num1': ejercicio['num1'],
+            'num2': ejercicio['num2']
+        }))
+    ejercicios = medir('GET /api/ejercicios', lambda: cliente.get('/api/ejercicios/resta?count=5')).get_json()
+    medir('POST /api/ejercicios/verificar-lote', lambda: cliente.post('/api/ejercicios/resta/verificar-lote', json={
+        'respuestas': [{'respuesta': e['respuesta'], 'respuesta_correcta': e['respuesta'], 'tiempo': 5.0}
+                       for e in ejercicios]
+    }))
+    medir('POST /api/ejercicios/configurar',
+          lambda: cliente.post('/api/ejercicios/resta/configurar', json={'ejercicios_requeridos': 4}))
+    medir('POST /api/ejercicios/reiniciar', lambda: cliente.post('/api/ejercicios/resta/reiniciar'))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--diferida', action='store_true', help='activar PROGRESO_ESCRITURA_DIFERIDA')
+    parser.add_argument('--sin-cache', action='store_true', help='desactivar la caché de usuarios')
+    args = parser.parse_args()
+
+    directorio = tempfile.mkdtemp(prefix='consultas_')
+    os.environ['SABIDURIA_DATABASE_URI'] = 'sqlite:///' + os.path.join(directorio, 'consultas.db')
+    os.environ['SABIDURIA_MODELOS_DIR'] = os.path.join(directorio, 'modelos')
+
+    import warnings
+    warnings.filterwarnings('ignore')
+    from sqlalchemy import event
+    from werkzeug.security import generate_password_hash
+    import app as aplicacion
+
+    app, db = aplicacion.app, aplicacion.db
+    app.config['PROGRESO_ESCRITURA_DIFERIDA'] = args.diferida
+    if args.sin_cache:
+        app.config['USUARIOS_CACHE_TTL'] = 0
+    with app.app_context():
+        db.create_all()
+        db.session.add(aplicacion.Usuario(identidad='e0', password=generate_password_hash('e0', method='pbkdf2:sha256:1')))
+        db.session.commit()
+        medidor = Medidor()
+        event.listen(db.engine, 'before_cursor_execute', medidor.contar_consulta)
+
+    cliente = app.test_client()
+    cliente.post('/login', data={'identidad': 'e0', 'password': 'e0'})
+    recorrer(cliente, medidor)
+    aplicacion.escritor_progreso.vaciar()
+    aplicacion.buffer_intentos.vaciar()
+
+    excedidos: List[str] = []
+    print(f"{'endpoint':45s} {'SQL máx':>8s} {'límite':>7s}")
+    for nombre, limite in LIMITES.items():
+        maximo = max(medidor.consultas[nombre])
+        marca = '' if maximo <= limite else '  EXCEDE'
+        if marca:
+            excedidos.append(nombre)
+        print(f'{nombre:45s} {maximo:8d} {limite:7d}{marca}')
+    if excedidos:
+        print(f'{len(excedidos)} endpoints superan su límite de consultas')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""Simulador de estudiantes sintéticos para TrueAISystem y GeneradorEjercicios.
+
+Cada estudiante simulado tiene un perfil de habilidad, velocidad y fatiga y responde
+a los ejercicios de su propio GeneradorEjercicios. Tras cada respuesta, el nivel se
+actualiza con la misma regla que la API (nivel_siguiente). Los estudiantes se
+reparten entre un pool de procesos. El simulador informa del rendimiento (respuestas
+por segundo y por núcleo) y de la calidad de la adaptación de cada perfil: cuánto
+se tarda en llegar al nivel que corresponde al estudiante, cuánto tiempo se pasa en
+él y con qué frecuencia el nivel oscila.
+
+Uso:
+    python benchmarks/simulador_estudiantes.py [--estudiantes 1000] [--respuestas 60] [--procesos 0]
+        [--perfiles medio avanzado] [--motor cubetas] [--salida r.json]
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(RAIZ))
+sys.path.insert(0, RAIZ)
+
+from carga_api import percentil  # noqa: E402
+from ejercicios_ia import MOTORES, GeneradorEjercicios, PlanificadorReentrenamiento, nivel_siguiente  # noqa: E402
+
+# habilidad: nivel (continuo) que el estudiante domina; velocidad: factor sobre el
+# tiempo base de respuesta; fatiga: precisión que pierde cada 100 respuestas
+PERFILES: Dict[str, Dict[str, float]] = {
+    'principiante': {'habilidad': 1.2, 'velocidad': 1.4, 'fatiga': 0.05},
+    'medio': {'habilidad': 2.2, 'velocidad': 1.0, 'fatiga': 0.05},
+    'avanzado': {'habilidad': 3.5, 'velocidad': 0.7, 'fatiga': 0.02},
+    'lento': {'habilidad': 2.5, 'velocidad': 2.0, 'fatiga': 0.0},
+    'cansado': {'habilidad': 2.8, 'velocidad': 1.0, 'fatiga': 0.4},
+}
+
+PENDIENTE = 3.0  # Cuánto cae la probabilidad de acertar al superar la habilidad
+DOMINIO = 0.7  # Probabilidad de acierto con la que un nivel se considera adecuado
+TIEMPO_BASE = {1: 5.0, 2: 8.0, 3: 12.0}  # Segundos por respuesta de un estudiante medio
+
+def probabilidad_acierto(perfil: Dict[str, float], nivel: int, respondidas: int) -> float:
+    logistica = 1 / (1 + math.exp(-PENDIENTE * (perfil['habilidad'] - nivel + 0.5)))
+    return min(0.98, max(0.02, logistica - perfil['fatiga'] * respondidas / 100))
+
+def nivel_objetivo(perfil: Dict[str, float]) -> int:
+    """Nivel más alto que el estudiante domina sin fatiga"""
+    return max([1] + [n for n in (1, 2, 3) if probabilidad_acierto(perfil, n, 0) >= DOMINIO])
+
+def simular_estudiante(nombre_perfil: str, respuestas: int, semilla: int, operacion: str,
+                       muestras_reentreno: int, motor: str = 'arbol') -> Dict[str, Any]:
+    """Recorre `respuestas` ejercicios y devuelve las métricas de adaptación del estudiante"""
+    perfil = PERFILES[nombre_perfil]
+    rng = np.random.default_rng(semilla)
+    generador = GeneradorEjercicios(operacion, motor=motor)
+    generador._rng = np.random.default_rng(semilla + 1)
+    # Entrenar en el mismo hilo y solo por número de muestras: resultados reproducibles
+    generador.ia.planificador = PlanificadorReentrenamiento(muestras_reentreno, math.inf, sincrono=True)
+
+    objetivo = nivel_objetivo(perfil)
+    nivel = 1
+    llegada: Optional[int] = 0 if nivel == objetivo else None
+    cambios = inversiones = en_objetivo = 0
+    direccion = 0
+    for k in range(respuestas):
+        generador.generar_ejercicio(nivel)
+        correcto = bool(rng.random() < probabilidad_acierto(perfil, nivel, k))
+        tiempo = (TIEMPO_BASE[nivel] * perfil['velocidad'] * (1 + perfil['fatiga'] * k / 100)
+                  * (1.0 if correcto else 1.3) * rng.lognormal(0, 0.3))
+        generador.registrar_resultado(correcto, tiempo, nivel=nivel)
+        nuevo = nivel_siguiente(nivel, generador.ia.predecir_dificultad(nivel))
+        if nuevo != nivel:
+            cambios += 1
+            paso = 1 if nuevo > nivel else -1
+            if direccion and paso != direccion:
+                inversiones += 1
+            direccion = paso
+            nivel = nuevo
+        if llegada is None and nivel == objetivo:
+            llegada = k + 1
+        if llegada is not None and nivel == objetivo:
+            en_objetivo += 1
+    return {
+        'perfil': nombre_perfil,
+        'objetivo': objetivo,
+        'nivel_final': nivel,
+        'llegada': llegada,
+        'cambios': cambios,
+        'inversiones': inversiones,
+        'en_objetivo': en_objetivo,
+        'respuestas': respuestas
+    }
+
+def simular_lote(tareas: List[tuple], respuestas: int, operacion: str, muestras_reentreno: int,
+                 motor: str) -> Dict[str, Any]:
+    """Simula un lote de estudiantes en un proceso del pool"""
+    inicio = time.process_time()
+    resultados = [simular_estudiante(perfil, respuestas, semilla, operacion, muestras_reentreno, motor)
+                  for perfil, semilla in tareas]
+    return {'resultados': resultados, 'cpu_s': time.process_time() - inicio}
+
+def resumir(resultados: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Métricas de adaptación agregadas de un conjunto de estudiantes"""
+    llegadas = sorted(r['llegada'] for r in resultados if r['llegada'] is not None)
+    total = sum(r['respuestas'] for r in resultados)
+    return {
+        'estudiantes': len(resultados),
+        'objetivo': sorted({r['objetivo'] for r in resultados}),
+        'alcanzan_objetivo': len(llegadas) / len(resultados),
+        'llegada_p50': percentil(llegadas, 50) if llegadas else None,
+        'llegada_p90': percentil(llegadas, 90) if llegadas else None,
+        # Respuestas en el nivel objetivo una vez alcanzado, sobre las restantes
+        'en_objetivo': sum(r['en_objetivo'] for r in resultados)
+        / max(1, sum(r['respuestas'] - r['llegada'] + 1 for r in resultados if r['llegada'] is not None)),
+        'final_en_objetivo': sum(r['nivel_final'] == r['objetivo'] for r in resultados) / len(resultados),
+        'cambios_por_100': 100 * sum(r['cambios'] for r in resultados) / total,
+        'oscilaciones_por_100': 100 * sum(r['inversiones'] for r in resultados) / total
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--estudiantes', type=int, default=1000)
+    parser.add_argument('--respuestas', type=int, default=60, help='respuestas por estudiante')
+    parser.add_argument('--perfiles', nargs='+', choices=list(PERFILES), default=list(PERFILES),
+                        help='perfiles que se reparten por turnos entre los estudiantes')
+    parser.add_argument('--operacion', default='suma')
+    parser.add_argument('--motor', choices=list(MOTORES), default='arbol', help='motor de dificultad (IA_MOTOR)')
+    parser.add_argument('--procesos', type=int, default=0, help='procesos del pool (0 = uno por núcleo)')
+    parser.add_argument('--lote', type=int, default=25, help='estudiantes por tarea del pool')
+    parser.add_argument('--reentrenar-muestras', type=int, default=5,
+                        help='muestras nuevas que disparan un reentrenamiento (IA_REENTRENAR_MUESTRAS)')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--salida', help='guardar los resultados en este JSON')
+    args = parser.parse_args()
+
+    procesos = args.procesos or os.cpu_count() or 1
+    tareas = [(args.perfiles[i % len(args.perfiles)], args.semilla + 2 * i) for i in range(args.estudiantes)]
+    lotes = [tareas[i:i + args.lote] for i in range(0, len(tareas), args.lote)]
+
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        partes = list(pool.map(simular_lote, lotes, [args.respuestas] * len(lotes),
+                               [args.operacion] * len(lotes), [args.reentrenar_muestras] * len(lotes),
+                               [args.motor] * len(lotes)))
+    duracion = time.perf_counter() - inicio
+
+    resultados = [r for parte in partes for r in parte['resultados']]
+    cpu = sum(parte['cpu_s'] for parte in partes)
+    total = len(resultados) * args.respuestas
+    rendimiento = {
+        'respuestas': total,
+        'procesos': procesos,
+        'duracion_s': duracion,
+        'respuestas_s': total / duracion,
+        'respuestas_s_nucleo': total / cpu if cpu else None
+    }
+    perfiles = {nombre: resumir([r for r in resultados if r['perfil'] == nombre]) for nombre in args.perfiles}
+
+    print(f"Motor {args.motor}: {len(resultados)} estudiantes x {args.respuestas} respuestas en {duracion:.1f} s con {procesos} procesos: "
+          f"{rendimiento['respuestas_s']:.0f} respuestas/s, {rendimiento['respuestas_s_nucleo'] or 0:.0f} por núcleo")
+    print(f"{'perfil':<13} {'objetivo':>8} {'alcanzan':>9} {'llegada p50':>12} {'p90':>5} "
+          f"{'en objetivo':>12} {'final ok':>9} {'cambios/100':>12} {'oscil./100':>11}")
+    for nombre, r in perfiles.items():
+        print(f"{nombre:<13} {','.join(map(str, r['objetivo'])):>8} {r['alcanzan_objetivo']:>9.0%} "
+              f"{r['llegada_p50'] if r['llegada_p50'] is not None else '-':>12} "
+              f"{r['llegada_p90'] if r['llegada_p90'] is not None else '-':>5} "
+              f"{r['en_objetivo']:>12.0%} {r['final_en_objetivo']:>9.0%} "
+              f"{r['cambios_por_100']:>12.1f} {r['oscilaciones_por_100']:>11.1f}")
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump({'argumentos': vars(args), 'rendimiento': rendimiento, 'perfiles': perfiles},
+                      archivo, indent=2, ensure_ascii=False)
+        print(f"Resultados guardados en {args.salida}")
+
+if __name__ == '__main__':
+    main()
@@ -1,29 +1,550 @@
 import numpy as np
-import pandas as pd
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Callable, Iterable, Iterator, Sequence, cast
 from datetime import datetime
-from sklearn.tree import DecisionTreeRegressor
-from collections import deque
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from array import array
+import logging
+import os
 import random
+import threading
+import time
+
+from metricas import metricas
+from operaciones import OPERACIONES, Operacion
+from persistencia import AlmacenEstadoMemoria
+
+logger = logging.getLogger(__name__)
+
+# Columnas de características en el orden que produce _calcular_caracteristicas
+COLUMNAS_CARACTERISTICAS = (
+    'nivel',
+    'tasa_aciertos',
+    'tiempo_promedio',
+    'ejercicios_consecutivos',
+    'fallos_consecutivos',
+    'ejercicios_requeridos'
+)
+
+# Bytes de una fila de entrenamiento (características y objetivo en float64)
+BYTES_FILA = (len(COLUMNAS_CARACTERISTICAS) + 1) * 8
+
+class RetencionVentana:
+    """Conserva las filas más recientes: el almacén lleno es un búfer circular"""
+
+    nombre = 'ventana'
+
+    def posicion(self, almacen: 'AlmacenEntrenamiento', nivel: int) -> Optional[int]:
+        """Posición donde escribir una fila nueva del nivel, o None para descartarla"""
+        pos = almacen._anadir()
+        if pos is None:
+            pos = almacen._inicio
+            almacen._inicio = (pos + 1) % almacen._n
+        return pos
+
+    def conservar(self, almacen: 'AlmacenEntrenamiento', filas: int) -> np.ndarray:
+        """Posiciones de las `filas` filas que sobreviven a un recorte, en el orden en que se guardan"""
+        return almacen.orden_temporal()[almacen._n - filas:]
+
+    def reconstruir(self, almacen: 'AlmacenEntrenamiento', vistas: Optional[int] = None):
+        """Rehace el estado interno tras reubicar las filas del almacén.
+
+        `vistas` son las filas ofrecidas al almacén desde que se vació, si se conocen
+        (p. ej. al restaurar un estado guardado).
+        """
+
+class RetencionReservorio:
+    """Muestreo de reservorio sesgado hacia lo reciente.
+
+    Con el almacén lleno, una fila nueva entra con probabilidad max(capacidad / vistas,
+    recencia) y sustituye a una al azar. Con recencia 0 es una muestra uniforme de todo
+    el historial; con recencia 1 la presencia de una fila decae exponencialmente con su
+    antigüedad, pero siempre quedan algunas antiguas.
+    """
+
+    nombre = 'reservorio'
+
+    def __init__(self, recencia: float = 0.5, semilla: Optional[int] = None):
+        self.recencia = recencia
+        self.vistas = 0  # Filas ofrecidas al almacén
+        self._rng = random.Random(semilla)
+
+    def posicion(self, almacen: 'AlmacenEntrenamiento', nivel: int) -> Optional[int]:
+        self.vistas += 1
+        pos = almacen._anadir()
+        if pos is not None:
+            return pos
+        if self._rng.random() >= max(almacen._n / self.vistas, self.recencia):
+            return None
+        return self._rng.randrange(almacen._n)
+
+    def conservar(self, almacen: 'AlmacenEntrenamiento', filas: int) -> np.ndarray:
+        return np.sort(np.array(self._rng.sample(range(almacen._n), filas), dtype=np.int64))
+
+    def reconstruir(self, almacen: 'AlmacenEntrenamiento', vistas: Optional[int] = None):
+        self.vistas = max(self.vistas if vistas is None else vistas, almacen._n)
+
+class RetencionEstratificada:
+    """Límite de filas por nivel, para que el nivel en el que más se practica no desplace a los demás.
+
+    Mientras queda sitio, cualquier nivel lo usa. Con el almacén lleno, una fila nueva de
+    un nivel que ya llegó a su límite sustituye a la más antigua de ese nivel; si no, a la
+    más antigua del nivel que más se pasa del suyo. Sin límites explícitos la capacidad se
+    reparte a partes iguales entre los tres niveles; si los límites suman más que la
+    capacidad se escalan.
+    """
+
+    nombre = 'estratificada'
+
+    def __init__(self, capacidad_por_nivel: Optional[Dict[int, int]] = None):
+        self.capacidad_por_nivel = capacidad_por_nivel
+        self._posiciones: Dict[int, deque] = {}  # Nivel -> posiciones de sus filas, de la más antigua a la más nueva
+
+    def _limite(self, almacen: 'AlmacenEntrenamiento', nivel: int) -> int:
+        capacidad = cast(int, almacen.capacidad)
+        if not self.capacidad_por_nivel:
+            return max(1, capacidad // 3)
+        escala = min(1.0, capacidad / sum(self.capacidad_por_nivel.values()))
+        return max(1, int(self.capacidad_por_nivel.get(nivel, 0) * escala))
+
+    def posicion(self, almacen: 'AlmacenEntrenamiento', nivel: int) -> Optional[int]:
+        cola = self._posiciones.setdefault(nivel, deque())
+        pos = almacen._anadir()
+        if pos is None:
+            if len(cola) >= self._limite(almacen, nivel):
+                pos = cola.popleft()
+            else:
+                donante = max(self._posiciones, key=lambda n: len(self._posiciones[n]) - self._limite(almacen, n))
+                pos = self._posiciones[donante].popleft()
+        cola.append(pos)
+        return pos
+
+    def conservar(self, almacen: 'AlmacenEntrenamiento', filas: int) -> np.ndarray:
+        # Repartir las filas en proporción al tamaño de cada nivel, conservando las más recientes
+        colas = [cola for cola in self._posiciones.values() if cola]
+        total = sum(len(cola) for cola in colas)
+        partes = [list(cola)[len(cola) - len(cola) * filas // total:] for cola in colas]
+        return np.array([pos for parte in partes for pos in parte], dtype=np.int64)
+
+    def reconstruir(self, almacen: 'AlmacenEntrenamiento', vistas: Optional[int] = None):
+        self._posiciones = {}
+        for pos, nivel in enumerate(almacen._X[:almacen._n, 0].astype(np.int64).tolist()):
+            self._posiciones.setdefault(nivel, deque()).append(pos)
+
+# Políticas de retención de los datos de entrenamiento (IA_RETENCION)
+RETENCIONES: Dict[str, Callable[..., Any]] = {
+    RetencionVentana.nombre: RetencionVentana,
+    RetencionReservorio.nombre: RetencionReservorio,
+    RetencionEstratificada.nombre: RetencionEstratificada,
+}
+
+class AlmacenEntrenamiento:
+    """Almacén columnar de características y objetivos respaldado por arreglos de NumPy"""
+
+    def __init__(self, capacidad: Optional[int] = None, capacidad_inicial: int = 64,
+                 retencion: Optional[Any] = None):
+        # Sin capacidad crece sin límite; con capacidad, la política de retención decide
+        # qué fila sustituye cada fila nueva (por defecto la más antigua)
+        self.capacidad = capacidad
+        self.retencion = retencion if retencion is not None else RetencionVentana()
+        tamano = capacidad if capacidad is not None else capacidad_inicial
+        self._X = np.empty((max(1, tamano), len(COLUMNAS_CARACTERISTICAS)), dtype=np.float64)
+        self._y = np.empty(max(1, tamano), dtype=np.float64)
+        self._n = 0  # Filas válidas
+        self._inicio = 0  # Posición de la fila más antigua en modo circular
+
+    def _anadir(self) -> Optional[int]:
+        """Reserva la siguiente posición libre; None si el almacén está lleno"""
+        if self._n >= cast(int, self.capacidad):
+            return None
+        self._n += 1
+        return self._n - 1
+
+    def agregar(self, caracteristicas: dict, objetivo: float):
+        """Agrega una fila en O(1) amortizado"""
+        if self.capacidad is None:
+            if self._n == len(self._y):
+                self._crecer()
+            pos = self._n
+            self._n += 1
+        else:
+            pos = self.retencion.posicion(self, int(caracteristicas['nivel']))
+            if pos is None:
+                return  # La política descarta la fila
+        fila = self._X[pos]
+        for i, columna in enumerate(COLUMNAS_CARACTERISTICAS):
+            fila[i] = caracteristicas[columna]
+        self._y[pos] = objetivo
+
+    def _crecer(self):
+        """Duplica la capacidad de los arreglos"""
+        tamano = max(1, len(self._y)) * 2  # Un almacén restaurado sin filas puede tener tamaño 0
+        nuevo_X = np.empty((tamano, self._X.shape[1]), dtype=np.float64)
+        nuevo_y = np.empty(tamano, dtype=np.float64)
+        nuevo_X[:self._n] = self._X[:self._n]
+        nuevo_y[:self._n] = self._y[:self._n]
+        self._X, self._y = nuevo_X, nuevo_y
+
+    def vistas(self) -> tuple[np.ndarray, np.ndarray]:
+        """Devuelve vistas sin copia de las filas válidas (en modo circular sin orden temporal)"""
+        return self._X[:self._n], self._y[:self._n]
+
+    def orden_temporal(self) -> np.ndarray:
+        """Posiciones de las filas de la más antigua a la más reciente (exacto con la ventana)"""
+        return np.roll(np.arange(self._n), -self._inicio)
+
+    def recortar(self, filas: int):
+        """Conserva como mucho `filas` filas elegidas por la política y libera el resto de la memoria.
+
+        La capacidad queda limitada a `filas`, así que el almacén no vuelve a crecer.
+        """
+        filas = max(1, filas)
+        if self.capacidad is None:
+            # Sin límite las filas no pasan por la política: ponerla al día antes de elegir
+            self.retencion.reconstruir(self)
+        conservadas = self.retencion.conservar(self, min(filas, self._n))
+        X, y = self._X[conservadas], self._y[conservadas]
+        self.capacidad = filas
+        self._X = np.empty((filas, len(COLUMNAS_CARACTERISTICAS)), dtype=np.float64)
+        self._y = np.empty(filas, dtype=np.float64)
+        self._n = len(conservadas)
+        self._X[:self._n] = X
+        self._y[:self._n] = y
+        self._inicio = 0
+        self.retencion.reconstruir(self)
+
+    def memoria(self) -> int:
+        """Bytes reservados por los arreglos, incluida la parte aún sin usar"""
+        return self._X.nbytes + self._y.nbytes
+
+    def a_dataframe(self):
+        """Devuelve las filas en orden temporal como DataFrame de pandas, para inspección"""
+        import pandas as pd
+        orden = self.orden_temporal() if self._inicio else slice(None)
+        X, y = self.vistas()
+        datos = pd.DataFrame(X[orden], columns=list(COLUMNAS_CARACTERISTICAS))
+        datos['dificultad_optima'] = y[orden]
+        return datos
+
+    @classmethod
+    def desde_arreglos(cls, X: np.ndarray, y: np.ndarray, inicio: int = 0,
+                       capacidad: Optional[int] = None, retencion: Optional[Any] = None,
+                       vistas: Optional[int] = None) -> 'AlmacenEntrenamiento':
+        """Reconstruye un almacén guardado, usando X e y sin copiarlos cuando encajan tal cual.
+
+        `vistas` son las filas que se ofrecieron al almacén guardado desde que se vació,
+        para que la política de retención siga donde lo dejó.
+        """
+        n = len(y)
+        retencion = retencion if retencion is not None else RetencionVentana()
+        # Sin filas, los arreglos guardados tienen tamaño 0: reservar memoria nueva
+        if n and ((capacidad is None and inicio == 0) or capacidad == n):
+            almacen = cls.__new__(cls)
+            almacen.capacidad = capacidad
+            almacen.retencion = retencion
+            almacen._X, almacen._y = X, y
+            almacen._n = n
+            almacen._inicio = inicio if capacidad is not None else 0
+            retencion.reconstruir(almacen, vistas)
+            return almacen
+        # Capacidad distinta a la guardada: pasar las filas en orden temporal por la política
+        almacen = cls(capacidad=capacidad, capacidad_inicial=n, retencion=retencion)
+        if vistas is not None:
+            # Las filas que siguen se ofrecen otra vez: descontarlas para no contarlas dos veces
+            retencion.reconstruir(almacen, max(0, vistas - n))
+        orden = np.roll(np.arange(n), -inicio)
+        if capacidad is None or isinstance(retencion, RetencionVentana):
+            orden = orden[-capacidad:] if capacidad is not None else orden
+            almacen._X[:len(orden)] = X[orden]
+            almacen._y[:len(orden)] = y[orden]
+            almacen._n = len(orden)
+            return almacen
+        for fila, objetivo in zip(X[orden].tolist(), y[orden].tolist()):
+            almacen.agregar(dict(zip(COLUMNAS_CARACTERISTICAS, fila)), objetivo)
+        return almacen
+
+    def limpiar(self):
+        """Descarta todas las filas conservando la memoria reservada"""
+        self._n = 0
+        self._inicio = 0
+        self.retencion.reconstruir(self, 0)
+
+    def __len__(self) -> int:
+        return self._n
+
+class ArbolCompilado:
+    """Árbol de regresión entrenado reducido a arreglos planos de nodos para inferir sin sklearn.
+
+    Reproduce exactamente DecisionTreeRegressor.predict: las características se redondean
+    a float32 como hace sklearn y se comparan con el umbral float64 de cada nodo.
+    """
+
+    def __init__(self, izquierda: np.ndarray, derecha: np.ndarray, caracteristica: np.ndarray,
+                 umbral: np.ndarray, valor: np.ndarray):
+        self.izquierda = izquierda
+        self.derecha = derecha
+        self.caracteristica = caracteristica
+        self.umbral = umbral
+        self.valor = valor
+        # Copias en listas de Python: indexarlas es mucho más rápido que indexar arreglos
+        self._nodos = (izquierda.tolist(), derecha.tolist(), caracteristica.tolist(),
+                       umbral.tolist(), valor.tolist())
+
+    def memoria(self) -> int:
+        """Bytes aproximados de los nodos (arreglos y sus copias en listas)"""
+        return 2 * sum(a.nbytes for a in (self.izquierda, self.derecha, self.caracteristica, self.umbral, self.valor))
+
+    @classmethod
+    def desde_modelo(cls, modelo) -> 'ArbolCompilado':
+        """Compila un DecisionTreeRegressor ya entrenado"""
+        arbol = modelo.tree_
+        return cls(
+            arbol.children_left.astype(np.int64),
+            arbol.children_right.astype(np.int64),
+            arbol.feature.astype(np.int64),
+            arbol.threshold.astype(np.float64),
+            arbol.value[:, 0, 0].astype(np.float64)
+        )
+
+    def predecir(self, fila: Sequence[float]) -> float:
+        """Predice una sola fila recorriendo los nodos"""
+        izquierda, derecha, caracteristica, umbral, valor = self._nodos
+        x = array('f', fila)  # Redondeo a float32, como sklearn
+        nodo = 0
+        while izquierda[nodo] != -1:
+            if x[caracteristica[nodo]] <= umbral[nodo]:
+                nodo = izquierda[nodo]
+            else:
+                nodo = derecha[nodo]
+        return valor[nodo]
+
+    def predecir_lote(self, filas) -> np.ndarray:
+        """Predice muchas filas con el mismo árbol"""
+        return predict_many([self], filas)
+
+    def __len__(self) -> int:
+        return len(self.valor)
+
+def predict_many(arboles: Sequence[ArbolCompilado], filas) -> np.ndarray:
+    """Predice en bloque una fila por estudiante, cada una con su propio árbol.
+
+    Si se pasa un único árbol se usa para todas las filas. Los árboles se concatenan y
+    todas las filas descienden a la vez, un nivel de profundidad por iteración.
+    """
+    X = np.asarray(filas, dtype=np.float32)
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+    n = len(X)
+    if n == 0:
+        return np.empty(0, dtype=np.float64)
+    if len(arboles) == 1:
+        arboles = [arboles[0]] * n
+    if len(arboles) != n:
+        raise ValueError('Se necesita un árbol por fila o un único árbol para todas')
+
+    # Concatenar cada árbol distinto una sola vez, desplazando los índices de sus hijos
+    desplazamientos: Dict[int, int] = {}
+    unicos = []
+    total = 0
+    for arbol in arboles:
+        if id(arbol) not in desplazamientos:
+            desplazamientos[id(arbol)] = total
+            unicos.append(arbol)
+            total += len(arbol)
+    desplazamiento = np.repeat([desplazamientos[id(a)] for a in unicos], [len(a) for a in unicos])
+    izquierda = np.concatenate([a.izquierda for a in unicos])
+    derecha = np.concatenate([a.derecha for a in unicos])
+    izquierda = np.where(izquierda == -1, -1, izquierda + desplazamiento)
+    derecha = np.where(derecha == -1, -1, derecha + desplazamiento)
+    caracteristica = np.maximum(np.concatenate([a.caracteristica for a in unicos]), 0)
+    umbral = np.concatenate([a.umbral for a in unicos])
+    valor = np.concatenate([a.valor for a in unicos])
+
+    filas_idx = np.arange(n)
+    nodo = np.fromiter((desplazamientos[id(a)] for a in arboles), dtype=np.int64, count=n)
+    while True:
+        interno = izquierda[nodo] != -1
+        if not interno.any():
+            break
+        va_izquierda = X[filas_idx, caracteristica[nodo]] <= umbral[nodo]
+        siguiente = np.where(va_izquierda, izquierda[nodo], derecha[nodo])
+        nodo = np.where(interno, siguiente, nodo)
+    return valor[nodo]
+
+class MotorArbol:
+    """Árbol de decisión que el planificador reentrena desde cero con todo el historial.
+
+    El coste de cada reentrenamiento crece con el número de filas; a cambio el árbol
+    capta interacciones entre características sin discretizarlas.
+    """
+
+    nombre = 'arbol'
+    incremental = False
+
+    def agregar(self, fila: Sequence[float], objetivo: float):
+        """Las muestras se aprenden al reentrenar, no una a una"""
+
+    def entrenar(self, X: np.ndarray, y: np.ndarray):
+        """Ajusta un árbol nuevo y devuelve (modelo de scikit-learn, forma compilada)"""
+        # Importación diferida: scikit-learn solo se carga al entrenar el primer modelo
+        from sklearn.tree import DecisionTreeRegressor
+        modelo = DecisionTreeRegressor(
+            max_depth=4,
+            min_samples_split=5,
+            min_samples_leaf=2
+        )
+        modelo.fit(X, y)
+        return modelo, ArbolCompilado.desde_modelo(modelo)
+
+    def memoria(self) -> int:
+        """El árbol se cuenta en TrueAISystem.memoria()"""
+        return 0
+
+    def exportar(self) -> np.ndarray:
+        return np.empty(0)
+
+    def restaurar(self, datos: np.ndarray, X: np.ndarray, y: np.ndarray):
+        """El árbol se guarda aparte, en los nodos de exportar_estado()"""
+
+class MotorCubetas:
+    """Media de la dificultad óptima por cubetas de características, actualizada en O(1) por muestra.
+
+    Cada muestra se suma a cuatro cubetas de granularidad decreciente (todas las
+    características discretizadas, solo las más informativas, solo el nivel y el total)
+    y la predicción usa la más fina con peso suficiente. Con `media_vida` una muestra
+    pesa la mitad tras ese número de muestras nuevas, así que el modelo sigue al
+    estudiante cuando mejora; el olvido se aplica al tocar cada cubeta. Sin ella, como
+    el árbol, aprende de todo el historial.
+    """
+
+    nombre = 'cubetas'
+    incremental = True
+    ANCHO_CLAVE = 6  # Granularidad + hasta cinco características discretizadas
+    BYTES_CUBETA = 400  # Entrada del diccionario, tupla de la clave y lista de tres floats
+
+    def __init__(self, media_vida: Optional[float] = None, peso_minimo: float = 2.0):
+        self.factor = 0.5 ** (1 / media_vida) if media_vida else 1.0
+        self.peso_minimo = peso_minimo
+        self.cubetas: Dict[tuple, List[float]] = {}  # Clave -> [peso, suma de objetivos, paso]
+        self.muestras = 0
+
+    @staticmethod
+    def claves(fila: Sequence[float]) -> tuple:
+        """Cubetas de la fila, de la más fina a la más gruesa"""
+        nivel, tasa, tiempo, consecutivos, fallos, _ = fila
+        nivel, tasa, fallos = int(nivel), int(round(tasa * 5)), min(int(fallos), 5)
+        rapidez = 0 if tiempo < 5 else 1 if tiempo < 8 else 2 if tiempo < 12 else 3
+        return ((3, nivel, tasa, rapidez, min(int(consecutivos), 5), fallos),
+                (2, nivel, tasa, fallos), (1, nivel), (0,))
+
+    def agregar(self, fila: Sequence[float], objetivo: float):
+        self.muestras += 1
+        paso = self.muestras
+        for clave in self.claves(fila):
+            cubeta = self.cubetas.get(clave)
+            if cubeta is None:
+                self.cubetas[clave] = [1.0, objetivo, paso]
+            else:
+                olvido = self.factor ** (paso - cubeta[2])
+                cubeta[0] = cubeta[0] * olvido + 1.0
+                cubeta[1] = cubeta[1] * olvido + objetivo
+                cubeta[2] = paso
+
+    def predecir(self, fila: Sequence[float]) -> float:
+        # El olvido escala igual peso y suma: la media no cambia, solo el peso disponible
+        cubeta = None
+        for clave in self.claves(fila):
+            cubeta = self.cubetas.get(clave)
+            if cubeta is not None and cubeta[0] * self.factor ** (self.muestras - cubeta[2]) >= self.peso_minimo:
+                break
+        return cubeta[1] / cubeta[0] if cubeta is not None else 1.0
+
+    def memoria(self) -> int:
+        return len(self.cubetas) * self.BYTES_CUBETA
+
+    def entrenar(self, X: np.ndarray, y: np.ndarray):
+        """Reconstruye las cubetas a partir de los datos de entrenamiento"""
+        self.cubetas.clear()
+        self.muestras = 0
+        for fila, objetivo in zip(X.tolist(), y.tolist()):
+            self.agregar(fila, objetivo)
+
+    def exportar(self) -> np.ndarray:
+        """Una fila por cubeta: clave rellenada con -1, peso, suma y paso"""
+        filas = [list(clave) + [-1] * (self.ANCHO_CLAVE - len(clave)) + cubeta
+                 for clave, cubeta in self.cubetas.items()]
+        return np.array(filas, dtype=np.float64).reshape(-1, self.ANCHO_CLAVE + 3)
+
+    def restaurar(self, datos: np.ndarray, X: np.ndarray, y: np.ndarray):
+        """Recupera las cubetas exportadas o, si no las hay, las reconstruye con los datos"""
+        if not len(datos):
+            self.entrenar(X, y)
+            return
+        filas = datos.reshape(-1, self.ANCHO_CLAVE + 3).tolist()
+        # Las características discretizadas nunca son negativas: -1 solo es relleno
+        self.cubetas = {
+            tuple(int(v) for v in fila[:self.ANCHO_CLAVE] if v != -1): fila[-3:]
+            for fila in filas
+        }
+        self.muestras = int(max(fila[-1] for fila in filas))
+
+# Motores de dificultad disponibles (código en exportar_estado(), clase)
+MOTORES: Dict[str, tuple[int, type]] = {
+    MotorArbol.nombre: (0, MotorArbol),
+    MotorCubetas.nombre: (1, MotorCubetas),
+}
+# Motor de los sistemas nuevos (IA_MOTOR en la configuración de la aplicación)
+motor_por_defecto = MotorArbol.nombre
+
+# Filas que conserva como mínimo un recorte por presupuesto de memoria
+MIN_FILAS_RECORTE = 20
+
+# Versión del formato de exportar_estado() y número de valores de su cabecera
+FORMATO_ESTADO = 3
+TAMANO_CABECERA = 15
+TAMANO_CABECERA_V2 = 13  # Puntos de control anteriores a los motores de dificultad
+
+# Dificultad predicha a partir de la cual se sube o se baja de nivel
+UMBRAL_SUBIR_NIVEL = 1.8
+UMBRAL_BAJAR_NIVEL = 0.6
+
+def nivel_siguiente(nivel: int, dificultad: float) -> int:
+    """Nivel (1 a 3) que corresponde tras una respuesta con la dificultad predicha"""
+    if dificultad >= UMBRAL_SUBIR_NIVEL and nivel < 3:
+        return nivel + 1
+    if dificultad <= UMBRAL_BAJAR_NIVEL and nivel > 1:
+        return nivel - 1
+    return nivel
 
 class TrueAISystem:
-    def __init__(self):
-        # Modelo de IA (inicialmente vacío)
+    def __init__(self, capacidad_datos: Optional[int] = None,
+                 planificador: Optional['PlanificadorReentrenamiento'] = None,
+                 motor: Optional[str] = None, retencion: Optional[Callable[[], Any]] = None):
+        # Motor de dificultad: árbol reentrenado por el planificador o modelo incremental
+        self.motor = MOTORES[motor or motor_por_defecto][1]()
+        # Modelo de IA (inicialmente vacío); se reemplaza de forma atómica al reentrenar
         self.model = None
+        self.arbol: Optional[ArbolCompilado] = None  # Forma compilada de self.model para predecir
+        self.modelo_publicado_en: Optional[float] = None
         self.mensaje_ayuda = ""
         self.ejercicios_requeridos = 5  # Valor por defecto
         self.nivel_actual = 1  # Añadimos nivel actual
         
-        # Almacenamiento de datos
-        self.features = pd.DataFrame(columns=[
-            'nivel', 
-            'tasa_aciertos', 
-            'tiempo_promedio', 
-            'ejercicios_consecutivos',
-            'fallos_consecutivos',
-            'ejercicios_requeridos'
-        ])
-        self.targets = pd.Series(name='dificultad_optima')
+        # Almacenamiento de datos de entrenamiento; `retencion` crea la política que decide
+        # qué filas se conservan cuando se llena (por defecto, las más recientes)
+        self._nueva_retencion = retencion or RetencionVentana
+        self.datos = AlmacenEntrenamiento(capacidad=capacidad_datos, retencion=self._nueva_retencion())
+        self._lock_datos = threading.Lock()
+        self.muestras_pendientes = 0  # Muestras añadidas desde el último entrenamiento
+        self._generacion = 0  # Cambia al reiniciar para descartar entrenamientos en curso
+        self.total_muestras = 0  # Muestras registradas desde el último reinicio
+        self.muestras_modelo = 0  # total_muestras al entrenar el modelo publicado
+        self.version = 0  # Aumenta con cada cambio de estado que debe guardarse en disco
+        self.version_guardada = 0  # Versión del último punto de control escrito
+        # Función opcional que se llama tras publicar un modelo (p. ej. para compartirlo)
+        self.al_publicar: Optional[Callable[[], None]] = None
+        # Planificador de reentrenamiento (None = el planificador global del módulo)
+        self.planificador = planificador
         
         # Historial temporal para calcular características
         self.historial_reciente = deque(maxlen=5)  # Últimos 5 ejercicios
@@ -34,8 +555,9 @@ class TrueAISystem:
         self.ejercicios_requeridos = max(1, min(10, ejercicios_requeridos))
         if nivel is not None:
             self.nivel_actual = max(1, min(3, nivel))  # Asegurar que el nivel esté entre 1 y 3
+        self.version += 1
         
-    def registrar_resultado(self, nivel: int, correcto: bool, tiempo: float):
+    def registrar_resultado(self, nivel: int, correcto: bool, tiempo: float, entrenar: bool = True):
         """Registra un resultado y actualiza el modelo cuando hay suficientes datos"""
         self.nivel_actual = nivel  # Actualizamos el nivel actual
         
@@ -60,43 +582,60 @@ class TrueAISystem:
         
         # 2. Calcular características actuales
         if len(self.historial_reciente) > 0:
-            caracteristicas = self._calcular_caracteristicas(nivel)
+            with metricas.medir('ia_caracteristicas_segundos'):
+                caracteristicas = self._calcular_caracteristicas(nivel)
             dificultad_optima = self._calcular_dificultad_optima(correcto, tiempo, nivel)
             
             # 3. Agregar a los datos de entrenamiento
-            self.features = pd.concat([
-                self.features,
-                pd.DataFrame([caracteristicas])
-            ], ignore_index=True)
+            with self._lock_datos:
+                self.datos.agregar(caracteristicas, dificultad_optima)
+                self.motor.agregar(list(caracteristicas.values()), dificultad_optima)
+                self.muestras_pendientes += 1
+                self.total_muestras += 1
+                self.version += 1
+                suficientes = len(self.datos) >= 10
             
-            self.targets = pd.concat([
-                self.targets,
-                pd.Series([dificultad_optima])
-            ], ignore_index=True)
-            
-            # 4. Entrenar modelo cuando tengamos suficientes datos
-            if len(self.features) >= 10:  # Entrenar con mínimo 10 ejemplos
-                self._entrenar_modelo()
+            # 4. Solicitar entrenamiento cuando tengamos suficientes datos (mínimo 10 ejemplos);
+            # un motor incremental ya ha aprendido la muestra
+            if suficientes and entrenar and not self.motor.incremental:
+                (self.planificador or planificador).notificar(self)
+    
+    def precargar(self, resultados: Iterable[tuple[int, bool, float]]):
+        """Reproduce resultados guardados (nivel, correcto, tiempo) para recuperar el estado tras un reinicio"""
+        cantidad = 0
+        for nivel, correcto, tiempo in resultados:
+            self.registrar_resultado(nivel, correcto, tiempo, entrenar=False)
+            cantidad += 1
+        self.mensaje_ayuda = ""
+        # Un único entrenamiento con todo el historial recuperado
+        if cantidad and len(self.datos) >= 10 and not self.motor.incremental:
+            (self.planificador or planificador).notificar(self)
     
     def predecir_dificultad(self, nivel: int) -> float:
         """Predice la dificultad óptima usando IA o reglas heurísticas si no hay modelo"""
         # Si hay demasiados fallos consecutivos y no es nivel 1, bajar nivel
         if self.fallos_consecutivos >= self.ejercicios_requeridos and nivel > 1:
-            print(f"Prediciendo bajar de nivel por fallos consecutivos: {self.fallos_consecutivos}")
+            logger.debug("Prediciendo bajar de nivel por fallos consecutivos: %s", self.fallos_consecutivos)
             return 0.5  # Factor para bajar de nivel
             
-        if self.model is not None:
-            # Usar modelo de IA
-            caracs = self._calcular_caracteristicas(nivel)
-            prediccion = self.model.predict([list(caracs.values())])[0]
-            print(f"Predicción del modelo IA: {prediccion}")
+        modelo = self.modelo_activo()
+        if modelo is not None:
+            # Usar modelo de IA (árbol compilado, idéntico a self.model.predict, o motor incremental)
+            with metricas.medir('ia_caracteristicas_segundos'):
+                caracs = self._calcular_caracteristicas(nivel)
+            with metricas.medir('ia_prediccion_segundos'):
+                if predictor is not None and isinstance(modelo, ArbolCompilado):
+                    prediccion = predictor.predecir(modelo, list(caracs.values()))
+                else:
+                    prediccion = modelo.predecir(list(caracs.values()))
+            logger.debug("Predicción del modelo IA: %s", prediccion)
             
             # Determinar cambio de nivel basado en la predicción
-            if prediccion >= 1.8 and nivel < 3:
-                print("Prediciendo subir de nivel por alto rendimiento")
+            if prediccion >= UMBRAL_SUBIR_NIVEL and nivel < 3:
+                logger.debug("Prediciendo subir de nivel por alto rendimiento")
                 return 2.0  # Subir nivel
-            elif prediccion <= 0.6 and nivel > 1:
-                print("Prediciendo bajar de nivel por bajo rendimiento")
+            elif prediccion <= UMBRAL_BAJAR_NIVEL and nivel > 1:
+                logger.debug("Prediciendo bajar de nivel por bajo rendimiento")
                 return 0.5  # Bajar nivel
             else:
                 return prediccion
@@ -104,6 +643,12 @@ class TrueAISystem:
             # Regla heurística inicial
             return self._regla_heuristica_inicial(nivel)
     
+    def modelo_activo(self):
+        """Modelo con el que predecir: el motor incremental con datos suficientes o el último árbol publicado"""
+        if self.motor.incremental:
+            return self.motor if self.motor.muestras >= 10 else None
+        return self.arbol
+    
     def _calcular_caracteristicas(self, nivel_actual: int) -> dict:
         """Calcula características basadas en historial reciente"""
         if len(self.historial_reciente) == 0:
@@ -147,11 +692,12 @@ class TrueAISystem:
         
         # Para subir de nivel
         if nivel < 3 and ejercicios_consecutivos >= self.ejercicios_requeridos and correcto:
-            print(f"Subiendo de nivel: ejercicios_consecutivos={ejercicios_consecutivos}, requeridos={self.ejercicios_requeridos}")
+            logger.debug("Subiendo de nivel: ejercicios_consecutivos=%s, requeridos=%s",
+                         ejercicios_consecutivos, self.ejercicios_requeridos)
             return 2.0  # Valor más alto para asegurar subida de nivel
         # Para bajar de nivel    
         elif self.fallos_consecutivos >= self.ejercicios_requeridos and nivel > 1:
-            print(f"Bajando de nivel: fallos_consecutivos={self.fallos_consecutivos}")
+            logger.debug("Bajando de nivel: fallos_consecutivos=%s", self.fallos_consecutivos)
             return 0.5  # Valor más bajo para asegurar bajada de nivel
         # Mantener nivel pero ajustar dificultad
         elif correcto and tiempo < 8:
@@ -161,117 +707,828 @@ class TrueAISystem:
         else:
             return 0.9  # Disminuir dificultad ligeramente
     
-    def _entrenar_modelo(self):
-        """Entrena el modelo de árbol de decisión"""
-        self.model = DecisionTreeRegressor(
-            max_depth=4,
-            min_samples_split=5,
-            min_samples_leaf=2
-        )
-        self.model.fit(self.features, self.targets)
+    def _entrenar_modelo(self, copiar: bool = True) -> bool:
+        """Entrena un árbol de decisión nuevo y lo publica de forma atómica"""
+        if self.motor.incremental:
+            return False  # Aprende cada muestra al registrarla
+        with self._lock_datos:
+            generacion = self._generacion
+            muestras = self.total_muestras
+            X, y = self.datos.vistas()
+            if copiar:
+                # Instantánea para que las respuestas nuevas no alteren el entrenamiento en curso
+                X, y = X.copy(), y.copy()
+            self.muestras_pendientes = 0
+        if len(y) < 10:
+            return False
+        
+        with metricas.medir('ia_entrenamiento_segundos'):
+            modelo, arbol = self.motor.entrenar(X, y)
+        
+        with self._lock_datos:
+            if generacion != self._generacion or muestras < self.muestras_modelo:
+                return False  # Se reinició, o ya hay un modelo con datos más recientes
+            self.model = modelo
+            self.arbol = arbol
+            self.muestras_modelo = muestras
+            self.modelo_publicado_en = time.monotonic()
+            self.version += 1
+        if self.al_publicar is not None:
+            try:
+                self.al_publicar()
+            except Exception:
+                logger.exception('Error al compartir el modelo publicado')
+        return True
     
     def _regla_heuristica_inicial(self, nivel: int) -> float:
         """Regla simple mientras se recolectan datos"""
         if self.fallos_consecutivos >= self.ejercicios_requeridos and nivel > 1:
-            print("Regla heurística: Bajando de nivel por fallos consecutivos")
+            logger.debug("Regla heurística: Bajando de nivel por fallos consecutivos")
             return 0.5  # Bajar nivel
             
         ejercicios_consecutivos = sum(1 for e in self.historial_reciente if e['correcto'])
         if nivel < 3 and ejercicios_consecutivos >= self.ejercicios_requeridos:
-            print("Regla heurística: Subiendo de nivel por ejercicios consecutivos correctos")
+            logger.debug("Regla heurística: Subiendo de nivel por ejercicios consecutivos correctos")
             return 2.0  # Subir nivel
             
         return 1.0  # Mantener nivel
         
     def reiniciar(self):
         """Reinicia el sistema de IA"""
-        self.model = None
-        self.features = pd.DataFrame(columns=[
-            'nivel', 
-            'tasa_aciertos', 
-            'tiempo_promedio', 
-            'ejercicios_consecutivos',
-            'fallos_consecutivos',
-            'ejercicios_requeridos'
-        ])
-        self.targets = pd.Series(name='dificultad_optima')
+        with self._lock_datos:
+            self._generacion += 1
+            self.motor = type(self.motor)()
+            self.model = None
+            self.arbol = None
+            self.modelo_publicado_en = None
+            self.datos.limpiar()
+            self.muestras_pendientes = 0
+            self.total_muestras = 0
+            self.muestras_modelo = 0
+            self.version += 1
         self.historial_reciente.clear()
         self.fallos_consecutivos = 0
         self.mensaje_ayuda = ""
 
+    def memoria(self) -> int:
+        """Bytes aproximados del estado del estudiante: datos de entrenamiento, modelo y motor"""
+        arbol = self.arbol
+        modelo = arbol.memoria() if arbol is not None else 0
+        # El modelo de scikit-learn, si se entrenó aquí, guarda otra copia de los nodos
+        return self.datos.memoria() + modelo * (2 if self.model is not None else 1) + self.motor.memoria()
+
+    def recortar_datos(self, memoria: int) -> int:
+        """Reduce los datos de entrenamiento para que el estado ocupe unos `memoria` bytes.
+
+        La política de retención elige las filas que se conservan y el almacén queda
+        limitado a ese número de filas. El modelo publicado no cambia. Devuelve las
+        filas conservadas.
+        """
+        with self._lock_datos:
+            resto = self.memoria() - self.datos.memoria()
+            # Siempre las suficientes para poder reentrenar
+            filas = max(MIN_FILAS_RECORTE, (memoria - resto) // BYTES_FILA)
+            if filas < len(self.datos._y):
+                self.datos.recortar(filas)
+                self.version += 1
+            return len(self.datos)
+
+    def exportar_estado(self) -> np.ndarray:
+        """Serializa árbol, historial, datos de entrenamiento y motor en un único arreglo float64"""
+        with self._lock_datos:
+            arbol = self.arbol
+            X, y = self.datos.vistas()
+            motor = self.motor.exportar().ravel()
+            cabecera = [
+                FORMATO_ESTADO, datetime.now().timestamp(), len(arbol) if arbol is not None else 0,
+                len(y), self.datos._inicio, len(self.historial_reciente), self.fallos_consecutivos,
+                self.ejercicios_requeridos, self.nivel_actual, self.muestras_pendientes,
+                self._generacion, self.total_muestras, self.muestras_modelo,
+                MOTORES[self.motor.nombre][0], len(motor)
+            ]
+            partes = [np.array(cabecera, dtype=np.float64)]
+            if arbol is not None:
+                partes += [arbol.izquierda, arbol.derecha, arbol.caracteristica, arbol.umbral, arbol.valor]
+            partes.append(np.array([(e['nivel'], e['correcto'], e['tiempo']) for e in self.historial_reciente],
+                                   dtype=np.float64).ravel())
+            partes += [X.ravel(), y, motor]
+            # concatenate copia: el arreglo no comparte memoria con el estado vivo
+            return np.concatenate([np.asarray(p, dtype=np.float64) for p in partes])
+
+    def restaurar_estado(self, estado: np.ndarray) -> float:
+        """Recupera el estado de exportar_estado() sin reentrenar; devuelve cuándo se exportó.
+
+        Las filas de entrenamiento se usan sin copiar cuando caben en el almacén, de modo que
+        un arreglo con memoria mapeada solo se lee del disco a medida que se necesita. Si el
+        modelo en memoria se entrenó con datos más recientes que el guardado, se conserva.
+        """
+        formato = int(estado[0]) if len(estado) else 0
+        tamano_cabecera = {FORMATO_ESTADO: TAMANO_CABECERA, 2: TAMANO_CABECERA_V2}.get(formato)
+        if tamano_cabecera is None or len(estado) < tamano_cabecera:
+            raise ValueError('Formato de estado desconocido')
+        cabecera = estado[:tamano_cabecera].tolist()
+        (_, exportado, n_nodos, n_filas, inicio, n_historial, fallos, requeridos, nivel,
+         pendientes, generacion, total_muestras, muestras_modelo) = cabecera[:TAMANO_CABECERA_V2]
+        codigo_motor, n_motor = cabecera[TAMANO_CABECERA_V2:] or (MOTORES[MotorArbol.nombre][0], 0)
+        n_nodos, n_filas, n_historial, n_motor = int(n_nodos), int(n_filas), int(n_historial), int(n_motor)
+        columnas = len(COLUMNAS_CARACTERISTICAS)
+        if len(estado) != tamano_cabecera + 5 * n_nodos + 3 * n_historial + (columnas + 1) * n_filas + n_motor:
+            raise ValueError('Estado truncado')
+
+        pos = tamano_cabecera
+        arbol = None
+        if n_nodos:
+            nodos = estado[pos:pos + 5 * n_nodos].reshape(5, n_nodos)
+            arbol = ArbolCompilado(nodos[0].astype(np.int64), nodos[1].astype(np.int64),
+                                   nodos[2].astype(np.int64), nodos[3], nodos[4])
+            pos += 5 * n_nodos
+        historial = estado[pos:pos + 3 * n_historial].reshape(n_historial, 3).tolist()
+        pos += 3 * n_historial
+        X = estado[pos:pos + columnas * n_filas].reshape(n_filas, columnas)
+        pos += columnas * n_filas
+        y = estado[pos:pos + n_filas]
+        # Cada muestra registrada desde el reinicio se ofreció una vez al almacén
+        datos = AlmacenEntrenamiento.desde_arreglos(X, y, int(inicio), self.datos.capacidad,
+                                                    self._nueva_retencion(), int(total_muestras))
+        # Un estado guardado con otro motor se reconstruye con los datos de entrenamiento
+        motor = type(self.motor)()
+        mismo_motor = int(codigo_motor) == MOTORES[motor.nombre][0]
+        motor.restaurar(estado[pos + n_filas:] if mismo_motor else np.empty(0), X, y)
+
+        with self._lock_datos:
+            conservar = (self.arbol is not None and int(generacion) == self._generacion
+                         and self.muestras_modelo > muestras_modelo)
+            if not conservar:
+                self.model = None  # Solo se guarda la forma compilada, suficiente para predecir
+                self.arbol = arbol
+                self.muestras_modelo = int(muestras_modelo)
+                self.modelo_publicado_en = time.monotonic() if arbol is not None else None
+            self._generacion = int(generacion)
+            self.total_muestras = int(total_muestras)
+            self.datos = datos
+            self.motor = motor
+            self.muestras_pendientes = int(pendientes)
+            if conservar:
+                self.version += 1  # El estado en memoria ya no coincide con el guardado
+            else:
+                self.version_guardada = self.version
+        self.historial_reciente.clear()
+        self.historial_reciente.extend(
+            {'nivel': int(n), 'correcto': bool(c), 'tiempo': t} for n, c, t in historial
+        )
+        self.fallos_consecutivos = int(fallos)
+        self.ejercicios_requeridos = int(requeridos)
+        self.nivel_actual = int(nivel)
+        self.mensaje_ayuda = ""
+        return exportado
+
+class _Solicitud:
+    """Predicción pendiente de un PredictorPorLotes"""
+
+    __slots__ = ('arbol', 'fila', 'listo', 'resultado', 'error')
+
+    def __init__(self, arbol: ArbolCompilado, fila: Sequence[float]):
+        self.arbol = arbol
+        self.fila = fila
+        self.listo = threading.Event()
+        self.resultado = 0.0
+        self.error: Optional[BaseException] = None
+
+class PredictorPorLotes:
+    """Agrupa las predicciones de peticiones concurrentes y las resuelve con un solo predict_many.
+
+    Un hilo de fondo espera como mucho `ventana` segundos desde la primera solicitud, o
+    hasta reunir `lote_maximo`, predice todo el lote de una vez y despierta a cada
+    solicitante con su resultado.
+    """
+
+    def __init__(self, ventana: float = 0.002, lote_maximo: int = 64):
+        self.ventana = ventana
+        self.lote_maximo = max(1, lote_maximo)
+        self._cond = threading.Condition()
+        self._cola: List[_Solicitud] = []
+        self._hilo: Optional[threading.Thread] = None
+        self._detener = False
+        # Métricas
+        self.lotes = 0
+        self.predicciones = 0
+
+    def predecir(self, arbol: ArbolCompilado, fila: Sequence[float]) -> float:
+        """Predice una fila con el árbol dado, esperando a que se resuelva su lote"""
+        solicitud = _Solicitud(arbol, fila)
+        with self._cond:
+            self._cola.append(solicitud)
+            # Despertar al hilo si estaba sin trabajo o si el lote ya está lleno
+            if len(self._cola) == 1 or len(self._cola) >= self.lote_maximo:
+                self._cond.notify()
+            self._asegurar_hilo()
+        solicitud.listo.wait()
+        if solicitud.error is not None:
+            raise solicitud.error
+        return solicitud.resultado
+
+    def _asegurar_hilo(self):
+        if self._hilo is None or not self._hilo.is_alive():
+            self._detener = False
+            self._hilo = threading.Thread(target=self._trabajar, name='prediccion-lotes', daemon=True)
+            self._hilo.start()
+
+    def _trabajar(self):
+        while True:
+            with self._cond:
+                while not self._cola:
+                    if self._detener:
+                        return
+                    self._cond.wait()
+                limite = time.monotonic() + self.ventana
+                while len(self._cola) < self.lote_maximo and not self._detener:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self._cond.wait(restante)
+                lote = self._cola[:self.lote_maximo]
+                del self._cola[:self.lote_maximo]
+            self._resolver(lote)
+
+    def _resolver(self, lote: List[_Solicitud]):
+        try:
+            resultados = predict_many([s.arbol for s in lote], [s.fila for s in lote]).tolist()
+        except Exception as error:
+            for solicitud in lote:
+                solicitud.error = error
+                solicitud.listo.set()
+            return
+        self.lotes += 1
+        self.predicciones += len(lote)
+        for solicitud, resultado in zip(lote, resultados):
+            solicitud.resultado = resultado
+            solicitud.listo.set()
+
+    def detener(self):
+        """Resuelve lo pendiente y detiene el hilo de fondo"""
+        with self._cond:
+            self._detener = True
+            self._cond.notify_all()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+
+class PlanificadorReentrenamiento:
+    """Reentrena los modelos en un hilo de fondo, agrupando las solicitudes pendientes"""
+
+    def __init__(self, muestras: int = 5, intervalo: float = 10.0, sincrono: bool = False):
+        self.muestras = max(1, muestras)  # Muestras nuevas que disparan un reentrenamiento
+        self.intervalo = intervalo  # Segundos máximos que una muestra espera a ser entrenada
+        self.sincrono = sincrono  # Entrenar en el hilo que llama (simulaciones y pruebas)
+        self._cond = threading.Condition()
+        # Sistemas con muestras pendientes, en orden de llegada de su primera muestra
+        self._pendientes: "OrderedDict[int, tuple[TrueAISystem, float]]" = OrderedDict()
+        # Sistemas listos para reentrenar
+        self._listos: "OrderedDict[int, TrueAISystem]" = OrderedDict()
+        self._hilo: Optional[threading.Thread] = None
+        self._detener = False
+        # Métricas de monitoreo
+        self.reentrenamientos = 0
+        self.coalescidos = 0
+        self.descartados = 0
+        self.errores = 0
+        self.duracion_total = 0.0
+        self.duracion_ultima = 0.0
+        self.duracion_maxima = 0.0
+
+    def notificar(self, ia: TrueAISystem):
+        """Informa que el sistema tiene una muestra nueva"""
+        if self.sincrono:
+            vencido = (ia.modelo_publicado_en is None
+                       or time.monotonic() - ia.modelo_publicado_en >= self.intervalo)
+            if ia.arbol is None or ia.muestras_pendientes >= self.muestras or vencido:
+                self._ejecutar(ia, copiar=False)
+            return
+
+        clave = id(ia)
+        with self._cond:
+            if clave in self._listos:
+                self.coalescidos += 1
+                return
+            if clave in self._pendientes:
+                self.coalescidos += 1
+            else:
+                self._pendientes[clave] = (ia, time.monotonic())
+            # El primer modelo se entrena en cuanto hay datos suficientes
+            if ia.arbol is None or ia.muestras_pendientes >= self.muestras:
+                del self._pendientes[clave]
+                self._listos[clave] = ia
+                self._cond.notify()
+            self._asegurar_hilo()
+
+    def _asegurar_hilo(self):
+        if self._hilo is None or not self._hilo.is_alive():
+            self._detener = False
+            self._hilo = threading.Thread(target=self._trabajar, name='reentrenamiento-ia', daemon=True)
+            self._hilo.start()
+
+    def _trabajar(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._detener:
+                        return
+                    ahora = time.monotonic()
+                    # Las entradas están ordenadas por antigüedad: basta revisar el principio
+                    while self._pendientes:
+                        clave, (ia, desde) = next(iter(self._pendientes.items()))
+                        if ahora - desde < self.intervalo:
+                            break
+                        del self._pendientes[clave]
+                        self._listos[clave] = ia
+                    if self._listos:
+                        break
+                    espera = None
+                    if self._pendientes:
+                        _, desde = next(iter(self._pendientes.values()))
+                        espera = desde + self.intervalo - ahora
+                    self._cond.wait(espera)
+                _, ia = self._listos.popitem(last=False)
+            self._ejecutar(ia)
+
+    def _ejecutar(self, ia: TrueAISystem, copiar: bool = True):
+        inicio = time.perf_counter()
+        try:
+            publicado = ia._entrenar_modelo(copiar=copiar)
+        except Exception:
+            self.errores += 1
+            logger.exception('Error al reentrenar el modelo de dificultad')
+            return
+        duracion = time.perf_counter() - inicio
+        with self._cond:
+            if not publicado:
+                self.descartados += 1
+                return
+            self.reentrenamientos += 1
+            self.duracion_total += duracion
+            self.duracion_ultima = duracion
+            self.duracion_maxima = max(self.duracion_maxima, duracion)
+
+    def detener(self, esperar: bool = True):
+        """Detiene el hilo de fondo"""
+        with self._cond:
+            self._detener = True
+            self._cond.notify_all()
+        if esperar and self._hilo is not None:
+            self._hilo.join()
+        self._hilo = None
+
+    def metricas(self) -> Dict[str, Any]:
+        """Contadores de reentrenamiento, duración y antigüedad de los datos sin entrenar"""
+        with self._cond:
+            ahora = time.monotonic()
+            primero = next(iter(self._pendientes.values()), None)
+            return {
+                'reentrenamientos': self.reentrenamientos,
+                'reentrenamientos_coalescidos': self.coalescidos,
+                'reentrenamientos_descartados': self.descartados,
+                'reentrenamientos_fallidos': self.errores,
+                'duracion_ultima_s': self.duracion_ultima,
+                'duracion_media_s': self.duracion_total / self.reentrenamientos if self.reentrenamientos else 0.0,
+                'duracion_maxima_s': self.duracion_maxima,
+                'pendientes': len(self._pendientes) + len(self._listos),
+                'antiguedad_pendiente_s': ahora - primero[1] if primero else 0.0
+            }
+
 class GeneradorEjercicios:
-    def __init__(self):
-        self.ia = TrueAISystem()
+    def __init__(self, operacion: str = 'suma', capacidad_datos: Optional[int] = None,
+                 motor: Optional[str] = None, retencion: Optional[Callable[[], Any]] = None):
+        self.operacion: Operacion = OPERACIONES[operacion]
+        self.ia = TrueAISystem(capacidad_datos=capacidad_datos, motor=motor, retencion=retencion)
         self.ultimo_ejercicio = None
         self.nivel_actual = 1
+        self._rng = np.random.default_rng()
+        # Protege el estado del estudiante frente a peticiones concurrentes
+        self.lock = threading.RLock()
+        # Versión del estado compartido con la que coincide este generador (0 = ninguna)
+        self.version_compartida = 0
+        # Cambios hechos durante una sesión compartida, por si hay que repetirlos sobre
+        # el estado que otro worker guardó entretanto (None fuera de una sesión)
+        self.diario: Optional[List[tuple[Callable[..., None], tuple]]] = None
     
     def generar_ejercicio(self, nivel: int) -> Dict[str, int]:
         """Genera un ejercicio usando IA"""
+        return self.generar_ejercicios(nivel, 1)[0]
+    
+    def generar_ejercicios(self, nivel: int, cantidad: int = 1, sin_repetir: bool = False) -> List[Dict[str, Any]]:
+        """Genera un lote de ejercicios con una sola predicción de dificultad"""
         self.nivel_actual = nivel  # Actualizar nivel actual
         
         # Predecir dificultad óptima
         dificultad = self.ia.predecir_dificultad(nivel)
         
-        # Generar números basados en dificultad
-        num1, num2 = self._generar_numeros(dificultad)
+        # Generar todos los números del lote de una vez
+        numeros = self._generar_numeros(dificultad, max(1, cantidad), sin_repetir)
+        timestamp = datetime.now().timestamp()
         
-        ejercicio = {
-            'num1': num1,
-            'num2': num2,
-            'respuesta': num1 + num2,
-            'dificultad': dificultad,
-            'nivel': nivel,
-            'timestamp': datetime.now().timestamp()
-        }
+        num1, num2, respuestas = self.operacion.componer(numeros[:, 0], numeros[:, 1])
+        ejercicios = [
+            {
+                'operacion': self.operacion.nombre,
+                'num1': a,
+                'num2': b,
+                'respuesta': respuesta,
+                'dificultad': dificultad,
+                'nivel': nivel,
+                'timestamp': timestamp
+            }
+            for a, b, respuesta in zip(num1.tolist(), num2.tolist(), respuestas.tolist())
+        ]
         
-        self.ultimo_ejercicio = ejercicio
-        return ejercicio
+        self.ultimo_ejercicio = ejercicios[-1]
+        return ejercicios
     
-    def registrar_resultado(self, correcto: bool, tiempo: float):
-        """Registra el resultado para aprendizaje de IA"""
-        if self.ultimo_ejercicio:
-            nivel = self.ultimo_ejercicio.get('nivel', 1)  # Usar nivel 1 como valor predeterminado
-            self.nivel_actual = nivel  # Actualizar el nivel actual
-            self.ia.registrar_resultado(
-                nivel,
-                correcto,
-                tiempo
-            )
+    def registrar_resultado(self, correcto: bool, tiempo: float, nivel: Optional[int] = None):
+        """Registra el resultado para aprendizaje de IA, por defecto en el nivel del último ejercicio"""
+        if nivel is None:
+            if self.ultimo_ejercicio:
+                nivel = self.ultimo_ejercicio.get('nivel', 1)  # Usar nivel 1 como valor predeterminado
+            else:
+                # Generador recién rehidratado: usar el nivel guardado en la base de datos
+                nivel = self.nivel_actual
+        self.nivel_actual = nivel  # Actualizar el nivel actual
+        if self.diario is not None:
+            self.diario.append((self.registrar_resultado, (correcto, tiempo, nivel)))
+        self.ia.registrar_resultado(
+            nivel,
+            correcto,
+            tiempo
+        )
+
+    def configurar(self, ejercicios_requeridos: int, nivel: Optional[int] = None):
+        """Configura los ejercicios requeridos de la IA y opcionalmente su nivel"""
+        if self.diario is not None:
+            self.diario.append((self.configurar, (ejercicios_requeridos, nivel)))
+        self.ia.configurar(ejercicios_requeridos, nivel)
             
     @property
     def mensaje_ayuda(self) -> str:
         """Obtiene el mensaje de ayuda actual"""
         return self.ia.mensaje_ayuda
     
-    def _generar_numeros(self, dificultad: float) -> tuple[int, int]:
-        """Genera números basados en dificultad y nivel actual"""
-        # Asegurarnos de que estamos en un nivel válido
-        nivel_base = min(max(self.nivel_actual, 1), 3)
+    def _generar_numeros(self, dificultad: float, cantidad: int = 1, sin_repetir: bool = False) -> np.ndarray:
+        """Genera una matriz (cantidad, 2) de números base según la dificultad y el nivel actual"""
+        minimo, maximo = self.operacion.rango(self.nivel_actual)
+        amplitud = maximo - minimo + 1
         
-        if nivel_base == 1:  # Nivel 1
-            return (
-                random.randint(1, 10),
-                random.randint(1, 10)
-            )
-        elif nivel_base == 2:  # Nivel 2
-            return (
-                random.randint(10, 50),
-                random.randint(10, 50)
-            )
-        else:  # Nivel 3
-            return (
-                random.randint(50, 100),
-                random.randint(50, 100)
-            )
+        if sin_repetir and cantidad <= amplitud * amplitud:
+            # Muestrear parejas distintas sobre el espacio de índices num1 * amplitud + num2
+            indices = self._rng.choice(amplitud * amplitud, size=cantidad, replace=False)
+            return np.stack(np.divmod(indices, amplitud), axis=1) + minimo
+        return self._rng.integers(minimo, maximo + 1, size=(cantidad, 2))
             
     def reiniciar(self):
         """Reinicia el generador de ejercicios"""
+        if self.diario is not None:
+            self.diario.append((self.reiniciar, ()))
         self.ia.reiniciar()
         self.ultimo_ejercicio = None
 
-# Instancia global del generador
-generador = GeneradorEjercicios()
+# Clave de un generador en el registro: (usuario_id, operacion)
+ClaveGenerador = tuple[int, str]
+# Intentos de guardar el estado compartido cuando otro worker lo cambia a la vez
+REINTENTOS_ESTADO = 5
+
+class RegistroGeneradores:
+    """Registro de generadores por estudiante y operación con expulsión LRU y acceso seguro entre hilos"""
+
+    def __init__(self, capacidad: int = 1000, capacidad_datos: Optional[int] = None,
+                 estado: Optional[Any] = None):
+        self.capacidad = max(1, capacidad)
+        # Límite opcional de filas de entrenamiento por estudiante y política que elige
+        # las que se conservan al llenarse (None = ventana de las más recientes)
+        self.capacidad_datos = capacidad_datos
+        self.retencion: Optional[Callable[[], Any]] = None
+        # Presupuesto opcional de memoria en bytes para todos los estudiantes
+        self.presupuesto_memoria: Optional[int] = None
+        self._generadores: "OrderedDict[ClaveGenerador, GeneradorEjercicios]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._lock_ajuste = threading.Lock()
+        self._memoria: Dict[ClaveGenerador, int] = {}  # Última medida de cada generador
+        self.memoria_total = 0
+        # Métricas
+        self.recortes_memoria = 0
+        self.expulsiones_memoria = 0
+        # Función opcional para reconstruir el estado de un estudiante que no está en memoria
+        self.rehidratar: Optional[Callable[[int, str, GeneradorEjercicios], None]] = None
+        # Dónde vive el estado adaptativo: solo en este proceso (AlmacenEstadoMemoria) o
+        # compartido entre procesos (AlmacenEstadoSQLite); con este último los generadores
+        # en memoria son copias que se sincronizan en cada usar()
+        self.estado = estado if estado is not None else AlmacenEstadoMemoria()
+
+    def obtener(self, usuario_id: int, operacion: str = 'suma') -> GeneradorEjercicios:
+        """Devuelve el generador del estudiante, creándolo y rehidratándolo si no está en memoria"""
+        clave = (usuario_id, operacion)
+        with self._lock:
+            generador = self._generadores.get(clave)
+            if generador is not None:
+                self._generadores.move_to_end(clave)
+                return generador
+
+            generador = GeneradorEjercicios(operacion, capacidad_datos=self.capacidad_datos,
+                                            retencion=self.retencion)
+            # Se bloquea antes de publicarlo para que nadie lo use a medio rehidratar
+            generador.lock.acquire()
+            self._generadores[clave] = generador
+            while len(self._generadores) > self.capacidad:
+                self._olvidar(self._generadores.popitem(last=False)[0])
+
+        try:
+            cargado = False
+            if self.estado.compartido:
+                generador.ia.al_publicar = lambda: self._propagar(clave, generador)
+                cargado = self._sincronizar(clave, generador)
+            if not cargado and self.rehidratar is not None:
+                self.rehidratar(usuario_id, operacion, generador)
+        finally:
+            generador.lock.release()
+        return generador
+
+    @contextmanager
+    def usar(self, usuario_id: int, operacion: str = 'suma') -> Iterator[GeneradorEjercicios]:
+        """Obtiene el generador del estudiante con acceso exclusivo durante el bloque"""
+        clave = (usuario_id, operacion)
+        generador = self.obtener(usuario_id, operacion)
+        try:
+            with generador.lock:
+                try:
+                    if not self.estado.compartido:
+                        yield generador
+                    else:
+                        with self._sesion(clave, generador):
+                            yield generador
+                finally:
+                    self._medir(clave, generador)
+        finally:
+            if self.presupuesto_memoria is not None and self.memoria_total > self.presupuesto_memoria:
+                self._ajustar_memoria()
+
+    def _medir(self, clave: ClaveGenerador, generador: GeneradorEjercicios):
+        """Actualiza la memoria contabilizada del generador; llamar con su lock tomado"""
+        memoria = generador.ia.memoria()
+        with self._lock:
+            if self._generadores.get(clave) is not generador:
+                return  # Expulsado mientras se usaba
+            self.memoria_total += memoria - self._memoria.get(clave, 0)
+            self._memoria[clave] = memoria
+
+    def _olvidar(self, clave: ClaveGenerador):
+        """Descuenta la memoria de un generador que sale del registro; llamar con self._lock tomado"""
+        self.memoria_total -= self._memoria.pop(clave, 0)
+
+    def _ajustar_memoria(self):
+        """Vuelve a dejar la memoria por debajo del presupuesto.
+
+        Primero recorta los datos de entrenamiento de los estudiantes que ocupan más que
+        su parte del presupuesto, de mayor a menor; si no basta, expulsa a los menos
+        usados recientemente. Se baja hasta el 90 % del presupuesto para no recortar en
+        cada respuesta.
+        """
+        presupuesto = self.presupuesto_memoria
+        if presupuesto is None or not self._lock_ajuste.acquire(blocking=False):
+            return  # Otro hilo ya está ajustando
+        try:
+            objetivo = 0.9 * presupuesto
+            with self._lock:
+                candidatos = sorted(self._memoria.items(), key=lambda par: par[1], reverse=True)
+                cuota = objetivo / max(1, len(self._generadores))
+            for clave, memoria in candidatos:
+                if self.memoria_total <= objetivo or memoria <= cuota:
+                    break
+                generador = self._generadores.get(clave)
+                # Un generador en uso se salta: se medirá y ajustará al terminar
+                if generador is None or not generador.lock.acquire(blocking=False):
+                    continue
+                try:
+                    generador.ia.recortar_datos(int(cuota))
+                    self._medir(clave, generador)
+                    self.recortes_memoria += 1
+                finally:
+                    generador.lock.release()
+            with self._lock:
+                while self.memoria_total > objetivo and len(self._generadores) > 1:
+                    self._olvidar(self._generadores.popitem(last=False)[0])
+                    self.expulsiones_memoria += 1
+        finally:
+            self._lock_ajuste.release()
+
+    def memoria_por_estudiante(self) -> Dict[int, int]:
+        """Bytes contabilizados de cada estudiante en memoria, sumando sus operaciones"""
+        with self._lock:
+            memoria: Dict[int, int] = {}
+            for (usuario_id, _), bytes_ in self._memoria.items():
+                memoria[usuario_id] = memoria.get(usuario_id, 0) + bytes_
+            return memoria
+
+    @contextmanager
+    def _sesion(self, clave: ClaveGenerador, generador: GeneradorEjercicios) -> Iterator[None]:
+        """Trae la última versión compartida del estado y publica los cambios del bloque.
+
+        La escritura solo se acepta si nadie guardó el estado desde que se leyó; si otro
+        worker se adelantó, se carga su versión, se repiten encima los cambios del bloque
+        (el diario del generador) y se vuelve a intentar.
+        """
+        self._sincronizar(clave, generador)
+        generador.diario = []
+        try:
+            try:
+                yield
+            except BaseException:
+                # Nada se guardó: releer el estado compartido la próxima vez
+                generador.version_compartida = 0
+                raise
+            ia = generador.ia
+            for _ in range(REINTENTOS_ESTADO):
+                if ia.version == ia.version_guardada:
+                    return
+                version = ia.version
+                nueva = self.estado.escribir(_clave_texto(clave), generador.version_compartida,
+                                             ia.exportar_estado().tobytes())
+                if nueva is not None:
+                    generador.version_compartida = nueva
+                    ia.version_guardada = version
+                    return
+                diario, generador.diario = generador.diario, []
+                self._sincronizar(clave, generador)
+                for metodo, argumentos in diario:
+                    metodo(*argumentos)
+            generador.version_compartida = 0
+            raise RuntimeError(f'El estado de {clave} cambió en cada uno de {REINTENTOS_ESTADO} intentos')
+        finally:
+            generador.diario = None
+
+    def _sincronizar(self, clave: ClaveGenerador, generador: GeneradorEjercicios) -> bool:
+        """Carga el estado compartido si cambió; devuelve si existe estado compartido"""
+        version, datos = self.estado.leer(_clave_texto(clave), generador.version_compartida)
+        if datos is None:
+            return version != 0
+        # bytearray: el arreglo debe poder modificarse al registrar nuevas muestras
+        generador.ia.restaurar_estado(np.frombuffer(bytearray(datos), dtype=np.float64))
+        generador.nivel_actual = generador.ia.nivel_actual
+        generador.version_compartida = version
+        return True
+
+    def _propagar(self, clave: ClaveGenerador, generador: GeneradorEjercicios):
+        """Comparte en seguida un modelo entrenado en segundo plano"""
+        with generador.lock, self._sesion(clave, generador):
+            pass
+
+    def descartar(self, usuario_id: int, operacion: Optional[str] = None):
+        """Elimina de memoria el estado de un estudiante (de una operación o de todas)"""
+        with self._lock:
+            for clave in list(self._generadores):
+                if clave[0] == usuario_id and operacion in (None, clave[1]):
+                    del self._generadores[clave]
+                    self._olvidar(clave)
+
+    def generadores(self) -> List[tuple[ClaveGenerador, GeneradorEjercicios]]:
+        """Copia de los pares ((usuario_id, operacion), generador) en memoria"""
+        with self._lock:
+            return list(self._generadores.items())
+
+    def __len__(self) -> int:
+        return len(self._generadores)
+
+def _clave_texto(clave: ClaveGenerador) -> str:
+    usuario_id, operacion = clave
+    return f'{usuario_id}-{operacion}'
+
+class PuntosControl:
+    """Guarda en disco el estado de IA de cada estudiante para recuperarlo tras un reinicio.
+
+    Cada estudiante y operación tiene un archivo .npy con el arreglo de TrueAISystem.exportar_estado().
+    Un hilo de fondo escribe cada `intervalo` segundos los estados que cambiaron; cada
+    escritura va a un archivo temporal que luego reemplaza al anterior, así que un lector
+    nunca ve un archivo a medio escribir. Los archivos se leen con memoria mapeada.
+    """
+
+    def __init__(self, registro: RegistroGeneradores, directorio: Optional[str] = None,
+                 intervalo: float = 30.0):
+        self.registro = registro
+        self.directorio = directorio  # None desactiva los puntos de control
+        self.intervalo = intervalo
+        self._cond = threading.Condition()
+        self._hilo: Optional[threading.Thread] = None
+        self._detener = False
+        # Métricas
+        self.guardados = 0
+        self.cargados = 0
+        self.errores = 0
+
+    def _ruta(self, clave: ClaveGenerador) -> str:
+        return os.path.join(cast(str, self.directorio), f'{_clave_texto(clave)}.npy')
+
+    def cargar(self, clave: ClaveGenerador, generador: GeneradorEjercicios) -> Optional[datetime]:
+        """Restaura el estado guardado del estudiante; devuelve cuándo se guardó o None si no hay"""
+        if self.directorio is None:
+            return None
+        try:
+            # mmap_mode='c': las páginas se leen bajo demanda y escribir en ellas no toca el archivo
+            estado = np.load(self._ruta(clave), mmap_mode='c')
+            guardado = generador.ia.restaurar_estado(estado)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            self.errores += 1
+            logger.warning('Punto de control ilegible para %s; se ignora', clave, exc_info=True)
+            return None
+        generador.nivel_actual = generador.ia.nivel_actual
+        self.cargados += 1
+        return datetime.fromtimestamp(guardado)
+
+    def guardar(self, clave: ClaveGenerador, generador: GeneradorEjercicios) -> bool:
+        """Escribe ahora el estado del estudiante de forma atómica"""
+        if self.directorio is None:
+            return False
+        with generador.lock:
+            version = generador.ia.version
+            estado = generador.ia.exportar_estado()
+        ruta = self._ruta(clave)
+        temporal = f'{ruta}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(self.directorio, exist_ok=True)
+            with open(temporal, 'wb') as archivo:
+                np.save(archivo, estado)
+                archivo.flush()
+                os.fsync(archivo.fileno())
+            os.replace(temporal, ruta)
+        except OSError:
+            self.errores += 1
+            logger.exception('Error al guardar el punto de control de %s', clave)
+            try:
+                os.unlink(temporal)
+            except OSError:
+                pass
+            return False
+        ia = generador.ia
+        ia.version_guardada = max(ia.version_guardada, version)
+        self.guardados += 1
+        return True
+
+    def guardar_pendientes(self) -> int:
+        """Escribe los estados en memoria que cambiaron desde su último punto de control"""
+        escritos = 0
+        for clave, generador in self.registro.generadores():
+            if generador.ia.version != generador.ia.version_guardada and self.guardar(clave, generador):
+                escritos += 1
+        return escritos
+
+    def iniciar(self):
+        """Arranca el hilo de escritura periódica"""
+        if self.directorio is None:
+            return
+        with self._cond:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._detener = False
+                self._hilo = threading.Thread(target=self._trabajar, name='puntos-control-ia', daemon=True)
+                self._hilo.start()
+
+    def _trabajar(self):
+        while True:
+            with self._cond:
+                if self._detener:
+                    return
+                self._cond.wait(self.intervalo)
+                if self._detener:
+                    return
+            try:
+                self.guardar_pendientes()
+            except Exception:
+                self.errores += 1
+                logger.exception('Error al guardar los puntos de control')
+
+    def detener(self):
+        """Detiene el hilo y guarda lo pendiente (p. ej. al apagar el proceso)"""
+        with self._cond:
+            self._detener = True
+            self._cond.notify_all()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+        self.guardar_pendientes()
+
+# Planificador global de reentrenamiento
+planificador = PlanificadorReentrenamiento()
+
+# Predicción agrupada entre peticiones concurrentes (None = cada petición predice por su cuenta)
+predictor: Optional[PredictorPorLotes] = None
+
+# Registro global de generadores, uno por estudiante
+registro = RegistroGeneradores()
+
+# Puntos de control en disco del registro global (desactivados hasta fijar el directorio)
+puntos_control = PuntosControl(registro)
+
+def precalentar():
+    """Importa scikit-learn por adelantado para no pagar su carga en el primer entrenamiento"""
+    import sklearn.tree  # noqa: F401
 
-def generar_ejercicios_suma(nivel: int = 1) -> List[Dict[str, int]]:
-    """Función de interfaz para generar ejercicios de suma"""
-    return [generador.generar_ejercicio(nivel)] 
\ No newline at end of file
+def generar_ejercicios(generador: GeneradorEjercicios, nivel: int = 1, cantidad: int = 1,
+                      sin_repetir: bool = False) -> List[Dict[str, Any]]:
+    """Función de interfaz para generar ejercicios de la operación del generador"""
+    return generador.generar_ejercicios(nivel, cantidad, sin_repetir)
@@ -0,0 +1,113 @@
+"""Exportación del progreso y de los intentos de los estudiantes en CSV o NDJSON.
+
+Las filas llegan de un iterador (en la aplicación, una consulta con yield_per que la
+base de datos entrega por bloques) y salen como trozos de bytes de unos
+TAMANO_TROZO bytes, opcionalmente comprimidos con gzip. Nada depende del número de
+filas, así que la memoria no crece aunque se exporte un colegio entero: el mismo
+generador alimenta la respuesta HTTP por trozos y el archivo de la línea de órdenes.
+
+Uso:
+    python exportacion.py {progreso,intentos} [--formato csv|ndjson] [--gzip] [--grupo 5A]
+        [--desde 2026-01-01] [--salida archivo]
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import zlib
+from datetime import date, datetime
+from typing import Any, Iterable, Iterator, Optional, Sequence
+
+FORMATOS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+TAMANO_TROZO = 64 * 1024  # Bytes acumulados antes de entregar un trozo
+
+def _valor(valor: Any) -> Any:
+    """Fechas en ISO 8601 y booleanos como 0/1, igual en CSV y NDJSON"""
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, bool):
+        return int(valor)
+    return valor
+
+def codificar_csv(columnas: Sequence[str], filas: Iterable[Sequence[Any]]) -> Iterator[str]:
+    """Cabecera y filas en CSV, agrupadas en trozos de texto"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator='\n')
+    escritor.writerow(columnas)
+    for fila in filas:
+        escritor.writerow([_valor(v) for v in fila])
+        if buffer.tell() >= TAMANO_TROZO:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def codificar_ndjson(columnas: Sequence[str], filas: Iterable[Sequence[Any]]) -> Iterator[str]:
+    """Un objeto JSON por línea, agrupados en trozos de texto"""
+    lineas = []
+    tamano = 0
+    for fila in filas:
+        linea = json.dumps(dict(zip(columnas, map(_valor, fila))), ensure_ascii=False)
+        lineas.append(linea)
+        tamano += len(linea) + 1
+        if tamano >= TAMANO_TROZO:
+            yield '\n'.join(lineas) + '\n'
+            lineas, tamano = [], 0
+    if lineas:
+        yield '\n'.join(lineas) + '\n'
+
+def comprimir(trozos: Iterable[bytes]) -> Iterator[bytes]:
+    """Comprime en gzip un flujo de trozos sin reunirlo en memoria"""
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: cabecera y cola gzip
+    for trozo in trozos:
+        comprimido = compresor.compress(trozo)
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
+
+def exportar(columnas: Sequence[str], filas: Iterable[Sequence[Any]], formato: str = 'csv',
+             gzip: bool = False) -> Iterator[bytes]:
+    """Trozos de bytes del archivo exportado en el formato pedido"""
+    codificar = codificar_csv if formato == 'csv' else codificar_ndjson
+    trozos = (texto.encode('utf-8') for texto in codificar(columnas, filas) if texto)
+    return comprimir(trozos) if gzip else trozos
+
+def nombre_archivo(tipo: str, formato: str, gzip: bool, fecha: Optional[date] = None) -> str:
+    return f"{tipo}-{(fecha or date.today()).isoformat()}.{formato}{'.gz' if gzip else ''}"
+
+def main():
+    from app import TIPOS_EXPORTACION, app, filas_exportacion, Grupo, db
+
+    parser = argparse.ArgumentParser(description='Exporta el progreso o los intentos de los estudiantes')
+    parser.add_argument('tipo', choices=list(TIPOS_EXPORTACION))
+    parser.add_argument('--formato', choices=list(FORMATOS), default='csv')
+    parser.add_argument('--gzip', action='store_true', help='comprimir la salida')
+    parser.add_argument('--grupo', help='exportar solo los estudiantes de este grupo (por nombre)')
+    parser.add_argument('--desde', type=datetime.fromisoformat,
+                        help='solo intentos desde esta fecha (AAAA-MM-DD[THH:MM])')
+    parser.add_argument('--salida', help="archivo de salida ('-' = salida estándar; por defecto, tipo-fecha.formato)")
+    args = parser.parse_args()
+
+    salida = args.salida or nombre_archivo(args.tipo, args.formato, args.gzip)
+    with app.app_context():
+        grupo_id = None
+        if args.grupo:
+            grupo = db.session.query(Grupo).filter_by(nombre=args.grupo).first()
+            if grupo is None:
+                sys.exit(f"No existe el grupo {args.grupo}")
+            grupo_id = grupo.id
+        filas = filas_exportacion(args.tipo, grupo_id, args.desde)
+        trozos = exportar(TIPOS_EXPORTACION[args.tipo], filas, args.formato, args.gzip)
+        if salida == '-':
+            for trozo in trozos:
+                sys.stdout.buffer.write(trozo)
+            sys.stdout.buffer.flush()
+            return
+        with open(salida, 'wb') as archivo:
+            for trozo in trozos:
+                archivo.write(trozo)
+    print(f"Exportado {args.tipo} a {salida}", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,85 @@
-from app import app, db, Usuario
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List
+
+from app import app, db, Usuario, ProgresoOperacion, Grupo, grupo_estudiante
+from operaciones import OPERACIONES
+from sqlalchemy import Table, delete, func, inspect, insert, literal, select, text
 from werkzeug.security import generate_password_hash
 
+def migrar_progreso_suma():
+    """Copia las filas de la antigua tabla progreso_suma a progreso_operacion"""
+    if not inspect(db.engine).has_table('progreso_suma'):
+        return
+    resultado = db.session.execute(text(
+        "INSERT INTO progreso_operacion "
+        "(usuario_id, operacion, nivel, ejercicios_completados, aciertos, ultima_puntuacion) "
+        "SELECT usuario_id, 'suma', nivel, ejercicios_completados, aciertos, ultima_puntuacion "
+        "FROM progreso_suma s "
+        "WHERE s.id = (SELECT MIN(id) FROM progreso_suma WHERE usuario_id = s.usuario_id) "
+        "AND NOT EXISTS (SELECT 1 FROM progreso_operacion p "
+        "WHERE p.usuario_id = s.usuario_id AND p.operacion = 'suma')"
+    ))
+    db.session.commit()
+    if resultado.rowcount:
+        print(f"Migrados {resultado.rowcount} progresos de suma a progreso_operacion")
+
+def eliminar_duplicados(tabla: Table, columnas: List[str]) -> int:
+    """Deja una sola fila (la de menor id) por combinación de `columnas`"""
+    claves = [tabla.c[nombre] for nombre in columnas]
+    conservadas = select(func.min(tabla.c.id)).group_by(*claves).scalar_subquery()
+    return db.session.execute(delete(tabla).where(tabla.c.id.not_in(conservadas))).rowcount
+
+def migrar_esquema():
+    """Pone al día una base de datos creada con una versión anterior; se puede repetir sin efecto.
+
+    create_all() solo crea las tablas que faltan, así que las columnas e índices añadidos
+    después a tablas existentes se crean aquí. Antes de crear un índice único se
+    eliminan las filas repetidas que lo impedirían.
+    """
+    db.create_all()
+    dialecto = db.engine.dialect
+    preparador = dialecto.identifier_preparer
+    inspector = inspect(db.engine)
+    for tabla in db.metadata.sorted_tables:
+        existentes = {columna['name'] for columna in inspector.get_columns(tabla.name)}
+        for columna in tabla.columns:
+            if columna.name in existentes:
+                continue
+            sql = (f"ALTER TABLE {preparador.format_table(tabla)} "
+                   f"ADD COLUMN {preparador.format_column(columna)} {columna.type.compile(dialect=dialecto)}")
+            if columna.default is not None and columna.default.is_scalar:
+                # Las filas existentes toman el valor por defecto del modelo
+                valor = literal(columna.default.arg).compile(dialect=dialecto, compile_kwargs={'literal_binds': True})
+                sql += f"{'' if columna.nullable else ' NOT NULL'} DEFAULT {valor}"
+            db.session.execute(text(sql))
+            print(f"Añadida la columna {tabla.name}.{columna.name}")
+    db.session.commit()
+    migrar_progreso_suma()
+
+    inspector = inspect(db.engine)
+    for tabla in db.metadata.sorted_tables:
+        existentes = {indice['name'] for indice in inspector.get_indexes(tabla.name)}
+        for indice in tabla.indexes:
+            if indice.name in existentes:
+                continue
+            if indice.unique and 'id' in tabla.c:
+                eliminadas = eliminar_duplicados(tabla, [columna.name for columna in indice.columns])
+                if eliminadas:
+                    print(f"Eliminadas {eliminadas} filas repetidas de {tabla.name}")
+            indice.create(db.session.connection())
+            db.session.commit()
+            print(f"Creado el índice {indice.name}")
+
 def init_db():
     with app.app_context():
-        # Crear las tablas
-        db.create_all()
-        
+        # Crear las tablas que falten y poner al día las existentes
+        migrar_esquema()
+
         # Verificar si el usuario ya existe
         usuario = Usuario.query.filter_by(identidad='123').first()
         if not usuario:
@@ -20,5 +94,134 @@ def init_db():
         else:
             print("El usuario de prueba ya existe")
 
+def leer_csv(ruta: str) -> Iterator[Dict[str, str]]:
+    """Recorre el CSV (columnas identidad, password y opcionalmente grupo) sin cargarlo entero en memoria"""
+    with open(ruta, newline='', encoding='utf-8-sig') as archivo:
+        for fila in csv.DictReader(archivo):
+            yield {'identidad': (fila.get('identidad') or '').strip(), 'password': fila.get('password') or '',
+                   'grupo': (fila.get('grupo') or '').strip()}
+
+def ids_grupos(nombres: Iterable[str]) -> Dict[str, int]:
+    """Id de cada grupo por nombre, creando los que no existan"""
+    nombres = set(nombres)
+    if not nombres:
+        return {}
+    existentes = dict(db.session.execute(select(Grupo.nombre, Grupo.id).where(Grupo.nombre.in_(nombres))).all())
+    nuevos = [{'nombre': nombre} for nombre in nombres if nombre not in existentes]
+    if nuevos:
+        filas = db.session.execute(insert(Grupo).returning(Grupo.nombre, Grupo.id), nuevos).all()
+        existentes.update(dict(filas))
+    return existentes
+
+def asignar_docente(nombre_grupo: str, identidad: str):
+    """Crea el grupo si no existe y lo pone a cargo del usuario indicado"""
+    with app.app_context():
+        migrar_esquema()
+        docente = Usuario.query.filter_by(identidad=identidad).first()
+        if docente is None:
+            print(f"No existe el usuario {identidad}")
+            return
+        grupo = db.session.get(Grupo, ids_grupos([nombre_grupo])[nombre_grupo])
+        grupo.docente_id = docente.id
+        db.session.commit()
+        print(f"Grupo {nombre_grupo} (id {grupo.id}) asignado a {identidad}")
+
+def agregar_a_grupos(grupos: Dict[str, str], ids: Dict[str, int]):
+    """Añade cada identidad a su grupo, salvo si ya pertenece a él"""
+    if not grupos:
+        return
+    id_grupo = ids_grupos(grupos.values())
+    pares = {(id_grupo[nombre], ids[identidad]) for identidad, nombre in grupos.items()}
+    existentes = set(db.session.execute(
+        select(grupo_estudiante.c.grupo_id, grupo_estudiante.c.usuario_id)
+        .where(grupo_estudiante.c.usuario_id.in_([usuario_id for _, usuario_id in pares]))
+    ).all())
+    nuevos = [{'grupo_id': g, 'usuario_id': u} for g, u in pares - existentes]
+    if nuevos:
+        db.session.execute(insert(grupo_estudiante), nuevos)
+
+def aprovisionar(ruta: str, tamano_lote: int = 1000, procesos: int = 0) -> Dict[str, int]:
+    """Crea en bloque los estudiantes de un CSV, con su progreso inicial en cada operación.
+
+    Las contraseñas se cifran en paralelo en un pool de procesos. Cada lote se inserta en
+    una transacción y las identidades ya existentes se descartan con una sola consulta
+    por lote sobre el índice único de identidad. Si el CSV tiene columna grupo, cada
+    estudiante (nuevo o existente) se añade a su grupo.
+    """
+    maximo_identidad = Usuario.__table__.c.identidad.type.length
+    procesos = procesos or os.cpu_count() or 1
+    resumen = {'creados': 0, 'existentes': 0, 'invalidos': 0}
+    filas = leer_csv(ruta)
+    inicio = time.perf_counter()
+    with app.app_context(), ProcessPoolExecutor(max_workers=procesos) as pool:
+        migrar_esquema()
+        while True:
+            lote = list(islice(filas, tamano_lote))
+            if not lote:
+                break
+            # Descartar filas inválidas y repetidas dentro del lote
+            nuevas: Dict[str, str] = {}
+            grupos: Dict[str, str] = {}
+            for fila in lote:
+                identidad = fila['identidad']
+                if not identidad or len(identidad) > maximo_identidad or not fila['password']:
+                    resumen['invalidos'] += 1
+                elif identidad in nuevas:
+                    resumen['existentes'] += 1
+                else:
+                    nuevas[identidad] = fila['password']
+                    if fila['grupo']:
+                        grupos[identidad] = fila['grupo']
+            existentes = dict(db.session.execute(
+                select(Usuario.identidad, Usuario.id).where(Usuario.identidad.in_(list(nuevas)))
+            ).all())
+            resumen['existentes'] += len(existentes)
+            identidades = [identidad for identidad in nuevas if identidad not in existentes]
+            if not identidades:
+                agregar_a_grupos(grupos, existentes)
+                db.session.commit()
+                continue
+
+            hashes = pool.map(generate_password_hash, [nuevas[i] for i in identidades],
+                              chunksize=max(1, len(identidades) // (4 * procesos)))
+            usuarios: List[Dict[str, str]] = [
+                {'identidad': identidad, 'password': password_hash}
+                for identidad, password_hash in zip(identidades, hashes)
+            ]
+            # RETURNING no garantiza el orden de las filas: emparejar cada id con su identidad
+            creados = dict(db.session.execute(
+                insert(Usuario).returning(Usuario.identidad, Usuario.id), usuarios).all())
+            ids = list(creados.values())
+            agregar_a_grupos(grupos, {**existentes, **creados})
+            db.session.execute(insert(ProgresoOperacion), [
+                {'usuario_id': usuario_id, 'operacion': operacion, 'nivel': 1,
+                 'ejercicios_completados': 0, 'aciertos': 0, 'ultima_puntuacion': 0.0}
+                for usuario_id in ids
+                for operacion in OPERACIONES
+            ])
+            db.session.commit()
+            resumen['creados'] += len(ids)
+            transcurrido = time.perf_counter() - inicio
+            print(f"{resumen['creados']} estudiantes creados ({resumen['creados'] / transcurrido:.0f} filas/s)")
+
+    transcurrido = time.perf_counter() - inicio
+    procesadas = sum(resumen.values())
+    print(f"Creados {resumen['creados']}, ya existentes {resumen['existentes']}, "
+          f"inválidos {resumen['invalidos']} en {transcurrido:.1f} s "
+          f"({procesadas / transcurrido if transcurrido else 0:.0f} filas/s)")
+    return resumen
+
 if __name__ == '__main__':
-    init_db() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Inicializa la base de datos y, opcionalmente, crea estudiantes')
+    parser.add_argument('--csv', help='CSV con columnas identidad,password de los estudiantes a crear')
+    parser.add_argument('--lote', type=int, default=1000, help='filas por transacción')
+    parser.add_argument('--procesos', type=int, default=0, help='procesos para cifrar contraseñas (0 = uno por núcleo)')
+    parser.add_argument('--grupo', help='grupo al que asignar el docente de --docente')
+    parser.add_argument('--docente', help='identidad del docente a cargo de --grupo')
+    args = parser.parse_args()
+    if args.csv:
+        aprovisionar(args.csv, args.lote, args.procesos)
+    elif args.grupo and args.docente:
+        asignar_docente(args.grupo, args.docente)
+    else:
+        init_db()
@@ -0,0 +1,134 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Límites superiores (segundos) de los buckets de los histogramas de duración
+BUCKETS_SEGUNDOS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+Etiquetas = Tuple[Tuple[str, str], ...]
+
+class _Nulo:
+    """Contexto que no hace nada, usado cuando las métricas están desactivadas"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULO = _Nulo()
+
+class _Cronometro:
+    def __init__(self, metricas: 'Metricas', nombre: str, etiquetas: Etiquetas):
+        self.metricas = metricas
+        self.nombre = nombre
+        self.etiquetas = etiquetas
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metricas._observar(self.nombre, self.etiquetas, time.perf_counter() - self.inicio)
+        return False
+
+class Metricas:
+    """Contadores e histogramas en memoria exportables en formato de texto de Prometheus.
+
+    Mientras `habilitadas` es False, incrementar(), observar() y medir() retornan sin
+    hacer nada, de modo que la instrumentación no cuesta casi nada.
+    """
+
+    def __init__(self, prefijo: str = 'sabiduria', habilitadas: bool = False):
+        self.prefijo = prefijo
+        self.habilitadas = habilitadas
+        self._lock = threading.Lock()
+        self._ayuda: Dict[str, Tuple[str, str]] = {}  # nombre -> (tipo, ayuda)
+        self._contadores: Dict[str, Dict[Etiquetas, float]] = {}
+        # nombre -> etiquetas -> [conteo por bucket..., +Inf, suma]
+        self._histogramas: Dict[str, Dict[Etiquetas, List[float]]] = {}
+        # Valores calculados al exportar: función que devuelve {etiquetas: valor}
+        self._calculados: Dict[str, Callable[[], Dict[Etiquetas, float]]] = {}
+
+    def describir(self, nombre: str, tipo: str, ayuda: str):
+        """Declara el tipo (counter, gauge, histogram) y la ayuda de una métrica"""
+        self._ayuda[nombre] = (tipo, ayuda)
+
+    def incrementar(self, nombre: str, valor: float = 1, **etiquetas: str):
+        if not self.habilitadas:
+            return
+        clave = tuple(sorted(etiquetas.items()))
+        with self._lock:
+            serie = self._contadores.setdefault(nombre, {})
+            serie[clave] = serie.get(clave, 0) + valor
+
+    def observar(self, nombre: str, segundos: float, **etiquetas: str):
+        if not self.habilitadas:
+            return
+        self._observar(nombre, tuple(sorted(etiquetas.items())), segundos)
+
+    def _observar(self, nombre: str, etiquetas: Etiquetas, segundos: float):
+        with self._lock:
+            serie = self._histogramas.setdefault(nombre, {})
+            cubetas = serie.get(etiquetas)
+            if cubetas is None:
+                cubetas = serie[etiquetas] = [0.0] * (len(BUCKETS_SEGUNDOS) + 2)
+            cubetas[bisect_left(BUCKETS_SEGUNDOS, segundos)] += 1
+            cubetas[-1] += segundos
+
+    def medir(self, nombre: str, **etiquetas: str):
+        """Contexto que registra la duración del bloque en el histograma `nombre`"""
+        if not self.habilitadas:
+            return _NULO
+        return _Cronometro(self, nombre, tuple(sorted(etiquetas.items())))
+
+    def calcular(self, nombre: str, tipo: str, ayuda: str, funcion: Callable[[], Dict[Etiquetas, float]]):
+        """Registra una métrica cuyo valor se obtiene de `funcion` en cada exportación"""
+        self.describir(nombre, tipo, ayuda)
+        self._calculados[nombre] = funcion
+
+    def reiniciar(self):
+        with self._lock:
+            self._contadores.clear()
+            self._histogramas.clear()
+
+    def exportar(self) -> str:
+        """Texto en formato de exposición de Prometheus"""
+        lineas: List[str] = []
+        with self._lock:
+            contadores = {n: dict(s) for n, s in self._contadores.items()}
+            histogramas = {n: {e: list(c) for e, c in s.items()} for n, s in self._histogramas.items()}
+        for nombre, funcion in self._calculados.items():
+            contadores[nombre] = funcion()
+
+        for nombre in sorted(set(contadores) | set(histogramas)):
+            completo = f'{self.prefijo}_{nombre}'
+            tipo, ayuda = self._ayuda.get(nombre, ('histogram' if nombre in histogramas else 'counter', ''))
+            if ayuda:
+                lineas.append(f'# HELP {completo} {ayuda}')
+            lineas.append(f'# TYPE {completo} {tipo}')
+            for etiquetas, valor in sorted(contadores.get(nombre, {}).items()):
+                lineas.append(f'{completo}{_formatear(etiquetas)} {_numero(valor)}')
+            for etiquetas, cubetas in sorted(histogramas.get(nombre, {}).items()):
+                acumulado = 0.0
+                for limite, conteo in zip(BUCKETS_SEGUNDOS + (float('inf'),), cubetas):
+                    acumulado += conteo
+                    le = '+Inf' if limite == float('inf') else repr(limite)
+                    lineas.append(f'{completo}_bucket{_formatear(etiquetas + (("le", le),))} {_numero(acumulado)}')
+                lineas.append(f'{completo}_sum{_formatear(etiquetas)} {_numero(cubetas[-1])}')
+                lineas.append(f'{completo}_count{_formatear(etiquetas)} {_numero(acumulado)}')
+        return '\n'.join(lineas) + '\n'
+
+def _formatear(etiquetas: Etiquetas) -> str:
+    if not etiquetas:
+        return ''
+    pares = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in etiquetas)
+    return '{' + pares + '}'
+
+def _numero(valor: Optional[float]) -> str:
+    valor = float(valor or 0)
+    return str(int(valor)) if valor.is_integer() else repr(valor)
+
+# Registro global de métricas del proceso
+metricas = Metricas()
@@ -0,0 +1,67 @@
+from typing import Dict, Tuple
+
+# Rango (inclusive) de los dos números base de cada nivel
+RANGOS_NIVEL = {
+    1: (1, 10),
+    2: (10, 50),
+    3: (50, 100)
+}
+
+RANGOS_FACTORES = {
+    1: (1, 5),
+    2: (2, 10),
+    3: (5, 20)
+}
+
+class Operacion:
+    """Estrategia de una operación aritmética: rangos por nivel y forma del ejercicio.
+
+    El generador muestrea dos números base en el rango del nivel y la operación los
+    convierte en los operandos y la respuesta con componer(). Funciona igual con enteros
+    que con arreglos de NumPy, así que este módulo no necesita importar NumPy.
+    """
+
+    def __init__(self, nombre: str, titulo: str, simbolo: str, icono: str, color: str,
+                 rangos: Dict[int, Tuple[int, int]]):
+        self.nombre = nombre
+        self.titulo = titulo
+        self.simbolo = simbolo
+        self.icono = icono  # Clase de Font Awesome
+        self.color = color  # Color de Bootstrap
+        self.rangos = rangos
+
+    def rango(self, nivel: int) -> Tuple[int, int]:
+        """Rango de los números base del nivel, limitado a los niveles existentes"""
+        return self.rangos[min(max(nivel, 1), 3)]
+
+    def componer(self, a, b):
+        """Devuelve (num1, num2, respuesta) a partir de los números base"""
+        raise NotImplementedError
+
+class Suma(Operacion):
+    def componer(self, a, b):
+        return a, b, a + b
+
+class Resta(Operacion):
+    def componer(self, a, b):
+        # Minuendo = a + b: la diferencia nunca es negativa
+        return a + b, b, a
+
+class Multiplicacion(Operacion):
+    def componer(self, a, b):
+        return a, b, a * b
+
+class Division(Operacion):
+    def componer(self, a, b):
+        # Dividendo = a * b: la división siempre es exacta
+        return a * b, b, a
+
+OPERACIONES: Dict[str, Operacion] = {
+    operacion.nombre: operacion
+    for operacion in (
+        Suma('suma', 'Suma', '+', 'fa-plus', 'primary', RANGOS_NIVEL),
+        Resta('resta', 'Resta', '−', 'fa-minus', 'danger', RANGOS_NIVEL),
+        Multiplicacion('multiplicacion', 'Multiplicación', '×', 'fa-times', 'success', RANGOS_FACTORES),
+        Division('division', 'División', '÷', 'fa-divide', 'warning', RANGOS_FACTORES)
+    )
+}
@@ -0,0 +1,336 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class _EscrituraEnLotes:
+    """Base de los búferes que escriben en lotes desde un hilo de fondo.
+
+    Un lote se escribe cada `intervalo` segundos, en cuanto se acumulan `max_pendientes`
+    elementos o al llamar a `vaciar()`/`detener()`. Si la escritura falla, el lote vuelve
+    al búfer y se reintenta en la siguiente pasada.
+    """
+
+    nombre_hilo = 'escritura-en-lotes'
+
+    def __init__(self, escribir: Callable[[List[Dict[str, Any]]], None],
+                 intervalo: float = 1.0, max_pendientes: int = 500):
+        self.escribir = escribir  # Recibe una lista de filas y las guarda en una transacción
+        self.intervalo = intervalo
+        self.max_pendientes = max(1, max_pendientes)
+        self._cond = threading.Condition()
+        self._lock_escritura = threading.Lock()
+        self._hilo: Optional[threading.Thread] = None
+        self._detener = False
+        # Métricas
+        self.lotes = 0
+        self.filas = 0
+        self.errores = 0
+
+    def _avisar(self):
+        """Llamar con self._cond tomado tras añadir un elemento"""
+        if self._cantidad() >= self.max_pendientes:
+            self._cond.notify()
+        self._asegurar_hilo()
+
+    def vaciar(self):
+        """Escribe de inmediato todo lo pendiente"""
+        with self._lock_escritura:
+            with self._cond:
+                lote = self._tomar_lote()
+            if not lote:
+                return
+            try:
+                self.escribir(lote)
+            except Exception:
+                self.errores += 1
+                logger.exception('Error al escribir un lote diferido; se reintentará')
+                with self._cond:
+                    self._devolver_lote()
+                return
+            with self._cond:
+                self._terminar_lote()
+                self.lotes += 1
+                self.filas += len(lote)
+
+    def _asegurar_hilo(self):
+        if self._hilo is None or not self._hilo.is_alive():
+            self._detener = False
+            self._hilo = threading.Thread(target=self._trabajar, name=self.nombre_hilo, daemon=True)
+            self._hilo.start()
+
+    def _trabajar(self):
+        while True:
+            with self._cond:
+                if self._detener:
+                    return
+                if self._cantidad() < self.max_pendientes:
+                    self._cond.wait(self.intervalo)
+            self.vaciar()
+
+    def detener(self):
+        """Detiene el hilo de fondo tras escribir lo pendiente (p. ej. al apagar el proceso)"""
+        with self._cond:
+            self._detener = True
+            self._cond.notify_all()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+        self.vaciar()
+
+    def __len__(self) -> int:
+        return self._cantidad()
+
+    # Operaciones que definen las subclases, siempre con self._cond tomado
+    def _cantidad(self) -> int:
+        raise NotImplementedError
+
+    def _tomar_lote(self) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def _devolver_lote(self):
+        raise NotImplementedError
+
+    def _terminar_lote(self):
+        raise NotImplementedError
+
+class EscritorDiferido(_EscrituraEnLotes):
+    """Acumula en memoria los cambios por clave y los escribe en lotes (write-behind).
+
+    Varios cambios de la misma clave se fusionan en uno solo.
+    """
+
+    nombre_hilo = 'escritor-diferido'
+
+    def __init__(self, escribir: Callable[[List[Dict[str, Any]]], None],
+                 intervalo: float = 1.0, max_pendientes: int = 500):
+        super().__init__(escribir, intervalo, max_pendientes)
+        self._pendientes: Dict[Hashable, Dict[str, Any]] = {}
+        # Lote que se está escribiendo: sigue siendo visible para leer() hasta que termine
+        self._en_vuelo: Dict[Hashable, Dict[str, Any]] = {}
+        self.fusionados = 0
+
+    def registrar(self, clave: Hashable, valores: Dict[str, Any]):
+        """Registra los valores más recientes de una clave"""
+        with self._cond:
+            if clave in self._pendientes:
+                self._pendientes[clave].update(valores)
+                self.fusionados += 1
+            else:
+                self._pendientes[clave] = dict(valores)
+            self._avisar()
+
+    def leer(self, clave: Hashable) -> Optional[Dict[str, Any]]:
+        """Valores aún no escritos de una clave, para leer lo que uno mismo escribió"""
+        with self._cond:
+            valores = self._pendientes.get(clave) or self._en_vuelo.get(clave)
+            return dict(valores) if valores else None
+
+    def _cantidad(self) -> int:
+        return len(self._pendientes)
+
+    def _tomar_lote(self) -> List[Dict[str, Any]]:
+        self._en_vuelo, self._pendientes = self._pendientes, {}
+        return list(self._en_vuelo.values())
+
+    def _devolver_lote(self):
+        # Devolver el lote sin pisar cambios más recientes de las mismas claves
+        for clave, valores in self._en_vuelo.items():
+            valores.update(self._pendientes.get(clave, {}))
+            self._pendientes[clave] = valores
+        self._en_vuelo = {}
+
+    def _terminar_lote(self):
+        self._en_vuelo = {}
+
+class BufferLotes(_EscrituraEnLotes):
+    """Acumula filas de solo inserción y las escribe con inserciones masivas"""
+
+    nombre_hilo = 'buffer-lotes'
+
+    def __init__(self, escribir: Callable[[List[Dict[str, Any]]], None],
+                 intervalo: float = 1.0, max_pendientes: int = 500):
+        super().__init__(escribir, intervalo, max_pendientes)
+        self._pendientes: List[Dict[str, Any]] = []
+        self._en_vuelo: List[Dict[str, Any]] = []
+
+    def agregar(self, fila: Dict[str, Any]):
+        """Añade una fila al final del búfer"""
+        with self._cond:
+            self._pendientes.append(fila)
+            self._avisar()
+
+    def filtrar(self, condicion: Callable[[Dict[str, Any]], bool]) -> List[Dict[str, Any]]:
+        """Filas aún no escritas que cumplen la condición, en orden de llegada"""
+        with self._cond:
+            return [fila for fila in self._en_vuelo + self._pendientes if condicion(fila)]
+
+    def _cantidad(self) -> int:
+        return len(self._pendientes)
+
+    def _tomar_lote(self) -> List[Dict[str, Any]]:
+        self._en_vuelo, self._pendientes = self._pendientes, []
+        return self._en_vuelo
+
+    def _devolver_lote(self):
+        self._pendientes = self._en_vuelo + self._pendientes
+        self._en_vuelo = []
+
+    def _terminar_lote(self):
+        self._en_vuelo = []
+
+class CacheTTL:
+    """Caché acotada con expiración por tiempo y expulsión LRU, segura entre hilos.
+
+    Cada clave lleva una versión que cambia al invalidarla: un valor leído antes de
+    una invalidación no se guarda después de ella.
+    """
+
+    def __init__(self, ttl: float = 30.0, capacidad: int = 10000):
+        self.ttl = ttl
+        self.capacidad = max(1, capacidad)
+        self._entradas: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._versiones: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        # Métricas
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+
+    def obtener(self, clave: Hashable) -> Optional[Any]:
+        """Devuelve el valor vigente de la clave o None"""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                if time.monotonic() < entrada[0]:
+                    self._entradas.move_to_end(clave)
+                    self.aciertos += 1
+                    return entrada[1]
+                del self._entradas[clave]
+            self.fallos += 1
+            return None
+
+    def version(self, clave: Hashable) -> int:
+        """Versión actual de la clave; se pasa a guardar() para descartar lecturas obsoletas"""
+        with self._lock:
+            return self._versiones.get(clave, 0)
+
+    def guardar(self, clave: Hashable, valor: Any, version: Optional[int] = None):
+        """Guarda el valor salvo que la clave se haya invalidado desde `version`"""
+        with self._lock:
+            if version is not None and version != self._versiones.get(clave, 0):
+                return
+            self._entradas[clave] = (time.monotonic() + self.ttl, valor)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+
+    def invalidar(self, clave: Hashable):
+        """Descarta el valor de la clave tras una escritura"""
+        with self._lock:
+            self._entradas.pop(clave, None)
+            self._versiones[clave] = self._versiones.get(clave, 0) + 1
+            self.invalidaciones += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def metricas(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'invalidaciones': self.invalidaciones,
+                'entradas': len(self._entradas)
+            }
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+class AlmacenEstadoMemoria:
+    """Estado adaptativo solo en el proceso actual: la copia en memoria es la única"""
+
+    compartido = False
+
+class AlmacenEstadoSQLite:
+    """Estado adaptativo compartido entre procesos en un archivo SQLite.
+
+    Cada clave guarda su estado con un número de versión. Las lecturas no toman el
+    bloqueo de escritura (con WAL no esperan a nadie), y escribir() solo reemplaza el
+    estado si su versión sigue siendo la que se leyó: si otro worker lo cambió entretanto,
+    no escribe y devuelve None para que el llamante relea y repita sus cambios. Así dos
+    workers solo compiten cuando atienden a la vez al mismo estudiante.
+    Cada hilo de cada proceso usa su propia conexión.
+    """
+
+    compartido = True
+
+    def __init__(self, ruta: str, timeout: float = 30.0):
+        self.ruta = ruta
+        self.timeout = timeout
+        self._local = threading.local()
+        # Métricas
+        self.lecturas = 0
+        self.escrituras = 0
+        self.conflictos = 0
+        with closing(self._conectar()) as conexion:
+            conexion.execute(
+                'CREATE TABLE IF NOT EXISTS estado_ia ('
+                'clave TEXT PRIMARY KEY, version INTEGER NOT NULL, '
+                'datos BLOB NOT NULL, actualizado REAL NOT NULL)'
+            )
+
+    def _conectar(self) -> sqlite3.Connection:
+        conexion = sqlite3.connect(self.ruta, timeout=self.timeout, isolation_level=None)
+        conexion.execute('PRAGMA journal_mode=WAL')
+        conexion.execute('PRAGMA synchronous=NORMAL')
+        return conexion
+
+    def _conexion(self) -> sqlite3.Connection:
+        # Una conexión por hilo, y nueva tras un fork: no se comparte con el proceso padre
+        pid, conexion = getattr(self._local, 'conexion', (None, None))
+        if pid != os.getpid():
+            conexion = self._conectar()
+            self._local.conexion = (os.getpid(), conexion)
+        return conexion
+
+    def leer(self, clave: str, version_conocida: int) -> tuple[int, Optional[bytes]]:
+        """Versión guardada de la clave (0 si no existe) y sus datos si difiere de `version_conocida`"""
+        fila = self._conexion().execute(
+            'SELECT version, CASE WHEN version != ? THEN datos END FROM estado_ia WHERE clave = ?',
+            (version_conocida, clave)
+        ).fetchone()
+        self.lecturas += 1
+        if fila is None:
+            return 0, None
+        return fila[0], fila[1]
+
+    def escribir(self, clave: str, version_leida: int, datos: bytes) -> Optional[int]:
+        """Guarda los datos si la versión guardada sigue siendo `version_leida`.
+
+        Devuelve la versión nueva, o None si otro proceso escribió antes (conflicto).
+        """
+        version = version_leida + 1
+        if version_leida == 0:
+            cursor = self._conexion().execute(
+                'INSERT INTO estado_ia (clave, version, datos, actualizado) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (clave) DO NOTHING',
+                (clave, version, datos, time.time())
+            )
+        else:
+            cursor = self._conexion().execute(
+                'UPDATE estado_ia SET version = ?, datos = ?, actualizado = ? WHERE clave = ? AND version = ?',
+                (version, datos, time.time(), clave, version_leida)
+            )
+        if cursor.rowcount != 1:
+            self.conflictos += 1
+            return None
+        self.escrituras += 1
+        return version
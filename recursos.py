@@ -0,0 +1,148 @@
+"""Recursos estáticos servidos por la propia aplicación.
+
+Bootstrap y Font Awesome se copian a static/vendor/ con `python recursos.py` para no
+depender de las CDN, que en las redes de los colegios suelen ir lentas. Cada archivo
+se sirve con su huella en la URL (?v=...), caché de un año y, si el cliente acepta
+gzip, con su variante .gz precomprimida. Si un recurso no se ha descargado, la
+plantilla sigue apuntando a la CDN.
+"""
+import argparse
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import shutil
+import urllib.request
+from typing import Dict, Optional
+
+from flask import request, send_from_directory, url_for
+from werkzeug.security import safe_join
+from werkzeug.wrappers import Response
+
+logger = logging.getLogger(__name__)
+
+BOOTSTRAP = 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist'
+FONT_AWESOME = 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0'
+
+# Ruta dentro de static/ -> URL de la CDN de la que procede
+RECURSOS_CDN: Dict[str, str] = {
+    'vendor/bootstrap/css/bootstrap.min.css': f'{BOOTSTRAP}/css/bootstrap.min.css',
+    'vendor/bootstrap/js/bootstrap.bundle.min.js': f'{BOOTSTRAP}/js/bootstrap.bundle.min.js',
+    'vendor/fontawesome/css/all.min.css': f'{FONT_AWESOME}/css/all.min.css',
+}
+# all.min.css carga las fuentes desde ../webfonts/
+for _fuente in ('fa-brands-400', 'fa-regular-400', 'fa-solid-900', 'fa-v4compatibility'):
+    for _extension in ('woff2', 'ttf'):
+        RECURSOS_CDN[f'vendor/fontawesome/webfonts/{_fuente}.{_extension}'] = \
+            f'{FONT_AWESOME}/webfonts/{_fuente}.{_extension}'
+
+# Formatos que merece la pena comprimir (woff2 y las imágenes ya van comprimidos)
+COMPRIMIBLES = ('.css', '.js', '.map', '.svg', '.ttf', '.json', '.txt')
+
+class RecursosEstaticos:
+    """Versiones, precompresión y envío de los archivos de static/"""
+
+    def __init__(self, directorio: Optional[str], max_age: int = 365 * 24 * 3600):
+        self.directorio = directorio
+        self.max_age = max_age
+        self.versiones: Dict[str, str] = {}  # Ruta relativa -> huella del contenido
+
+    def _archivos(self):
+        if not self.directorio or not os.path.isdir(self.directorio):
+            return
+        for carpeta, _, nombres in os.walk(self.directorio):
+            for nombre in nombres:
+                if not nombre.endswith('.gz') and not nombre.startswith('.'):
+                    ruta = os.path.join(carpeta, nombre)
+                    yield os.path.relpath(ruta, self.directorio).replace(os.sep, '/'), ruta
+
+    def escanear(self) -> int:
+        """Calcula la huella de cada archivo; se hace una vez al arrancar"""
+        versiones = {}
+        for relativa, ruta in self._archivos():
+            huella = hashlib.sha256()
+            with open(ruta, 'rb') as archivo:
+                for bloque in iter(lambda: archivo.read(1 << 16), b''):
+                    huella.update(bloque)
+            versiones[relativa] = huella.hexdigest()[:12]
+        self.versiones = versiones
+        return len(versiones)
+
+    def precomprimir(self) -> int:
+        """Escribe la variante .gz de los archivos comprimibles que no la tengan al día"""
+        escritos = 0
+        for relativa, ruta in self._archivos():
+            if not relativa.endswith(COMPRIMIBLES):
+                continue
+            destino = ruta + '.gz'
+            try:
+                if os.path.exists(destino) and os.path.getmtime(destino) >= os.path.getmtime(ruta):
+                    continue
+                temporal = destino + '.tmp'
+                with open(ruta, 'rb') as origen, open(temporal, 'wb') as crudo:
+                    # mtime=0: el .gz no cambia si el original no cambia
+                    with gzip.GzipFile(filename='', mode='wb', fileobj=crudo, compresslevel=9, mtime=0) as comprimido:
+                        shutil.copyfileobj(origen, comprimido)
+                if os.path.getsize(temporal) >= os.path.getsize(ruta):
+                    os.remove(temporal)
+                    continue
+                os.replace(temporal, destino)
+                escritos += 1
+            except OSError:
+                # Directorio de solo lectura: se sirve el original sin comprimir
+                logger.warning("No se pudo precomprimir %s", relativa, exc_info=True)
+        return escritos
+
+    def url(self, nombre: str) -> str:
+        """URL versionada del recurso local o, si no se ha descargado, la de su CDN"""
+        version = self.versiones.get(nombre)
+        if version is not None:
+            return url_for('static', filename=nombre, v=version)
+        return RECURSOS_CDN.get(nombre) or url_for('static', filename=nombre)
+
+    def servir(self, filename: str) -> Response:
+        """Vista de /static/: variante .gz si el cliente la acepta y caché larga si la URL está versionada"""
+        mimetype = mimetypes.guess_type(filename)[0]
+        comprimido = filename + '.gz'
+        ruta_gz = safe_join(self.directorio, comprimido) if self.directorio else None
+        if (request.accept_encodings.quality('gzip') > 0 and ruta_gz is not None
+                and os.path.isfile(ruta_gz)):
+            respuesta = send_from_directory(self.directorio, comprimido, mimetype=mimetype)
+            respuesta.headers['Content-Encoding'] = 'gzip'
+        else:
+            respuesta = send_from_directory(self.directorio, filename)
+        respuesta.vary.add('Accept-Encoding')
+        version = self.versiones.get(filename)
+        if version is not None and request.args.get('v') == version:
+            respuesta.cache_control.no_cache = None
+            respuesta.cache_control.public = True
+            respuesta.cache_control.max_age = self.max_age
+            respuesta.cache_control.immutable = True
+        return respuesta
+
+def descargar(directorio: str, forzar: bool = False) -> int:
+    """Copia a `directorio` los recursos de RECURSOS_CDN que falten"""
+    descargados = 0
+    for relativa, url in RECURSOS_CDN.items():
+        destino = os.path.join(directorio, *relativa.split('/'))
+        if os.path.exists(destino) and not forzar:
+            continue
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        temporal = destino + '.tmp'
+        with urllib.request.urlopen(url, timeout=30) as respuesta, open(temporal, 'wb') as archivo:
+            shutil.copyfileobj(respuesta, archivo)
+        os.replace(temporal, destino)
+        descargados += 1
+        print(f"Descargado {relativa}")
+    return descargados
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Descarga Bootstrap y Font Awesome a static/ y los precomprime')
+    parser.add_argument('--directorio', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    parser.add_argument('--forzar', action='store_true', help='vuelve a descargar los que ya existen')
+    args = parser.parse_args()
+    descargar(args.directorio, args.forzar)
+    recursos = RecursosEstaticos(args.directorio)
+    recursos.escanear()
+    print(f"Precomprimidos {recursos.precomprimir()} archivos")
@@ -0,0 +1,32 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# Los módulos de la aplicación están en la raíz del repositorio
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+
+# app lee estas variables al importarse: las pruebas nunca tocan instance/
+DIRECTORIO = tempfile.mkdtemp(prefix='sabiduria_pruebas_')
+os.environ['SABIDURIA_DATABASE_URI'] = 'sqlite:///' + os.path.join(DIRECTORIO, 'pruebas.db')
+os.environ['SABIDURIA_MODELOS_DIR'] = os.path.join(DIRECTORIO, 'modelos')
+
+@pytest.fixture
+def aplicacion():
+    """Módulo app con las tablas creadas y vacías"""
+    import app as aplicacion
+    with aplicacion.app.app_context():
+        aplicacion.db.drop_all()
+        aplicacion.db.create_all()
+    aplicacion.cache_usuarios.limpiar()
+    aplicacion._analitica = None  # Los resúmenes en memoria serían de otra base de datos
+    # Los ids se repiten en cada base de datos nueva: olvidar el estado de IA anterior
+    shutil.rmtree(os.environ['SABIDURIA_MODELOS_DIR'], ignore_errors=True)
+    if aplicacion._ia is not None:
+        for (usuario_id, operacion), _ in aplicacion._ia.registro.generadores():
+            aplicacion._ia.registro.descartar(usuario_id, operacion)
+    return aplicacion
@@ -0,0 +1,70 @@
+import os
+
+def test_metricas_se_activan_despues_de_importar(aplicacion):
+    cliente = aplicacion.app.test_client()
+    assert cliente.get('/metrics').status_code == 404
+
+    aplicacion.app.config['METRICAS_HABILITADAS'] = True
+    try:
+        respuesta = cliente.get('/metrics')
+        assert respuesta.status_code == 200
+        assert b'sabiduria_peticiones_total' in cliente.get('/metrics').data
+    finally:
+        aplicacion.app.config['METRICAS_HABILITADAS'] = False
+    assert cliente.get('/metrics').status_code == 404
+
+def crear_usuario(aplicacion, identidad: str) -> int:
+    from werkzeug.security import generate_password_hash
+    usuario = aplicacion.Usuario(identidad=identidad,
+                                 password=generate_password_hash(identidad, method='pbkdf2:sha256:1'))
+    aplicacion.db.session.add(usuario)
+    aplicacion.db.session.commit()
+    return usuario.id
+
+def test_analitica_comprueba_el_docente_en_cada_consulta(aplicacion):
+    app, db = aplicacion.app, aplicacion.db
+    with app.app_context():
+        docente, otro = crear_usuario(aplicacion, 'd1'), crear_usuario(aplicacion, 'd2')
+        grupo = aplicacion.Grupo('5A', docente)
+        db.session.add(grupo)
+        db.session.commit()
+        grupo_id = grupo.id
+
+    cliente = app.test_client()
+    cliente.post('/login', data={'identidad': 'd1', 'password': 'd1'})
+    assert cliente.get(f'/api/grupos/{grupo_id}/analitica').status_code == 200
+
+    # Reasignar el grupo fuera de la aplicación (como init_db.py --grupo --docente)
+    with app.app_context():
+        db.session.get(aplicacion.Grupo, grupo_id).docente_id = otro
+        db.session.commit()
+    assert cliente.get(f'/api/grupos/{grupo_id}/analitica').status_code == 403
+
+    cliente.get('/logout')
+    cliente.post('/login', data={'identidad': 'd2', 'password': 'd2'})
+    assert cliente.get(f'/api/grupos/{grupo_id}/analitica').status_code == 200
+    assert aplicacion.cargar_analitica().obtener(grupo_id).docente_id == otro
+
+def test_importar_con_sqlite_en_memoria():
+    import subprocess
+    import sys
+    from conftest import RAIZ
+    # Proceso nuevo: app lee la URI al importarse
+    codigo = ('import app\n'
+              'with app.app.app_context():\n'
+              '    app.db.create_all()\n'
+              '    assert app.db.session.query(app.Usuario).count() == 0\n'
+              'assert app.app.config["SQLALCHEMY_ENGINE_OPTIONS"] == {}\n')
+    for uri in ('sqlite://', 'sqlite:///:memory:'):
+        entorno = {**os.environ, 'SABIDURIA_DATABASE_URI': uri}
+        resultado = subprocess.run([sys.executable, '-c', codigo], cwd=RAIZ, env=entorno,
+                                   capture_output=True, text=True)
+        assert resultado.returncode == 0, resultado.stderr
+
+def test_pool_solo_con_bases_de_datos_en_archivo_o_servidor(aplicacion):
+    usa_pool = aplicacion.usa_pool_de_conexiones
+    assert usa_pool('sqlite:///usuarios.db')
+    assert usa_pool('postgresql://usuario@localhost/sabiduria')
+    assert not usa_pool('sqlite://')
+    assert not usa_pool('sqlite:///:memory:')
+    assert not usa_pool('sqlite:///file:pruebas?mode=memory&uri=true')
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from sklearn.tree import DecisionTreeRegressor
+
+from bench_inferencia import datos_sinteticos, entrenar
+from ejercicios_ia import ArbolCompilado, predict_many
+
+def comprobar_identico(modelo: DecisionTreeRegressor, X: np.ndarray):
+    arbol = ArbolCompilado.desde_modelo(modelo)
+    esperado = modelo.predict(X)
+    np.testing.assert_array_equal(arbol.predecir_lote(X), esperado)
+    np.testing.assert_array_equal([arbol.predecir(fila) for fila in X.tolist()], esperado)
+
+def filas_en_umbrales(modelo: DecisionTreeRegressor, base: np.ndarray) -> np.ndarray:
+    """Filas con la característica de cada nodo justo en su umbral y a un ulp (float32 y float64) a cada lado"""
+    arbol = modelo.tree_
+    filas = []
+    for nodo in np.flatnonzero(arbol.children_left != -1):
+        umbral = arbol.threshold[nodo]
+        valores = [umbral, np.float32(umbral),
+                   np.nextafter(np.float32(umbral), np.float32(-np.inf)),
+                   np.nextafter(np.float32(umbral), np.float32(np.inf)),
+                   np.nextafter(umbral, -np.inf), np.nextafter(umbral, np.inf)]
+        for valor in valores:
+            fila = base[len(filas) % len(base)].copy()
+            fila[arbol.feature[nodo]] = valor
+            filas.append(fila)
+    return np.array(filas, dtype=np.float64)
+
+@pytest.mark.parametrize('semilla', range(10))
+def test_predicciones_identicas_a_sklearn(semilla):
+    rng = np.random.default_rng(semilla)
+    modelo = entrenar(rng)
+    X, _ = datos_sinteticos(rng, 2000)
+    comprobar_identico(modelo, X)
+    comprobar_identico(modelo, filas_en_umbrales(modelo, X))
+
+def test_empates_en_los_datos_de_entrenamiento():
+    # Filas repetidas con objetivos distintos y columnas idénticas: muchas divisiones empatan
+    rng = np.random.default_rng(1)
+    X = np.repeat(rng.integers(0, 3, (15, 6)).astype(np.float64), 4, axis=0)
+    X[:, 5] = X[:, 4]
+    y = rng.choice([0.5, 1.0, 2.0], len(X))
+    for estado in range(5):
+        modelo = DecisionTreeRegressor(max_depth=4, min_samples_split=5, min_samples_leaf=2,
+                                       random_state=estado).fit(X, y)
+        prueba = np.vstack([X, rng.integers(-1, 4, (200, 6)).astype(np.float64) + rng.choice([0.0, 0.5], (200, 6))])
+        comprobar_identico(modelo, prueba)
+        comprobar_identico(modelo, filas_en_umbrales(modelo, prueba))
+
+def test_predict_many_con_un_arbol_por_fila():
+    rng = np.random.default_rng(2)
+    modelos = [entrenar(rng) for _ in range(50)]
+    arboles = [ArbolCompilado.desde_modelo(m) for m in modelos]
+    X, _ = datos_sinteticos(rng, 50)
+    # Algunas filas en los umbrales de su propio árbol
+    X[::5] = [filas_en_umbrales(m, X[i:i + 1])[0] for i, m in zip(range(0, 50, 5), modelos[::5])]
+    esperado = np.array([m.predict(f.reshape(1, -1))[0] for m, f in zip(modelos, X)])
+    np.testing.assert_array_equal(predict_many(arboles, X), esperado)
+    # Árboles repetidos y un único árbol para todas las filas
+    repetidos = [arboles[i % 3] for i in range(50)]
+    esperado = np.array([modelos[i % 3].predict(f.reshape(1, -1))[0] for i, f in enumerate(X)])
+    np.testing.assert_array_equal(predict_many(repetidos, X), esperado)
+    np.testing.assert_array_equal(predict_many([arboles[0]], X), modelos[0].predict(X))
+
+def test_predict_many_casos_limite():
+    arbol = ArbolCompilado.desde_modelo(entrenar(np.random.default_rng(3)))
+    assert predict_many([arbol], np.empty((0, 6))).shape == (0,)
+    fila = [2.0, 0.4, 7.5, 1.0, 3.0, 5.0]
+    assert predict_many([arbol], fila).tolist() == [arbol.predecir(fila)]
+    with pytest.raises(ValueError):
+        predict_many([arbol, arbol], np.zeros((3, 6)))
@@ -0,0 +1,32 @@
+import pytest
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from carga_api import Medidor
+from consultas_endpoints import LIMITES, recorrer
+
+@pytest.mark.parametrize('diferida,ttl_cache', [(False, 30.0), (True, 30.0), (False, 0)],
+                         ids=['inmediata', 'diferida', 'sin-cache'])
+def test_consultas_por_endpoint(aplicacion, diferida, ttl_cache):
+    app, db = aplicacion.app, aplicacion.db
+    configuracion = {'PROGRESO_ESCRITURA_DIFERIDA': diferida, 'USUARIOS_CACHE_TTL': ttl_cache}
+    anterior = {clave: app.config[clave] for clave in configuracion}
+    app.config.update(configuracion)
+    medidor = Medidor()
+    with app.app_context():
+        db.session.add(aplicacion.Usuario(identidad='e0', password=generate_password_hash('e0', method='pbkdf2:sha256:1')))
+        db.session.commit()
+        motor = db.engine
+    event.listen(motor, 'before_cursor_execute', medidor.contar_consulta)
+    try:
+        cliente = app.test_client()
+        cliente.post('/login', data={'identidad': 'e0', 'password': 'e0'})
+        recorrer(cliente, medidor)
+    finally:
+        event.remove(motor, 'before_cursor_execute', medidor.contar_consulta)
+        aplicacion.escritor_progreso.vaciar()
+        aplicacion.buffer_intentos.vaciar()
+        app.config.update(anterior)
+
+    maximos = {nombre: max(medidor.consultas[nombre]) for nombre in LIMITES}
+    assert {nombre: maximo for nombre, maximo in maximos.items() if maximo > LIMITES[nombre]} == {}
@@ -0,0 +1,144 @@
+import math
+from functools import partial
+
+import numpy as np
+
+from ejercicios_ia import (COLUMNAS_CARACTERISTICAS, AlmacenEntrenamiento, GeneradorEjercicios,
+                           PlanificadorReentrenamiento, RegistroGeneradores, RetencionEstratificada,
+                           RetencionReservorio, RetencionVentana, TrueAISystem)
+from persistencia import AlmacenEstadoSQLite
+
+def sistema(**opciones) -> TrueAISystem:
+    ia = TrueAISystem(**opciones)
+    ia.planificador = PlanificadorReentrenamiento(5, math.inf, sincrono=True)
+    return ia
+
+def responder(ia: TrueAISystem, respuestas: int):
+    for k in range(respuestas):
+        ia.registrar_resultado(1, bool(k % 2), 5.0)
+
+def test_restaurar_estado_vacio_y_responder():
+    ia = sistema()
+    responder(ia, 3)
+    ia.reiniciar()
+    estado = ia.exportar_estado()
+
+    restaurado = sistema()
+    restaurado.restaurar_estado(estado)
+    assert len(restaurado.datos) == 0
+    responder(restaurado, 20)
+    assert len(restaurado.datos) == 20
+
+def test_restaurar_estado_vacio_con_capacidad():
+    ia = sistema(capacidad_datos=8)
+    ia.configurar(4)  # Estado guardado antes de la primera respuesta
+    restaurado = sistema(capacidad_datos=8)
+    restaurado.restaurar_estado(ia.exportar_estado())
+    responder(restaurado, 12)
+    assert len(restaurado.datos) == 8
+
+def test_estado_compartido_vacio_tras_reiniciar(tmp_path):
+    ruta = str(tmp_path / 'estado_ia.db')
+    registro = RegistroGeneradores(estado=AlmacenEstadoSQLite(ruta))
+    for _ in range(3):
+        with registro.usar(1, 'suma') as generador:
+            generador.generar_ejercicio(1)
+            generador.registrar_resultado(True, 4.0)
+    with registro.usar(1, 'suma') as generador:
+        generador.reiniciar()
+
+    # Otro worker (o un reinicio) lee el estado vacío y sigue respondiendo
+    otro = RegistroGeneradores(estado=AlmacenEstadoSQLite(ruta))
+    for _ in range(3):
+        with otro.usar(1, 'suma') as generador:
+            assert isinstance(generador, GeneradorEjercicios)
+            generador.generar_ejercicio(1)
+            generador.registrar_resultado(False, 6.0)
+            assert np.isfinite(generador.ia.predecir_dificultad(1))
+    assert len(generador.ia.datos) == 3
+
+def test_conflicto_repite_las_respuestas(tmp_path):
+    ruta = str(tmp_path / 'estado_ia.db')
+    uno = RegistroGeneradores(estado=AlmacenEstadoSQLite(ruta))
+    otro = RegistroGeneradores(estado=AlmacenEstadoSQLite(ruta))
+    with uno.usar(1, 'suma') as generador:
+        generador.registrar_resultado(True, 4.0, nivel=1)
+    with otro.usar(1, 'suma') as generador:
+        assert generador.ia.total_muestras == 1
+
+    # Los dos workers atienden a la vez al mismo estudiante: el segundo en guardar
+    # encuentra una versión nueva y repite su respuesta sobre ella
+    with uno.usar(1, 'suma') as primero:
+        with otro.usar(1, 'suma') as segundo:
+            segundo.registrar_resultado(False, 6.0, nivel=1)
+        primero.registrar_resultado(True, 3.0, nivel=1)
+    assert uno.estado.conflictos == 1
+    assert primero.ia.total_muestras == 3
+
+    with otro.usar(1, 'suma') as generador:
+        assert generador.ia.total_muestras == 3
+
+def almacen_sin_limite(retencion) -> AlmacenEntrenamiento:
+    almacen = AlmacenEntrenamiento(retencion=retencion)
+    for k in range(300):
+        almacen.agregar({columna: 0.0 for columna in COLUMNAS_CARACTERISTICAS} | {'nivel': k % 3 + 1}, float(k))
+    return almacen
+
+def test_recortar_sin_limite_ventana():
+    almacen = almacen_sin_limite(RetencionVentana())
+    almacen.recortar(30)
+    assert almacen.vistas()[1].tolist() == list(map(float, range(270, 300)))
+
+def test_recortar_sin_limite_reservorio():
+    retencion = RetencionReservorio(recencia=0.0, semilla=1)
+    almacen = almacen_sin_limite(retencion)
+    almacen.recortar(30)
+    assert len(almacen) == 30
+    assert retencion.vistas == 300
+    # Una muestra uniforme del historial, no solo de las últimas filas
+    assert almacen.vistas()[1].min() < 150
+    for k in range(300):
+        almacen.agregar({columna: 0.0 for columna in COLUMNAS_CARACTERISTICAS} | {'nivel': 1}, 1000.0 + k)
+    assert (almacen.vistas()[1] < 300).sum() > 5
+
+def test_recortar_sin_limite_estratificada():
+    almacen = almacen_sin_limite(RetencionEstratificada())
+    almacen.recortar(30)
+    niveles = almacen.vistas()[0][:, 0].tolist()
+    assert len(niveles) == 30
+    assert {nivel: niveles.count(nivel) for nivel in (1, 2, 3)} == {1: 10, 2: 10, 3: 10}
+
+def fila(nivel: int = 1) -> dict:
+    return {columna: 0.0 for columna in COLUMNAS_CARACTERISTICAS} | {'nivel': nivel}
+
+def test_reservorio_restaurado_conserva_la_tasa_de_aceptacion():
+    retencion = partial(RetencionReservorio, recencia=0.0, semilla=3)
+    ia = sistema(capacidad_datos=50, retencion=retencion)
+    responder(ia, 1000)
+    assert ia.datos.retencion.vistas == 1000
+
+    # Punto de control, otro proceso o el estado compartido: el reservorio sigue donde estaba
+    restaurado = sistema(capacidad_datos=50, retencion=retencion)
+    restaurado.restaurar_estado(ia.exportar_estado())
+    assert restaurado.datos.retencion.vistas == 1000
+    # Con otra capacidad las filas se vuelven a ofrecer, sin contarlas dos veces
+    menor = sistema(capacidad_datos=20, retencion=retencion)
+    menor.restaurar_estado(ia.exportar_estado())
+    assert menor.datos.retencion.vistas == 1000
+
+    # 200 filas nuevas sobre 1000 vistas: se espera que entren unas 50 * (1 - 1000/1200) ≈ 8
+    almacen = restaurado.datos
+    for k in range(200):
+        almacen.agregar(fila(), 1000.0 + k)
+    assert (almacen.vistas()[1] >= 1000).sum() < 20
+
+def test_reservorio_sin_vistas_tras_limpiar():
+    almacen = AlmacenEntrenamiento(capacidad=10, retencion=RetencionReservorio(recencia=0.0, semilla=1))
+    for k in range(500):
+        almacen.agregar(fila(), float(k))
+    almacen.limpiar()
+    assert almacen.retencion.vistas == 0
+    for k in range(10):
+        almacen.agregar(fila(), 1000.0 + k)
+    # Las primeras filas tras vaciarlo siempre entran
+    assert sorted(almacen.vistas()[1].tolist()) == [1000.0 + k for k in range(10)]
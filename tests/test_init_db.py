@@ -0,0 +1,21 @@
+from sqlalchemy import select
+
+def test_aprovisionar_asigna_cada_estudiante_a_su_grupo(aplicacion, tmp_path):
+    import init_db
+    ruta = tmp_path / 'estudiantes.csv'
+    filas = [f'e{k},clave{k},{"5A" if k % 3 else "5B"}' for k in range(12)]
+    ruta.write_text('identidad,password,grupo\n' + '\n'.join(filas) + '\n', encoding='utf-8')
+
+    resumen = init_db.aprovisionar(str(ruta), tamano_lote=5, procesos=1)
+    assert resumen == {'creados': 12, 'existentes': 0, 'invalidos': 0}
+
+    app, db = aplicacion.app, aplicacion.db
+    with app.app_context():
+        pares = db.session.execute(
+            select(aplicacion.Usuario.identidad, aplicacion.Grupo.nombre)
+            .join(aplicacion.grupo_estudiante, aplicacion.grupo_estudiante.c.usuario_id == aplicacion.Usuario.id)
+            .join(aplicacion.Grupo, aplicacion.Grupo.id == aplicacion.grupo_estudiante.c.grupo_id)
+        ).all()
+        progresos = db.session.query(aplicacion.ProgresoOperacion).count()
+    assert dict(pares) == {f'e{k}': '5A' if k % 3 else '5B' for k in range(12)}
+    assert progresos == 12 * len(aplicacion.OPERACIONES)
@@ -0,0 +1,15 @@
+from persistencia import AlmacenEstadoSQLite
+
+def test_escritura_con_version_desactualizada(tmp_path):
+    ruta = str(tmp_path / 'estado_ia.db')
+    uno, otro = AlmacenEstadoSQLite(ruta), AlmacenEstadoSQLite(ruta)
+    assert uno.leer('1-suma', 0) == (0, None)
+    assert uno.escribir('1-suma', 0, b'a') == 1
+    assert otro.escribir('1-suma', 0, b'b') is None  # Ya existe
+
+    assert otro.leer('1-suma', 0) == (1, b'a')
+    assert otro.leer('1-suma', 1) == (1, None)  # Versión conocida: no se envían los datos
+    assert otro.escribir('1-suma', 1, b'b') == 2
+    assert uno.escribir('1-suma', 1, b'c') is None
+    assert uno.leer('1-suma', 1) == (2, b'b')
+    assert (uno.conflictos, otro.conflictos) == (1, 1)
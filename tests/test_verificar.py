@@ -0,0 +1,89 @@
+import math
+import random
+
+import numpy as np
+import pytest
+from werkzeug.security import generate_password_hash
+
+from ejercicios_ia import PlanificadorReentrenamiento
+
+def respuestas_de_prueba(cantidad: int = 40):
+    """Aciertos y fallos en rachas, para que el nivel suba y baje"""
+    rng = random.Random(7)
+    respuestas = []
+    for k in range(cantidad):
+        num1, num2 = rng.randint(1, 20), rng.randint(1, 20)
+        correcta = num1 - num2
+        acierto = (k // 8) % 2 == 0 or rng.random() < 0.3
+        respuestas.append({'respuesta': correcta if acierto else correcta + 1, 'respuesta_correcta': correcta,
+                           'tiempo': round(rng.uniform(2.0, 15.0), 2), 'num1': num1, 'num2': num2})
+    return respuestas
+
+def iniciar_sesion(aplicacion, identidad: str):
+    app, db = aplicacion.app, aplicacion.db
+    with app.app_context():
+        usuario = aplicacion.Usuario(identidad=identidad,
+                                     password=generate_password_hash(identidad, method='pbkdf2:sha256:1'))
+        db.session.add(usuario)
+        db.session.commit()
+        usuario_id = usuario.id
+    cliente = app.test_client()
+    cliente.post('/login', data={'identidad': identidad, 'password': identidad})
+    return cliente, usuario_id
+
+def estado_final(aplicacion, usuario_id: int):
+    """Progreso guardado, intentos y filas de entrenamiento del estudiante en resta"""
+    app, db = aplicacion.app, aplicacion.db
+    aplicacion.escritor_progreso.vaciar()
+    aplicacion.buffer_intentos.vaciar()
+    with app.app_context():
+        progreso = db.session.query(aplicacion.ProgresoOperacion) \
+            .filter_by(usuario_id=usuario_id, operacion='resta').one()
+        intentos = db.session.query(aplicacion.Intento).filter_by(usuario_id=usuario_id, operacion='resta') \
+            .order_by(aplicacion.Intento.id).all()
+        guardado = (progreso.nivel, progreso.ejercicios_completados, progreso.aciertos, progreso.ultima_puntuacion)
+        filas = [(i.nivel, i.num1, i.num2, i.respuesta, i.correcto, i.tiempo, i.dificultad_predicha)
+                 for i in intentos]
+    with aplicacion.cargar_ia().registro.usar(usuario_id, 'resta') as generador:
+        X, y = generador.ia.datos.vistas()
+        return guardado, filas, X.copy(), y.copy()
+
+@pytest.mark.parametrize('diferida', [False, True], ids=['inmediata', 'diferida'])
+def test_lote_equivale_a_respuestas_sueltas(aplicacion, monkeypatch, diferida):
+    app = aplicacion.app
+    monkeypatch.setitem(app.config, 'PROGRESO_ESCRITURA_DIFERIDA', diferida)
+    ia = aplicacion.cargar_ia()
+    # Entrenar en el mismo hilo: los dos caminos ven los mismos modelos en el mismo momento
+    monkeypatch.setattr(ia, 'planificador', PlanificadorReentrenamiento(5, math.inf, sincrono=True))
+    respuestas = respuestas_de_prueba()
+
+    sueltas, suelto_id = iniciar_sesion(aplicacion, 'suelto')
+    np.random.seed(0)  # El árbol de scikit-learn desempata con el generador global
+    resultados_sueltos = []
+    for respuesta in respuestas:
+        resultado = sueltas.post('/api/ejercicios/resta/verificar', json=respuesta)
+        assert resultado.status_code == 200
+        resultados_sueltos.append(resultado.get_json())
+
+    lote, lote_id = iniciar_sesion(aplicacion, 'lote')
+    np.random.seed(0)
+    resultado = lote.post('/api/ejercicios/resta/verificar-lote', json={'respuestas': respuestas})
+    assert resultado.status_code == 200
+    datos = resultado.get_json()
+
+    assert datos['resultados'] == resultados_sueltos
+    assert {'nivel', 'nivel_cambio'} <= set(datos['resultados'][0])
+    assert len({r['nivel'] for r in resultados_sueltos}) > 1  # La secuencia cambia de nivel
+    ultimo = resultados_sueltos[-1]
+    assert datos['estado'] == {clave: ultimo[clave] for clave in
+                               ('nivel', 'puntuacion', 'ejercicios_completados', 'aciertos', 'mensaje_ayuda')}
+
+    progreso_suelto, intentos_sueltos, X_suelto, y_suelto = estado_final(aplicacion, suelto_id)
+    progreso_lote, intentos_lote, X_lote, y_lote = estado_final(aplicacion, lote_id)
+    assert progreso_lote == progreso_suelto
+    assert progreso_lote[0] == ultimo['nivel']
+    assert intentos_lote == intentos_sueltos
+    assert len(intentos_lote) == len(respuestas)
+    assert len(y_lote) == len(respuestas)
+    np.testing.assert_array_equal(X_lote, X_suelto)
+    np.testing.assert_array_equal(y_lote, y_suelto)